@@ -1,6 +1,6 @@
 # backend/api/admin.py - ДІАГНОСТИЧНА ВЕРСІЯ
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
 from .dependencies import get_current_user_dependency
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
@@ -8,7 +8,20 @@ from database import get_session
 from models import Order, OrderItem
 from models.user import User
 from models.archive import Archive
+from services.search_index import archive_search_index
+from services.catalog import catalog_service
+from services.user_cache import user_cache
+from services.entitlements import entitlement_service
+from services.executor import executor_service
+from services.image_pipeline import image_pipeline
+from services.family_thumbnails import family_thumbnail_service
+from services.archive_contents import archive_content_service
+from services.archive_versions import archive_version_service
+from services.counters import counter_service
+from services.view_history import view_history_service
+from services.analytics import analytics_service
 from datetime import datetime, timedelta, timezone
+import os
 import logging
 import traceback  # <-- Важливий імпорт для діагностики
 
@@ -58,8 +71,8 @@ async def get_archives_admin(
                 "image_paths": full_image_paths, # <-- Тепер тут повні URL
                 "file_path": archive.file_path,
                 "file_size": archive.file_size,
-                "purchase_count": archive.purchase_count or 0,
-                "view_count": archive.view_count or 0,
+                "purchase_count": (archive.purchase_count or 0) + counter_service.pending("archive.purchase_count", archive.id),
+                "view_count": (archive.view_count or 0) + counter_service.pending("archive.view_count", archive.id),
                 "average_rating": archive.average_rating if hasattr(archive, 'average_rating') else 0,
                 "ratings_count": archive.ratings_count if hasattr(archive, 'ratings_count') else 0,
                 "created_at": archive.created_at.isoformat() if archive.created_at else None
@@ -69,6 +82,20 @@ async def get_archives_admin(
         logger.error(f"Error loading archives for admin: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/internal/cache-stats")
+async def get_cache_stats(admin_user: User = Depends(admin_required)):
+    """Статистика кешів та пулів виконання процесу"""
+    return {
+        "pid": os.getpid(),
+        **user_cache.stats(),
+        "entitlements": entitlement_service.stats(),
+        "executors": executor_service.stats(),
+        "counters": counter_service.stats(),
+        "view_history": view_history_service.stats(),
+        "analytics": analytics_service.stats()
+    }
+
+
 @router.get("/dashboard")
 async def get_admin_dashboard(
         session: AsyncSession = Depends(get_session),
@@ -174,7 +201,7 @@ async def get_users_list(
                 "language_code": user.language_code,
                 "role": user.role,
                 "is_admin": user.is_admin,
-                "bonuses": user.bonuses,
+                "bonuses": user.bonus_balance,
                 "created_at": user.created_at.isoformat() if user.created_at else None
             }
             for user in users
@@ -294,13 +321,19 @@ async def create_archive(
             discount_percent=int(archive_data.get('discount_percent', 0)),
             archive_type=archive_data.get('archive_type', 'premium'),
             image_paths=archive_data.get('image_paths', []),
+            image_placeholders=await executor_service.run_io(
+                image_pipeline.placeholders, archive_data.get('image_paths', [])
+            ),
             file_path=archive_data.get('file_path'),
             file_size=archive_data.get('file_size')
         )
 
         session.add(new_archive)
+        await session.flush()
+        await archive_search_index.upsert(session, new_archive)
         await session.commit()
         await session.refresh(new_archive)
+        await catalog_service.invalidate()
 
         return {
             "success": True,
@@ -337,6 +370,9 @@ async def update_archive(
         # Переприсвоюємо список, щоб база даних помітила зміну
         if 'image_paths' in archive_data:
             archive.image_paths = archive_data['image_paths']
+            archive.image_placeholders = await executor_service.run_io(
+                image_pipeline.placeholders, archive_data['image_paths']
+            )
 
         if 'file_path' in archive_data:
             archive.file_path = archive_data['file_path']
@@ -344,8 +380,10 @@ async def update_archive(
         if 'file_size' in archive_data:
             archive.file_size = archive_data['file_size']
 
+        await archive_search_index.upsert(session, archive)
         await session.commit()
         await session.refresh(archive)
+        await catalog_service.invalidate()
 
         return {
             "success": True,
@@ -371,7 +409,9 @@ async def delete_archive(
 
     try:
         await session.delete(archive)
+        await archive_search_index.remove(session, archive_id)
         await session.commit()
+        await catalog_service.invalidate()
 
         return {
             "success": True,
@@ -380,4 +420,89 @@ async def delete_archive(
 
     except Exception as e:
         await session.rollback()
-        raise HTTPException(status_code=400, detail=f"Failed to delete archive: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=f"Failed to delete archive: {str(e)}")
+
+
+@router.post("/archives/{archive_id}/family-thumbnails")
+async def extract_family_thumbnails(
+        archive_id: int,
+        session: AsyncSession = Depends(get_session),
+        admin_user: User = Depends(admin_required)
+):
+    """Заново витягти превʼю сімейств Revit з файлу архіву"""
+
+    archive = await session.get(Archive, archive_id)
+    if not archive:
+        raise HTTPException(status_code=404, detail="Archive not found")
+
+    source_path = await executor_service.run_io(archive_version_service.archive_source, archive)
+    if source_path is None:
+        raise HTTPException(status_code=404, detail="Archive file not found")
+
+    manifest = await family_thumbnail_service.extract(archive.code, source_path)
+    return {
+        "success": True,
+        "families_count": manifest["families_count"],
+        "thumbnails_count": len(manifest["thumbnails"])
+    }
+
+
+@router.post("/archives/{archive_id}/content-index")
+async def reindex_archive_contents(
+        archive_id: int,
+        session: AsyncSession = Depends(get_session),
+        admin_user: User = Depends(admin_required)
+):
+    """Заново проіндексувати вміст архіву"""
+
+    archive = await session.get(Archive, archive_id)
+    if not archive:
+        raise HTTPException(status_code=404, detail="Archive not found")
+
+    source_path = await executor_service.run_io(archive_version_service.archive_source, archive)
+    if source_path is None:
+        raise HTTPException(status_code=404, detail="Archive file not found")
+
+    result = await archive_content_service.index(session, archive.code, source_path)
+    return {"success": True, **result}
+
+
+@router.post("/archives/{archive_id}/versions")
+async def publish_archive_version(
+        archive_id: int,
+        version_data: dict,
+        session: AsyncSession = Depends(get_session),
+        admin_user: User = Depends(admin_required)
+):
+    """Опублікувати версію архіву (маніфест хешів файлів для дельта-завантажень)"""
+
+    archive = await session.get(Archive, archive_id)
+    if not archive:
+        raise HTTPException(status_code=404, detail="Archive not found")
+
+    version = str(version_data.get('version') or '').strip()
+    if not version or len(version) > 20:
+        raise HTTPException(status_code=400, detail="Version is required (max 20 characters)")
+
+    archive_version = await archive_version_service.publish(
+        session, archive, version, version_data.get('changelog')
+    )
+
+    return {
+        "success": True,
+        "version": archive_version.version,
+        "files_count": archive_version.files_count,
+        "total_size": archive_version.total_size
+    }
+
+
+@router.post("/family-thumbnails/backfill")
+async def backfill_family_thumbnails(
+        background_tasks: BackgroundTasks,
+        admin_user: User = Depends(admin_required)
+):
+    """Запустити у фоні витягування превʼю сімейств для архівів без них"""
+    from scheduler import scheduler
+
+    background_tasks.add_task(scheduler.backfill_family_thumbnails)
+    return {"success": True, "message": "Backfill started"}
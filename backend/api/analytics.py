@@ -0,0 +1,49 @@
+# backend/api/analytics.py
+from fastapi import APIRouter, Depends, HTTPException
+from models.user import User
+from services.analytics import analytics_service, CLIENT_EVENT_TYPES
+from services.catalog import catalog_service
+from .dependencies import get_current_user_dependency
+
+router = APIRouter()
+
+# Подій в одному запиті
+MAX_EVENTS_PER_REQUEST = 50
+
+
+@router.post("/events")
+async def ingest_events(
+        data: dict,
+        current_user: User = Depends(get_current_user_dependency)
+):
+    """Прийняти події з фронтенду (лише дописуються в журнал, без запису в БД)"""
+
+    events = data.get("events") or []
+    if not isinstance(events, list) or len(events) > MAX_EVENTS_PER_REQUEST:
+        raise HTTPException(
+            status_code=422,
+            detail=f"events must be a list of at most {MAX_EVENTS_PER_REQUEST} items"
+        )
+
+    catalog = await catalog_service.get()
+    accepted = 0
+    for event in events:
+        if not isinstance(event, dict) or event.get("type") not in CLIENT_EVENT_TYPES:
+            continue
+        try:
+            archive_id = int(event.get("archive_id"))
+        except (TypeError, ValueError):
+            continue
+        if catalog.get(archive_id) is None:
+            continue
+
+        source = event.get("source")
+        analytics_service.record(
+            event["type"],
+            archive_id,
+            visitor=current_user.id,
+            source=source if isinstance(source, str) else None
+        )
+        accepted += 1
+
+    return {"accepted": accepted}
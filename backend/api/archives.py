@@ -1,12 +1,21 @@
 # backend/api/archives.py - ВИПРАВЛЕНА ВЕРСІЯ
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, func
-from typing import List, Dict, Any, Optional
+from sqlalchemy import select, or_, func, tuple_, type_coerce, String
+from typing import List, Dict, Any, Optional, Tuple
+import base64
+import json
 from database import get_session
 from models.archive import Archive
-from pydantic import BaseModel
+from services.search_index import archive_search_index
+from services.image_pipeline import image_pipeline
+from services.family_thumbnails import family_thumbnail_service
+from services.archive_contents import archive_content_service
+from services.executor import executor_service
+from services.user_cache import TTLCache
+from services.catalog import catalog_service, absolute_image_urls, SORT_FIELDS as SNAPSHOT_SORT_FIELDS
+from pydantic import BaseModel, field_validator
 
 from config import settings
 
@@ -22,30 +31,131 @@ class ArchiveOut(BaseModel):
     discount_percent: int
     archive_type: str
     image_paths: List[str]
+    image_variants: List[Optional[dict]] = []  # srcset для кожного зображення (None - лише оригінал)
+    image_placeholders: List[Optional[str]] = []  # LQIP data URI для кожного зображення
     average_rating: float = 0
     ratings_count: int = 0
 
     class Config:
         from_attributes = True
 
+    @field_validator("image_placeholders", mode="before")
+    @classmethod
+    def _placeholders_default(cls, value):
+        # Архіви, створені до появи колонки, мають NULL
+        return value or []
+
+
+# Кеш загальної кількості для курсорної пагінації: {ключ фільтрів: total}.
+# Ключ містить довільний пошуковий рядок, тому кеш обмежений за розміром
+COUNT_CACHE_TTL = 60
+COUNT_CACHE_MAX_SIZE = 1000
+_count_cache = TTLCache(max_size=COUNT_CACHE_MAX_SIZE, ttl=COUNT_CACHE_TTL)
+
+
+def _encode_cursor(sort_by: str, sort_order: str, key: Any, archive_id: int) -> str:
+    """Закодувати позицію (ключ сортування + id) в непрозорий курсор"""
+    payload = json.dumps({"s": sort_by, "o": sort_order, "k": key, "id": archive_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str, sort_by: str, sort_order: str) -> Tuple[Any, int]:
+    """Розкодувати курсор та перевірити, що він виданий для того ж сортування"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data["s"] != sort_by or data["o"] != sort_order:
+            raise ValueError("Cursor was issued for a different sort")
+        return data["k"], int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 
 @router.get("/paginated/list")
 async def get_archives_list(
         request: Request,
+        response: Response,
         page: int = 1,
+        limit: int = Query(12, ge=1, le=48, description="Кількість елементів на сторінці"),
+        pagination: str = Query("offset", pattern="^(offset|cursor)$", description="Режим пагінації: offset або cursor"),
+        cursor: Optional[str] = Query(None, description="Курсор наступної сторінки (next_cursor з попередньої відповіді)"),
+        with_total: Optional[bool] = Query(None, description="Чи рахувати загальну кількість в режимі cursor"),
         search: Optional[str] = Query(None, description="Пошуковий запит"),
         archive_type: Optional[str] = Query(None, description="Тип архіву: premium або free"),
         min_price: Optional[float] = Query(None, description="Мінімальна ціна"),
         max_price: Optional[float] = Query(None, description="Максимальна ціна"),
-        sort_by: Optional[str] = Query("created_at", description="Поле для сортування: price, title, created_at"),
+        sort_by: Optional[str] = Query("created_at", description="Поле для сортування: relevance, price, title, created_at, rating, id"),
         sort_order: Optional[str] = Query("desc", description="Напрямок сортування: asc або desc"),
         session: AsyncSession = Depends(get_session)
 ):
     """
     Повертає список архівів з можливістю пошуку та фільтрації.
+
+    Режим offset (за замовчуванням) - сторінки за номером page.
+    Режим cursor (pagination=cursor або переданий cursor) - keyset пагінація:
+    відповідь містить next_cursor, а total рахується лише для першої сторінки
+    (або коли with_total=true) і кешується на COUNT_CACHE_TTL секунд.
+
+    Без пошукового запиту список віддається зі знімка каталогу в пам'яті.
     """
-    limit = 12
-    offset = (page - 1) * limit
+    use_cursor = pagination == "cursor" or cursor is not None
+    if sort_order != "asc":
+        sort_order = "desc"
+
+    snapshot = await catalog_service.get()
+    response.headers["X-Catalog-Version"] = str(snapshot.version)
+
+    if not search:
+        if sort_by not in SNAPSHOT_SORT_FIELDS:
+            sort_by = "created_at"
+
+        def matches_filters(archive) -> bool:
+            if archive_type and archive.archive_type != archive_type:
+                return False
+            if min_price is not None and archive.price < min_price:
+                return False
+            if max_price is not None and archive.price > max_price:
+                return False
+            return True
+
+        has_filters = bool(archive_type) or min_price is not None or max_price is not None
+        predicate = matches_filters if has_filters else None
+
+        if use_cursor:
+            after = _decode_cursor(cursor, sort_by, sort_order) if cursor else None
+            archives, has_more = snapshot.page(sort_by, sort_order, limit, after=after, predicate=predicate)
+        else:
+            archives, has_more = snapshot.page(sort_by, sort_order, limit, offset=(page - 1) * limit, predicate=predicate)
+
+        total = None
+        if not use_cursor or with_total or (with_total is None and not cursor):
+            if predicate is None:
+                total = len(snapshot.archives)
+            else:
+                total = sum(1 for archive in snapshot.archives.values() if predicate(archive))
+
+        items = [ArchiveOut.model_validate(archive) for archive in archives]
+
+        if use_cursor:
+            next_cursor = None
+            if has_more and archives:
+                last = archives[-1]
+                next_cursor = _encode_cursor(sort_by, sort_order, last.sort_key(sort_by), last.id)
+            return {
+                "items": items,
+                "next_cursor": next_cursor,
+                "has_more": has_more,
+                "total": total,
+                "catalog_version": snapshot.version
+            }
+
+        return {
+            "items": items,
+            "page": page,
+            "has_more": has_more,
+            "total": total,
+            "catalog_version": snapshot.version
+        }
 
     # Базові запити
     query = select(Archive)
@@ -53,13 +163,22 @@ async def get_archives_list(
 
     # Фільтрація
     filters = []
+    rank_column = None
     if search:
-        search_term = f"%{search.lower()}%"
-        filters.append(or_(
-            func.lower(Archive.code).like(search_term),
-            func.lower(func.json_extract(Archive.title, '$.ua')).like(search_term),
-            func.lower(func.json_extract(Archive.title, '$.en')).like(search_term)
-        ))
+        match_query = archive_search_index.build_match_query(search)
+        if archive_search_index.available and match_query:
+            # Пошук через FTS5 індекс з ранжуванням bm25
+            matches = archive_search_index.match_subquery(match_query)
+            query = query.join(matches, Archive.id == matches.c.archive_id)
+            count_query = count_query.join(matches, Archive.id == matches.c.archive_id)
+            rank_column = matches.c.rank
+        elif match_query:
+            search_term = f"%{search.lower()}%"
+            filters.append(or_(
+                func.lower(Archive.code).like(search_term),
+                func.lower(func.json_extract(Archive.title, '$.ua')).like(search_term),
+                func.lower(func.json_extract(Archive.title, '$.en')).like(search_term)
+            ))
     if archive_type:
         filters.append(Archive.archive_type == archive_type)
     if min_price is not None:
@@ -71,50 +190,143 @@ async def get_archives_list(
         query = query.where(*filters)
         count_query = count_query.where(*filters)
 
-    # Загальна кількість
-    total_result = await session.execute(count_query)
-    total = total_result.scalar_one()
-
     # Сортування
     order_column_map = {
-        "price": Archive.price,
-        "title": func.json_extract(Archive.title, '$.ua'),
-        "created_at": Archive.created_at,
+        "price": func.coalesce(Archive.price, 0),
+        "title": func.coalesce(func.json_extract(Archive.title, '$.ua'), ''),
+        # Сире текстове значення з SQLite - курсор порівнює його без перетворень формату
+        "created_at": type_coerce(Archive.created_at, String),
+        "rating": func.coalesce(Archive.average_rating, 0),
         "id": Archive.id
     }
-    order_column = order_column_map.get(sort_by, Archive.created_at)
+    if sort_by == "relevance" and rank_column is not None:
+        # bm25 повертає менше значення для кращого збігу
+        order_column = rank_column
+        sort_order = "asc"
+    else:
+        if sort_by not in order_column_map:
+            sort_by = "created_at"
+        order_column = order_column_map[sort_by]
 
+    # id як другий ключ робить порядок однозначним (потрібно для курсора)
     if sort_order == "desc":
-        query = query.order_by(order_column.desc())
+        query = query.order_by(order_column.desc(), Archive.id.desc())
     else:
-        query = query.order_by(order_column.asc())
+        query = query.order_by(order_column.asc(), Archive.id.asc())
 
-    # Виконання запиту з пагінацією
-    result = await session.execute(query.offset(offset).limit(limit))
-    archives = result.scalars().all()
+    total = None
+    if use_cursor:
+        if cursor:
+            key, last_id = _decode_cursor(cursor, sort_by, sort_order)
+            position = tuple_(order_column, Archive.id)
+            if sort_order == "desc":
+                query = query.where(position < tuple_(key, last_id))
+            else:
+                query = query.where(position > tuple_(key, last_id))
 
-    # --- ОСНОВНЕ ВИПРАВЛЛЕННЯ ТУТ ---
-    base_url = settings.APP_URL.rstrip('/')  # Використовуємо APP_URL з конфігу
-    response_archives = []
+        if with_total or (with_total is None and not cursor):
+            cache_key = (search, archive_type, min_price, max_price)
+            total = _count_cache.get(cache_key)
+            if total is None:
+                total = (await session.execute(count_query)).scalar_one()
+                _count_cache.set(cache_key, total)
+
+        # Беремо на один більше, щоб дізнатися чи є наступна сторінка
+        result = await session.execute(query.add_columns(order_column.label("sort_key")).limit(limit + 1))
+        rows = result.all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        archives = [row[0] for row in rows]
 
+        next_cursor = None
+        if has_more and rows:
+            last_archive, last_key = rows[-1][0], rows[-1][1]
+            next_cursor = _encode_cursor(sort_by, sort_order, last_key, last_archive.id)
+    else:
+        offset = (page - 1) * limit
+
+        # Загальна кількість
+        total_result = await session.execute(count_query)
+        total = total_result.scalar_one()
+
+        # Виконання запиту з пагінацією
+        result = await session.execute(query.offset(offset).limit(limit))
+        archives = result.scalars().all()
+        has_more = (offset + len(archives)) < total
+
+    response_archives = []
     for archive in archives:
-        # Створюємо повні шляхи до зображень
-        full_image_paths = []
-        if archive.image_paths and isinstance(archive.image_paths, list):
-            for path in archive.image_paths:
-                if path and not path.startswith(('http://', 'https://')):
-                    full_image_paths.append(f"{base_url}/{path}")  # Додаємо повний шлях
-                elif path:
-                    full_image_paths.append(path)
-
-        # Створюємо об'єкт для відповіді і перезаписуємо шляхи
+        # Створюємо об'єкт для відповіді з повними шляхами до зображень
         archive_out = ArchiveOut.from_orm(archive)
-        archive_out.image_paths = full_image_paths if full_image_paths else [f"{base_url}/media/images/placeholder.png"]
+        archive_out.image_paths = absolute_image_urls(archive.image_paths)
+        archive_out.image_variants = image_pipeline.srcsets(archive.image_paths)
         response_archives.append(archive_out)
 
+    if use_cursor:
+        return {
+            "items": response_archives,
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+            "total": total,
+            "catalog_version": snapshot.version
+        }
+
     return {
         "items": response_archives,
         "page": page,
-        "has_more": (offset + len(archives)) < total,
-        "total": total
-    }
\ No newline at end of file
+        "has_more": has_more,
+        "total": total,
+        "catalog_version": snapshot.version
+    }
+
+
+@router.get("/{archive_id}/families")
+async def get_archive_families(archive_id: int):
+    """Превʼю сімейств Revit, витягнуті з файлів архіву"""
+    snapshot = await catalog_service.get()
+    archive = snapshot.archives.get(archive_id)
+    if archive is None:
+        raise HTTPException(status_code=404, detail="Archive not found")
+
+    families = await executor_service.run_io(family_thumbnail_service.thumbnails, archive.code)
+    return {"archive_id": archive_id, "families": families, "total": len(families)}
+
+
+@router.get("/contents/search")
+async def search_archive_contents(
+        q: str = Query(..., min_length=2, max_length=100, description="Слова або початки слів назви файлу/сімейства"),
+        extension: Optional[str] = Query(".rfa", description="Розширення файлів ('' - будь-які)"),
+        limit: int = Query(20, ge=1, le=100),
+        session: AsyncSession = Depends(get_session)
+):
+    """Знайти архіви, що містять файли (за замовчуванням сімейства .rfa) з такою назвою"""
+    results = await archive_content_service.search(session, q.strip(), extension or None, limit)
+    return {"query": q, "archives": results, "total": len(results)}
+
+
+@router.get("/{archive_id}/contents")
+async def get_archive_contents(
+        archive_id: int,
+        path: str = Query("", description="Папка всередині архіву ('' - корінь)"),
+        cursor: Optional[str] = Query(None, description="Курсор наступної сторінки"),
+        limit: int = Query(100, ge=1, le=500),
+        session: AsyncSession = Depends(get_session)
+):
+    """Вміст архіву по рівнях: папки та файли з розмірами і CRC"""
+    snapshot = await catalog_service.get()
+    archive = snapshot.archives.get(archive_id)
+    if archive is None:
+        raise HTTPException(status_code=404, detail="Archive not found")
+
+    path = path.strip("/")
+    if path and not await archive_content_service.directory_exists(session, archive.code, path):
+        raise HTTPException(status_code=404, detail="Directory not found")
+
+    try:
+        listing = await archive_content_service.list_directory(session, archive.code, path, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not cursor:
+        listing["summary"] = await archive_content_service.summary(session, archive.code)
+    return {"archive_id": archive_id, **listing}
@@ -13,16 +13,16 @@ import hashlib
 import hmac
 import json
 import logging
-from fastapi.security import OAuth2PasswordBearer
 from urllib.parse import unquote
 from jose import JWTError, jwt
 import httpx
 
+from .dependencies import get_current_user_dependency
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/telegram")
 # JWT налаштування
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
@@ -32,32 +32,6 @@ ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 ADMIN_TELEGRAM_IDS = settings.admin_ids_list
 
 
-async def get_current_user_dependency(
-        token: str = Depends(oauth2_scheme),
-        session: AsyncSession = Depends(get_session)
-) -> User:
-    """Dependency для перевірки токена і отримання користувача"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    result = await session.execute(
-        select(User).where(User.id == int(user_id))
-    )
-    user = result.scalar_one_or_none()
-    if user is None:
-        raise credentials_exception
-    return user
-
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Створення JWT токена"""
     to_encode = data.copy()
@@ -1,13 +1,15 @@
 # backend/api/bonuses.py
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, case, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import date, timedelta
 import random
 
 from database import get_session
 from models.user import User
-from models.bonus import DailyBonus, BonusTransaction, BonusTransactionType
+from models.bonus import DailyBonus, BonusTransactionType
+from services.bonus import bonus_ledger
 from utils.timezone import get_kyiv_time
 from .dependencies import get_current_user_dependency
 from config import settings
@@ -16,9 +18,10 @@ router = APIRouter()
 
 # Винагороди за стрік
 STREAK_REWARDS = {1: 1, 2: 2, 3: 3, 4: 4, 5: 5, 6: 7, 7: 10}
+MAX_STREAK_REWARD = 10
 
 def get_reward_for_day(day: int) -> int:
-    return STREAK_REWARDS.get(day, 10)
+    return STREAK_REWARDS.get(day, MAX_STREAK_REWARD)
 
 @router.get("/daily-bonus")
 async def get_daily_bonus_status(
@@ -44,7 +47,7 @@ async def get_daily_bonus_status(
     current_streak = 0 if streak_broken else bonus_status.streak_count
     next_reward = get_reward_for_day(current_streak + 1)
 
-    can_restore = streak_broken and not bonus_status.streak_restored and current_user.bonuses >= settings.DAILY_BONUS_STREAK_RESTORE_COST
+    can_restore = streak_broken and not bonus_status.streak_restored and (current_user.bonus_balance or 0) >= settings.DAILY_BONUS_STREAK_RESTORE_COST
 
     return {
         "can_claim": can_claim,
@@ -61,51 +64,73 @@ async def claim_daily_bonus(
         current_user: User = Depends(get_current_user_dependency),
         session: AsyncSession = Depends(get_session)
 ):
-    status = await get_daily_bonus_status(current_user, session)
-    if not status["can_claim"]:
-        raise HTTPException(status_code=400, detail="Bonus already claimed today.")
+    """
+    Отримання щоденного бонусу одним умовним upsert по daily_bonuses.
+
+    Рядок оновлюється лише якщо last_claim_date < сьогодні (за Києвом), новий стрік
+    і винагорода рахуються в тому ж запиті, а баланс нараховується атомарно в тій
+    самій транзакції. Паралельні запити (подвійний тап, пік опівночі) не можуть
+    отримати бонус двічі - другий не знайде рядка для оновлення і отримає 400.
+    """
+    today = get_kyiv_time().date()
+    yesterday = today - timedelta(days=1)
 
     slot_result = data.get("slot_result", [])
-    base_reward = status["next_reward"]
-    jackpot_bonus = 0
     is_jackpot = len(slot_result) == 3 and slot_result[0] == slot_result[1] == slot_result[2]
+    jackpot_bonus = settings.DAILY_BONUS_SLOT_JACKPOT if is_jackpot else 0
+
+    # Стрік продовжується, якщо вчора бонус отримано (або стрік відновлено), інакше починається з 1
+    new_streak = case(
+        (DailyBonus.last_claim_date == yesterday, func.coalesce(DailyBonus.streak_count, 0) + 1),
+        else_=1
+    )
+    reward = case(STREAK_REWARDS, value=new_streak, else_=MAX_STREAK_REWARD) + jackpot_bonus
+
+    stmt = sqlite_insert(DailyBonus).values(
+        user_id=current_user.id,
+        last_claim_date=today,
+        streak_count=1,
+        streak_restored=False,
+        max_streak=1,
+        total_claimed=get_reward_for_day(1) + jackpot_bonus,
+        total_claims=1,
+        slot_wins=1 if is_jackpot else 0
+    )
+    # Усі вирази SET обчислюються за старими значеннями рядка
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={
+            'last_claim_date': today,
+            'streak_count': new_streak,
+            'streak_restored': False,
+            'max_streak': func.max(func.coalesce(DailyBonus.max_streak, 0), new_streak),
+            'total_claimed': func.coalesce(DailyBonus.total_claimed, 0) + reward,
+            'total_claims': func.coalesce(DailyBonus.total_claims, 0) + 1,
+            'slot_wins': func.coalesce(DailyBonus.slot_wins, 0) + (1 if is_jackpot else 0),
+            'updated_at': func.now()
+        },
+        where=or_(DailyBonus.last_claim_date.is_(None), DailyBonus.last_claim_date < today)
+    ).returning(DailyBonus.streak_count)
+
+    streak_day = (await session.execute(stmt)).scalar_one_or_none()
+    if streak_day is None:
+        raise HTTPException(status_code=400, detail="Bonus already claimed today.")
 
-    if is_jackpot:
-        jackpot_bonus = settings.DAILY_BONUS_SLOT_JACKPOT
-
+    base_reward = get_reward_for_day(streak_day)
     total_reward = base_reward + jackpot_bonus
 
-    # Оновлюємо або створюємо запис DailyBonus
-    result = await session.execute(select(DailyBonus).where(DailyBonus.user_id == current_user.id))
-    bonus_status = result.scalar_one_or_none()
-
-    if not bonus_status:
-        bonus_status = DailyBonus(user_id=current_user.id, streak_count=0)
-        session.add(bonus_status)
-
-    new_streak = status["current_streak"] + 1
-    bonus_status.streak_count = new_streak
-    bonus_status.last_claim_date = get_kyiv_time().date()
-    bonus_status.streak_restored = False
-
-    bonus_status.total_claimed = (bonus_status.total_claimed or 0) + total_reward
-    bonus_status.total_claims = (bonus_status.total_claims or 0) + 1
-    if is_jackpot:
-        bonus_status.slot_wins = (bonus_status.slot_wins or 0) + 1
-
     # Нараховуємо бонуси
-    current_user.bonuses += total_reward
-    session.add(BonusTransaction(
-        user_id=current_user.id, amount=total_reward, balance_after=current_user.bonuses,
-        type=BonusTransactionType.DAILY_CLAIM, description=f"Daily bonus day {new_streak}. Jackpot: {is_jackpot}"
-    ))
+    new_balance = await bonus_ledger.credit(
+        session, current_user.id, total_reward, BonusTransactionType.DAILY_CLAIM,
+        description=f"Daily bonus day {streak_day}. Jackpot: {is_jackpot}"
+    )
 
     await session.commit()
 
     return {
         "success": True, "total_reward": total_reward, "base_reward": base_reward,
         "jackpot": is_jackpot, "jackpot_bonus": jackpot_bonus,
-        "new_balance": current_user.bonuses, "streak_day": new_streak
+        "new_balance": new_balance, "streak_day": streak_day
     }
 
 @router.post("/daily/restore-streak")
@@ -123,11 +148,10 @@ async def restore_streak(
     bonus_status = result.scalar_one()
 
     # Списуємо бонуси
-    current_user.bonuses -= cost
-    session.add(BonusTransaction(
-        user_id=current_user.id, amount=-cost, balance_after=current_user.bonuses,
-        type=BonusTransactionType.STREAK_RESTORE_FEE, description="Streak restore fee"
-    ))
+    new_balance = await bonus_ledger.debit(
+        session, current_user.id, cost, BonusTransactionType.STREAK_RESTORE_FEE,
+        description="Streak restore fee"
+    )
 
     # Відновлюємо
     bonus_status.last_claim_date = get_kyiv_time().date() - timedelta(days=1)
@@ -135,4 +159,4 @@ async def restore_streak(
 
     await session.commit()
 
-    return {"success": True, "new_balance": current_user.bonuses, "message": "Streak restored."}
\ No newline at end of file
+    return {"success": True, "new_balance": new_balance, "message": "Streak restored."}
\ No newline at end of file
@@ -5,9 +5,9 @@ from sqlalchemy import select, and_, func
 from database import get_session
 from models.user import User
 from models.comment import Comment
-from models.archive import Archive, ArchivePurchase
-from models.subscription import SubscriptionArchive
-from models.order import Order, OrderItem
+from models.archive import Archive
+from services.catalog import catalog_service
+from services.entitlements import entitlement_service
 from .dependencies import get_current_user_dependency
 from typing import List, Dict, Optional
 from datetime import datetime
@@ -15,51 +15,14 @@ from datetime import datetime
 router = APIRouter()
 
 
-# Функція для перевірки доступу до архіву (як у ratings.py)
+# Функція для перевірки доступу до архіву
 async def check_archive_access(user_id: int, archive_id: int, session: AsyncSession) -> bool:
     """Перевірка чи користувач має доступ до архіву"""
-
-    # 1. Перевіряємо чи архів безкоштовний
-    archive = await session.get(Archive, archive_id)
-    if not archive:
-        return False
-    if archive.archive_type == 'free' or archive.price == 0:
+    # Коментувати архів з нульовою ціною можна без покупки, як і безкоштовний
+    archive = (await catalog_service.get()).get(archive_id)
+    if archive and archive.price == 0:
         return True
-
-    # 2. Перевіряємо покупку
-    purchase = await session.execute(
-        select(ArchivePurchase).where(
-            ArchivePurchase.user_id == user_id,
-            ArchivePurchase.archive_id == archive_id
-        )
-    )
-    if purchase.scalar_one_or_none():
-        return True
-
-    # 4. Перевіряємо підписку через SubscriptionArchive
-    subscription = await session.execute(
-        select(SubscriptionArchive).where(
-            SubscriptionArchive.user_id == user_id,
-            SubscriptionArchive.archive_id == archive_id
-        )
-    )
-    if subscription.scalar_one_or_none():
-        return True
-
-    # 5. Перевіряємо завершені замовлення
-    completed_order = await session.execute(
-        select(Order.id)
-        .join(OrderItem, Order.id == OrderItem.order_id)
-        .where(
-            Order.user_id == user_id,
-            Order.status == 'completed',
-            OrderItem.archive_id == archive_id
-        )
-    )
-    if completed_order.scalar_one_or_none():
-        return True
-
-    return False
+    return await entitlement_service.has_access(session, user_id, archive_id)
 
 
 @router.get("/{archive_id}")
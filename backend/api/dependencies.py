@@ -9,6 +9,7 @@ from sqlalchemy import select
 
 from database import get_session
 from models.user import User
+from services.user_cache import user_cache
 from config import settings
 
 
@@ -18,6 +19,9 @@ async def get_current_user_dependency(
 ):
     """
     Декодує JWT токен з заголовка 'Authorization' та повертає поточного користувача.
+
+    Розкодовані токени та користувачі кешуються в user_cache, тому повторні
+    запити з тим самим токеном не перевіряють підпис і не читають users.
     """
     if authorization is None:
         raise HTTPException(
@@ -37,16 +41,19 @@ async def get_current_user_dependency(
         if scheme.lower() != "bearer":
             raise credentials_exception
 
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id_str: Optional[str] = payload.get("sub")
-        if user_id_str is None:
-            raise credentials_exception
-        user_id = int(user_id_str)
+        user_id = user_cache.get_token_user_id(token)
+        if user_id is None:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            user_id_str: Optional[str] = payload.get("sub")
+            if user_id_str is None:
+                raise credentials_exception
+            user_id = int(user_id_str)
+            user_cache.remember_token(token, user_id, payload.get("exp"))
 
     except (ValueError, JWTError, TypeError):
         raise credentials_exception
 
-    user = await session.get(User, user_id)
+    user = await user_cache.get_user(session, user_id)
     if user is None:
         raise credentials_exception
 
@@ -1,5 +1,5 @@
 # backend/api/downloads.py
-from fastapi import APIRouter, Depends, HTTPException, Response, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
@@ -8,10 +8,20 @@ from models.user import User
 from models.archive import Archive, ArchivePurchase
 from models.subscription import SubscriptionArchive
 from services.file_service import file_service
+from services.file_response import ranged_file_response, requested_range
+from services.catalog import catalog_service
+from services.entitlements import entitlement_service
+from services.archive_contents import archive_content_service
+from services.archive_versions import archive_version_service
+from services.executor import executor_service
+from services.counters import counter_service
 from config import settings
 from .dependencies import get_current_user_dependency
 import aiofiles
+import functools
+import zipfile
 from pathlib import Path
+from urllib.parse import quote
 import logging
 
 router = APIRouter()
@@ -68,9 +78,8 @@ async def request_download(
         expires_minutes=60
     )
 
-    # Оновлюємо статистику
-    archive.view_count = (archive.view_count or 0) + 1
-    await session.commit()
+    # Оновлюємо статистику (запишеться в БД пачкою)
+    counter_service.increment("archive.view_count", archive.id)
 
     return {
         "success": True,
@@ -87,13 +96,144 @@ async def request_download(
     }
 
 
+def archive_download_filename(archive: Archive, suffix: str) -> str:
+    return f"{archive.code}_{archive.title.get('en', 'archive').replace(' ', '_')}{suffix}"
+
+
+async def stream_archive_folder(archive: Archive, folder_path: Path, token_data: dict, session: AsyncSession):
+    """Віддати архів-папку потоковим ZIP (без Range - розмір наперед невідомий)"""
+    if not await file_service.consume_download_token(session, token_data):
+        raise HTTPException(status_code=401, detail="Download limit reached for this token")
+    await session.commit()
+
+    counter_service.increment("archive.purchase_count", archive.id)
+
+    logger.info(f"User {token_data['user_id']} streaming archive {archive.code}")
+
+    download_filename = archive_download_filename(archive, ".zip")
+    return StreamingResponse(
+        file_service.stream_folder_zip(folder_path),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={download_filename}",
+            "Cache-Control": "private, no-cache"
+        }
+    )
+
+
+@router.get("/versions/{archive_id}")
+async def get_archive_versions(
+        archive_id: int,
+        session: AsyncSession = Depends(get_session)
+):
+    """Опубліковані версії архіву з changelog"""
+    versions = await archive_version_service.list_versions(session, archive_id)
+    return {
+        "archive_id": archive_id,
+        "versions": [
+            {
+                "version": version.version,
+                "changelog": version.changelog,
+                "files_count": version.files_count,
+                "total_size": version.total_size,
+                "created_at": version.created_at.isoformat() if version.created_at else None
+            }
+            for version in versions
+        ]
+    }
+
+
+@router.get("/delta/{archive_id}")
+async def request_delta_download(
+        archive_id: int,
+        from_version: str,
+        current_user: User = Depends(get_current_user_dependency),
+        session: AsyncSession = Depends(get_session)
+):
+    """Що зміниться при оновленні з from_version до останньої версії + токен на завантаження дельти"""
+
+    archive = await session.get(Archive, archive_id)
+    if not archive:
+        raise HTTPException(status_code=404, detail="Archive not found")
+
+    if archive.archive_type != "free" and not await check_user_access(current_user.id, archive_id, session):
+        raise HTTPException(status_code=403, detail="Access denied. Please purchase or subscribe.")
+
+    plan = await archive_version_service.plan(session, archive, from_version)
+
+    download_token = file_service.generate_download_token(
+        user_id=current_user.id,
+        archive_id=archive_id,
+        expires_minutes=60
+    )
+
+    return {
+        "success": True,
+        **plan,
+        "download_token": download_token,
+        "download_url": f"/api/downloads/delta/file/{download_token}?from_version={quote(from_version)}",
+        "expires_in": 3600
+    }
+
+
+@router.get("/delta/file/{token}")
+async def download_delta(
+        token: str,
+        from_version: str,
+        session: AsyncSession = Depends(get_session)
+):
+    """Потоковий ZIP лише з доданими та зміненими файлами (і _delta.json зі списком видалених)"""
+
+    token_data = file_service.validate_download_token(token)
+    if not token_data:
+        raise HTTPException(status_code=401, detail="Invalid or expired download token")
+
+    archive = await session.get(Archive, token_data["archive_id"])
+    if not archive:
+        raise HTTPException(status_code=404, detail="Archive not found")
+
+    plan = await archive_version_service.plan(session, archive, from_version)
+    target = await archive_version_service.latest(session, archive.id)
+
+    source_path = await executor_service.run_io(archive_version_service.archive_source, archive)
+    if source_path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    # Файли дельти беруться з поточного архіву - він має відповідати останній версії
+    fingerprint = await executor_service.run_io(archive_version_service.source_fingerprint, source_path)
+    if fingerprint != target.source_fingerprint:
+        raise HTTPException(
+            status_code=409,
+            detail="Archive file changed since the latest version was published"
+        )
+
+    if not await file_service.consume_download_token(session, token_data):
+        raise HTTPException(status_code=401, detail="Download limit reached for this token")
+    await session.commit()
+
+    logger.info(
+        f"User {token_data['user_id']} downloading delta of {archive.code} "
+        f"{plan['from_version']} -> {plan['to_version']}: {len(plan['added']) + len(plan['changed'])} files"
+    )
+
+    download_filename = archive_download_filename(archive, f"_{plan['from_version']}-{plan['to_version']}.zip")
+    return StreamingResponse(
+        archive_version_service.stream_delta(source_path, plan),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={download_filename}",
+            "Cache-Control": "private, no-cache"
+        }
+    )
+
+
 @router.get("/file/{token}")
 async def download_file(
         token: str,
-        background_tasks: BackgroundTasks,
+        request: Request,
         session: AsyncSession = Depends(get_session)
 ):
-    """Завантажити файл за токеном"""
+    """Завантажити файл за токеном (підтримує Range для докачування)"""
 
     # Перевіряємо токен
     token_data = file_service.validate_download_token(token)
@@ -110,39 +250,56 @@ async def download_file(
     if not archive:
         raise HTTPException(status_code=404, detail="Archive not found")
 
+    # Архів-папку можна віддати потоковим ZIP, без збирання файлу на диску
+    if settings.FOLDER_ZIP_MODE == "stream":
+        folder_path = file_service.get_archive_folder(archive.code, archive.archive_type)
+        if folder_path:
+            return await stream_archive_folder(archive, folder_path, token_data, session)
+
     # Отримуємо файл
     file_path = await file_service.get_archive_file_path(archive.code, archive.archive_type)
 
     if not file_path or not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
 
-    # Оновлюємо лічильник завантажень
-    file_service.downloads_cache[token]["downloads"] += 1
-
-    # Оновлюємо статистику архіву
-    archive.purchase_count += 1
+    # Визначаємо ім'я файлу для завантаження
+    download_filename = archive_download_filename(archive, file_path.suffix)
+
+    # Кожне завантаження дає бюджет в один розмір файлу; відповідь резервує свої байти,
+    # а невіддані (розрив з'єднання) повертаються - тож докачування з місця розриву
+    # безкоштовне, а повторне отримання файлу через Range витрачає завантаження
+    try:
+        byte_range = requested_range(request, file_path)
+    except ValueError:
+        # Неможливий діапазон - 416 без витрати завантаження
+        return ranged_file_response(request, file_path, download_filename)
+
+    file_size = file_path.stat().st_size
+    start, end = byte_range if byte_range is not None else (0, file_size - 1)
+    length = end - start + 1
+
+    charged = await file_service.reserve_download_bytes(session, token_data, file_size, length)
+    if charged is None:
+        raise HTTPException(status_code=401, detail="Download limit reached for this token")
     await session.commit()
 
-    # Логуємо завантаження
-    logger.info(f"User {token_data['user_id']} downloading archive {archive.code}")
+    if charged:
+        # Оновлюємо статистику архіву
+        counter_service.increment("archive.purchase_count", archive.id)
 
-    # Чистимо кеш в фоні
-    background_tasks.add_task(file_service.cleanup_expired_tokens)
+        # Логуємо завантаження
+        logger.info(f"User {token_data['user_id']} downloading archive {archive.code}")
 
-    # Визначаємо ім'я файлу для завантаження
-    download_filename = f"{archive.code}_{archive.title.get('en', 'archive').replace(' ', '_')}{file_path.suffix}"
+    async def release_unsent(sent: int):
+        await file_service.release_download_bytes(token_data["token_id"], length - sent)
 
-    # Повертаємо файл
-    return FileResponse(
-        path=file_path,
-        filename=download_filename,
-        media_type="application/octet-stream",
-        headers={
-            "Content-Disposition": f"attachment; filename={download_filename}",
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0"
-        }
+    # Повертаємо файл (з підтримкою Range/If-Range)
+    return ranged_file_response(
+        request,
+        file_path,
+        download_filename,
+        headers={"Cache-Control": "private, no-cache"},
+        on_finish=release_unsent
     )
 
 
@@ -163,6 +320,23 @@ async def get_archive_preview(
     if not archive:
         raise HTTPException(status_code=404, detail="Archive not found")
 
+    # Якщо вміст проіндексовано - будуємо превью з індексу, не відкриваючи архів
+    summary = await archive_content_service.summary(session, archive.code)
+    if summary:
+        file_list = await archive_content_service.file_paths(session, archive.code)
+        content = await executor_service.run_io(
+            file_service.render_preview, archive.code, file_list, summary["compressed_size"]
+        )
+        return {
+            "success": True,
+            "archive": {
+                "id": archive.id,
+                "code": archive.code,
+                "title": archive.title
+            },
+            "preview": content
+        }
+
     # Перевіряємо чи є превью
     preview_path = settings.MEDIA_DIR / "previews" / f"preview_{archive_id}.txt"
 
@@ -202,12 +376,10 @@ async def get_user_archives(
     """Отримати список архівів доступних користувачу"""
 
     user_archives = []
+    catalog = await catalog_service.get()
 
     # 1. Безкоштовні архіви
-    free_result = await session.execute(
-        select(Archive).where(Archive.archive_type == "free")
-    )
-    free_archives = free_result.scalars().all()
+    free_archives = [archive for archive in catalog.views["id"] if archive.archive_type == "free"]
 
     for archive in free_archives:
         user_archives.append({
@@ -223,12 +395,13 @@ async def get_user_archives(
 
     # 2. Куплені архіви
     purchased_result = await session.execute(
-        select(ArchivePurchase, Archive)
-        .join(Archive, ArchivePurchase.archive_id == Archive.id)
-        .where(ArchivePurchase.user_id == current_user.id)
+        select(ArchivePurchase).where(ArchivePurchase.user_id == current_user.id)
     )
 
-    for purchase, archive in purchased_result.all():
+    for purchase in purchased_result.scalars().all():
+        archive = catalog.get(purchase.archive_id)
+        if not archive:
+            continue
         user_archives.append({
             "archive": {
                 "id": archive.id,
@@ -243,12 +416,13 @@ async def get_user_archives(
 
     # 3. Архіви з підписки
     subscription_result = await session.execute(
-        select(SubscriptionArchive, Archive)
-        .join(Archive, SubscriptionArchive.archive_id == Archive.id)
-        .where(SubscriptionArchive.user_id == current_user.id)
+        select(SubscriptionArchive).where(SubscriptionArchive.user_id == current_user.id)
     )
 
-    for sub_archive, archive in subscription_result.all():
+    for sub_archive in subscription_result.scalars().all():
+        archive = catalog.get(sub_archive.archive_id)
+        if not archive:
+            continue
         user_archives.append({
             "archive": {
                 "id": archive.id,
@@ -263,34 +437,164 @@ async def get_user_archives(
 
     return {
         "total": len(user_archives),
-        "archives": user_archives
+        "archives": user_archives,
+        "catalog_version": catalog.version
     }
 
 
 async def check_user_access(user_id: int, archive_id: int, session: AsyncSession) -> bool:
     """Перевірити чи має користувач доступ до архіву"""
+    return await entitlement_service.has_access(session, user_id, archive_id)
 
-    # Перевіряємо покупку
-    purchase_result = await session.execute(
-        select(ArchivePurchase).where(
-            ArchivePurchase.user_id == user_id,
-            ArchivePurchase.archive_id == archive_id
-        )
-    )
-    if purchase_result.scalar_one_or_none():
-        return True
 
-    # Перевіряємо підписку
-    subscription_result = await session.execute(
-        select(SubscriptionArchive).where(
-            SubscriptionArchive.user_id == user_id,
-            SubscriptionArchive.archive_id == archive_id
-        )
+@router.post("/access")
+async def get_archives_access(
+        data: dict,
+        current_user: User = Depends(get_current_user_dependency),
+        session: AsyncSession = Depends(get_session)
+):
+    """Доступ користувача до кількох архівів одним запитом (напр. до карток сторінки каталогу)"""
+
+    archive_ids = parse_archive_ids(data)
+    access = await entitlement_service.get_access(session, current_user.id, archive_ids)
+
+    return {
+        "access": {str(archive_id): access_type for archive_id, access_type in access.items()},
+        "owned": [archive_id for archive_id, access_type in access.items() if access_type]
+    }
+
+
+def parse_archive_ids(data: dict) -> list:
+    """archive_ids з тіла запиту: до 100 цілих, без повторів, у вихідному порядку"""
+    archive_ids = data.get("archive_ids") or []
+    if not isinstance(archive_ids, list) or len(archive_ids) > 100:
+        raise HTTPException(status_code=422, detail="archive_ids must be a list of at most 100 ids")
+    try:
+        return list(dict.fromkeys(int(archive_id) for archive_id in archive_ids))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422, detail="archive_ids must contain integers")
+
+
+async def load_bundle_sources(session: AsyncSession, archive_ids: list) -> list:
+    """Пари (архів, файл або папка) у порядку archive_ids; 404 якщо чогось немає"""
+    result = await session.execute(select(Archive).where(Archive.id.in_(archive_ids)))
+    archives = {archive.id: archive for archive in result.scalars().all()}
+
+    missing = [archive_id for archive_id in archive_ids if archive_id not in archives]
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Archives not found", "archive_ids": missing})
+
+    sources = []
+    for archive_id in archive_ids:
+        archive = archives[archive_id]
+        source_path = await executor_service.run_io(archive_version_service.archive_source, archive)
+        if source_path is None:
+            missing.append(archive_id)
+        sources.append((archive, source_path))
+
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Archive files not found", "archive_ids": missing})
+    return sources
+
+
+def bundle_zip_entries(sources: list):
+    """
+    Записи для stream_zip: архів-файл - одним записом (вже стиснений, як є),
+    архів-папка - її файлами під папкою {code}/.
+    """
+    for archive, source_path in sources:
+        if source_path.is_dir():
+            yield from file_service.folder_zip_entries(source_path)
+        else:
+            info = zipfile.ZipInfo.from_file(source_path, archive_download_filename(archive, source_path.suffix))
+            yield info, functools.partial(open, source_path, 'rb')
+
+
+def bundle_size(sources: list) -> int:
+    """Сумарний розмір файлів набору (без заголовків ZIP)"""
+    total = 0
+    for _, source_path in sources:
+        if source_path.is_dir():
+            total += sum(path.stat().st_size for path in source_path.rglob("*") if path.is_file())
+        else:
+            total += source_path.stat().st_size
+    return total
+
+
+@router.post("/bundle")
+async def request_bundle_download(
+        data: dict,
+        current_user: User = Depends(get_current_user_dependency),
+        session: AsyncSession = Depends(get_session)
+):
+    """Токен на завантаження кількох доступних архівів одним ZIP"""
+
+    archive_ids = parse_archive_ids(data)
+    if not archive_ids:
+        raise HTTPException(status_code=422, detail="archive_ids must not be empty")
+
+    # Доступ до всіх архівів - одним запитом
+    access = await entitlement_service.get_access(session, current_user.id, archive_ids)
+    denied = [archive_id for archive_id, access_type in access.items() if access_type is None]
+    if denied:
+        raise HTTPException(status_code=403, detail={"message": "Access denied", "archive_ids": denied})
+
+    sources = await load_bundle_sources(session, archive_ids)
+    total_size = await executor_service.run_io(bundle_size, sources)
+
+    download_token = file_service.generate_bundle_token(
+        user_id=current_user.id,
+        archive_ids=archive_ids,
+        expires_minutes=60
     )
-    if subscription_result.scalar_one_or_none():
-        return True
 
-    return False
+    return {
+        "success": True,
+        "archives": [
+            {"id": archive.id, "code": archive.code, "title": archive.title, "type": archive.archive_type}
+            for archive, _ in sources
+        ],
+        "total_size": total_size,
+        "download_token": download_token,
+        "download_url": f"/api/downloads/bundle/{download_token}",
+        "expires_in": 3600
+    }
+
+
+@router.get("/bundle/{token}")
+async def download_bundle(
+        token: str,
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Один потоковий ZIP з усіма архівами набору. Записи без стиснення (архіви вже
+    стиснені), тому віддача обмежена диском, а пам'ять стала незалежно від розміру.
+    """
+
+    token_data = file_service.validate_bundle_token(token)
+    if not token_data:
+        raise HTTPException(status_code=401, detail="Invalid or expired download token")
+
+    archive_ids = token_data["archive_ids"]
+    sources = await load_bundle_sources(session, archive_ids)
+
+    if not await file_service.consume_download_token(session, token_data):
+        raise HTTPException(status_code=401, detail="Download limit reached for this token")
+    await session.commit()
+
+    for archive_id in archive_ids:
+        counter_service.increment("archive.purchase_count", archive_id)
+
+    logger.info(f"User {token_data['user_id']} downloading bundle of {len(archive_ids)} archives")
+
+    return StreamingResponse(
+        file_service.stream_zip(bundle_zip_entries(sources), compress=False),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=archives_bundle_{len(archive_ids)}.zip",
+            "Cache-Control": "private, no-cache"
+        }
+    )
 
 
 @router.get("/statistics")
@@ -1,52 +1,37 @@
 # backend/api/history.py
 
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, text
-from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import select
 from database import get_session
 from models.user import User
 from models.archive import Archive
-from models.view_history import ViewHistory
+from services.catalog import catalog_service
+from services.counters import counter_service
+from services.analytics import analytics_service
+from services.view_history import view_history_service
 from .dependencies import get_current_user_dependency
-from typing import List
 
 router = APIRouter()
-MAX_HISTORY_ITEMS = 20
-
-
-async def cleanup_history(user_id: int, session: AsyncSession):
-    """Видаляє старі записи з історії, залишаючи тільки MAX_HISTORY_ITEMS."""
-    subquery = select(ViewHistory.id).where(ViewHistory.user_id == user_id).order_by(
-        ViewHistory.viewed_at.desc()).offset(MAX_HISTORY_ITEMS).scalar_subquery()
-    await session.execute(
-        delete(ViewHistory).where(ViewHistory.user_id == user_id, ViewHistory.id.in_(subquery))
-    )
-    await session.commit()
 
 
 @router.post("/view/{archive_id}")
 async def track_view(
         archive_id: int,
-        background_tasks: BackgroundTasks,
-        current_user: User = Depends(get_current_user_dependency),
-        session: AsyncSession = Depends(get_session)
+        source: Optional[str] = None,
+        current_user: User = Depends(get_current_user_dependency)
 ):
-    """Записує перегляд архіву."""
-    stmt = sqlite_insert(ViewHistory).values(
-        user_id=current_user.id,
-        archive_id=archive_id
-    )
-    # Специфічний синтаксис для SQLite, який оновлює запис при конфлікті
-    stmt = stmt.on_conflict_do_update(
-        index_elements=['user_id', 'archive_id'],
-        set_={'viewed_at': text('CURRENT_TIMESTAMP')}
-    )
-    await session.execute(stmt)
-    await session.commit()
+    """Записує перегляд архіву (в БД потрапляє пачкою, див. services/view_history.py)."""
+    catalog = await catalog_service.get()
+    if catalog.get(archive_id) is None:
+        raise HTTPException(status_code=404, detail="Archive not found")
+
+    view_history_service.record(current_user.id, archive_id)
 
-    # Додаємо очистку старих записів у фоновому режимі
-    background_tasks.add_task(cleanup_history, user_id=current_user.id, session=session)
+    # Перегляд товару маркетплейсу (якщо архів - товар розробника)
+    counter_service.increment("product.view_count", archive_id)
+    analytics_service.record("view", archive_id, visitor=current_user.id, source=source)
 
     return {"status": "ok"}
 
@@ -57,15 +42,13 @@ async def get_recently_viewed(
         session: AsyncSession = Depends(get_session)
 ):
     """Повертає список останніх переглянутих архівів."""
-    result = await session.execute(
-        select(Archive)
-        .join(ViewHistory, Archive.id == ViewHistory.archive_id)
-        .where(ViewHistory.user_id == current_user.id)
-        .order_by(ViewHistory.viewed_at.desc())
-        .limit(MAX_HISTORY_ITEMS)
-    )
-    archives = result.scalars().all()
-    return archives
+    archive_ids = await view_history_service.recent_ids(session, current_user.id)
+    if not archive_ids:
+        return []
+
+    result = await session.execute(select(Archive).where(Archive.id.in_(archive_ids)))
+    archives = {archive.id: archive for archive in result.scalars().all()}
+    return [archives[archive_id] for archive_id in archive_ids if archive_id in archives]
 
 # НОВИЙ ЕНДПОІНТ
 @router.delete("/clear")
@@ -74,8 +57,5 @@ async def clear_history(
     session: AsyncSession = Depends(get_session)
 ):
     """Видалити всю історію переглядів для поточного користувача."""
-    await session.execute(
-        delete(ViewHistory).where(ViewHistory.user_id == current_user.id)
-    )
-    await session.commit()
-    return {"status": "ok", "message": "History cleared"}
\ No newline at end of file
+    await view_history_service.clear(session, current_user.id)
+    return {"status": "ok", "message": "History cleared"}
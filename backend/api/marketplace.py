@@ -21,6 +21,11 @@ from models.marketplace import (
     MarketplaceTransaction, DeveloperWithdrawal, ProductReview
 )
 from api.dependencies import get_current_user_dependency, admin_required
+from services.search_index import archive_search_index
+from services.catalog import catalog_service
+from services.archive_versions import archive_version_service
+from services.counters import counter_service
+from services.analytics import analytics_service
 from config import settings
 
 router = APIRouter()
@@ -54,6 +59,12 @@ class MarketplaceProductCreate(BaseModel):
     meta_description: Optional[str] = None
 
 
+class ProductVersionCreate(BaseModel):
+    """Публікація нової версії товару"""
+    version: str = Field(..., min_length=1, max_length=20, pattern=r"^[\w.\-]+$")
+    changelog: Optional[str] = Field(None, max_length=5000)
+
+
 class ProductReviewCreate(BaseModel):
     """Створення відгуку"""
     rating: int = Field(..., ge=1, le=5)
@@ -348,6 +359,7 @@ async def create_marketplace_product(
 
     session.add(archive)
     await session.flush()
+    await archive_search_index.upsert(session, archive)
 
     # Створюємо товар маркетплейсу
     marketplace_product = MarketplaceProduct(
@@ -408,7 +420,7 @@ async def get_developer_products(
         "title": archive.title,
         "price": archive.price,
         "status": product.status.value,
-        "view_count": product.view_count,
+        "view_count": (product.view_count or 0) + counter_service.pending("product.view_count", archive.id),
         "sale_count": product.sale_count,
         "revenue": product.revenue,
         "version": product.version,
@@ -451,6 +463,49 @@ async def submit_for_review(
     return {"success": True, "message": "Product submitted for review"}
 
 
+@router.post("/products/{product_id}/versions")
+async def publish_product_version(
+        product_id: int,
+        version_data: ProductVersionCreate,
+        current_user: User = Depends(get_current_user_dependency),
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Опублікувати нову версію товару: зафіксувати хеші файлів поточного архіву,
+    щоб покупці могли завантажити лише зміни
+    """
+
+    # Перевіряємо власника
+    result = await session.execute(
+        select(MarketplaceProduct).join(DeveloperProfile).where(
+            MarketplaceProduct.id == product_id,
+            DeveloperProfile.user_id == current_user.id
+        )
+    )
+
+    product = result.scalar_one_or_none()
+
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    archive = await session.get(Archive, product.archive_id)
+
+    product.version = version_data.version
+    product.changelog = version_data.changelog
+    product.last_updated = datetime.utcnow()
+
+    archive_version = await archive_version_service.publish(
+        session, archive, version_data.version, version_data.changelog
+    )
+
+    return {
+        "success": True,
+        "version": archive_version.version,
+        "files_count": archive_version.files_count,
+        "total_size": archive_version.total_size
+    }
+
+
 # ===== МОДЕРАЦІЯ ТОВАРІВ =====
 
 @router.get("/admin/products/pending")
@@ -507,6 +562,7 @@ async def approve_product(
         archive.is_active = True
 
     await session.commit()
+    await catalog_service.invalidate()
 
     return {"success": True, "message": "Product approved"}
 
@@ -580,6 +636,27 @@ async def get_developer_balance(
     }
 
 
+@router.get("/analytics")
+async def get_developer_analytics(
+        days: int = Query(30, ge=1, le=365),
+        current_user: User = Depends(get_current_user_dependency),
+        session: AsyncSession = Depends(get_session)
+):
+    """Аналітика розробника за останні days днів (з попередньо згорнутих денних рядків)"""
+
+    result = await session.execute(
+        select(DeveloperProfile).where(
+            DeveloperProfile.user_id == current_user.id
+        )
+    )
+    developer = result.scalar_one_or_none()
+
+    if not developer:
+        raise HTTPException(status_code=404, detail="Developer profile not found")
+
+    return await analytics_service.developer_summary(session, developer.id, days)
+
+
 @router.post("/withdraw")
 async def request_withdrawal(
         request: WithdrawalRequest,
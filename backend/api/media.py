@@ -0,0 +1,89 @@
+# backend/api/media.py
+"""
+Зменшені варіанти зображень на льоту: /media/img/{w}x{h}/{path}
+
+Варіант генерується при першому запиті в пулі процесів, далі віддається з
+дискового кешу. URL разом з Accept однозначно визначають вміст (для зміненого
+оригіналу змінюється ETag), тому відповідь кешується браузером/CDN назавжди.
+"""
+import logging
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from config import settings
+from services.image_pipeline import (
+    image_pipeline, VARIANT_CACHE_DIR, VARIANT_DIMENSIONS, VARIANT_SOURCE_EXTENSIONS
+)
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def parse_dimensions(size: str) -> tuple:
+    """'400x300' -> (400, 300); розміри тільки з дозволеного списку"""
+    width_str, sep, height_str = size.lower().partition("x")
+    try:
+        width, height = int(width_str), int(height_str)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Size must be in WxH format")
+
+    if not sep or (width == 0 and height == 0):
+        raise HTTPException(status_code=400, detail="Size must be in WxH format")
+    if width not in VARIANT_DIMENSIONS or height not in VARIANT_DIMENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported size. Allowed: {sorted(VARIANT_DIMENSIONS)}"
+        )
+    return width, height
+
+
+def resolve_source(path: str) -> Path:
+    """Шлях до оригіналу всередині MEDIA_DIR (без виходу за межі та без самих варіантів)"""
+    media_dir = settings.MEDIA_DIR.resolve()
+    source = (media_dir / path).resolve()
+
+    if not source.is_relative_to(media_dir) or source.is_relative_to(VARIANT_CACHE_DIR.resolve()):
+        raise HTTPException(status_code=404, detail="Image not found")
+    if source.suffix.lower() not in VARIANT_SOURCE_EXTENSIONS or not source.is_file():
+        raise HTTPException(status_code=404, detail="Image not found")
+    return source
+
+
+@router.get("/img/{size}/{path:path}")
+async def get_image_variant(size: str, path: str, request: Request, format: str = None):
+    """
+    Зменшене зображення з media/{path}, яке вміщається в WxH (0 - без обмеження).
+
+    Формат - з параметра ?format=jpeg|webp|avif або за заголовком Accept.
+    """
+    width, height = parse_dimensions(size)
+    source = resolve_source(path)
+
+    if format:
+        format_name = "jpeg" if format.lower() == "jpg" else format.lower()
+        if format_name not in image_pipeline.formats:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported format. Allowed: {image_pipeline.formats}"
+            )
+    else:
+        format_name = image_pipeline.negotiate_format(request.headers.get("accept", ""))
+
+    variant_path = await image_pipeline.variant(source, width, height, format_name)
+
+    # Ім'я файлу варіанта - хеш джерела та параметрів, тому годиться як ETag
+    etag = f'"{variant_path.stem}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if not format:
+        headers["Vary"] = "Accept"
+
+    if_none_match = request.headers.get("if-none-match", "")
+    client_tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in client_tags or "*" in client_tags:
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(variant_path, media_type=f"image/{format_name}", headers=headers)
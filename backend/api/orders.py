@@ -9,11 +9,13 @@ from database import get_session
 from models.archive import Archive, ArchivePurchase
 from models.order import Order, OrderItem
 from models.user import User
-from models.bonus import BonusTransaction, BonusTransactionType
+from models.bonus import BonusTransactionType
 from models.notification import Notification
 from models.promo_code import PromoCode, DiscountType
 from config import settings
 from services.telegram import telegram_service
+from services.analytics import analytics_service
+from services.bonus import bonus_ledger
 from .dependencies import get_current_user_dependency
 from .vip_processing import update_vip_status_after_purchase
 
@@ -179,7 +181,7 @@ async def create_order(
         validation = await validate_bonus_payment(
             subtotal=subtotal - discount,  # Враховуємо знижку від промокоду
             bonuses_to_use=bonuses_to_use,
-            user_bonuses=current_user.bonuses
+            user_bonuses=current_user.bonus_balance or 0
         )
 
         if not validation["valid"]:
@@ -224,20 +226,13 @@ async def create_order(
 
     # Якщо оплата повністю бонусами (total = 0)
     if total == 0:
-        # Списуємо бонуси
-        current_user.bonuses -= bonuses_to_use
-        current_user.total_bonuses_spent += bonuses_to_use
-
-        # Записуємо транзакцію
-        transaction = BonusTransaction(
-            user_id=current_user.id,
-            amount=-bonuses_to_use,
-            balance_after=current_user.bonuses,
-            type=BonusTransactionType.PURCHASE_PAYMENT,
-            description=f"Оплата замовлення #{order.order_id}",
-            order_id=order.id
-        )
-        session.add(transaction)
+        # Списуємо бонуси (400, якщо паралельний запит вже їх витратив)
+        if bonuses_to_use > 0:
+            await bonus_ledger.debit(
+                session, current_user.id, bonuses_to_use, BonusTransactionType.PURCHASE_PAYMENT,
+                description=f"Оплата замовлення #{order.order_id}",
+                order_id=order.id
+            )
 
         # Надаємо доступ до архівів
         await grant_user_access_to_purchased_items(order.id, current_user.id, session)
@@ -251,6 +246,13 @@ async def create_order(
     await session.commit()
     await session.refresh(order)
 
+    for item_data in order_items:
+        analytics_service.record("checkout_started", item_data["archive"].id, visitor=current_user.id)
+        if order.status == "completed":
+            analytics_service.record(
+                "sale", item_data["archive"].id, visitor=current_user.id, revenue=item_data["price"]
+            )
+
     return {
         "success": True,
         "order_id": order.order_id,
@@ -280,10 +282,10 @@ async def check_bonus_limit(
     max_allowed_bonuses = int(total_in_bonuses * settings.BONUS_PURCHASE_CAP)
 
     # Обмежуємо балансом користувача
-    available_bonuses = min(max_allowed_bonuses, current_user.bonuses)
+    available_bonuses = min(max_allowed_bonuses, current_user.bonus_balance or 0)
 
     return {
-        "user_bonuses": current_user.bonuses,
+        "user_bonuses": current_user.bonus_balance or 0,
         "max_allowed_bonuses": max_allowed_bonuses,
         "available_to_use": available_bonuses,
         "percentage_limit": settings.BONUS_PURCHASE_CAP * 100,
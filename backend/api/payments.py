@@ -9,15 +9,18 @@ from models.order import Order, OrderItem
 # --- ОСЬ ТУТ ВИПРАВЛЕННЯ ---
 from models.archive import Archive, ArchivePurchase
 from models.subscription import Subscription, SubscriptionStatus
-from models.bonus import BonusTransaction, BonusTransactionType, VipLevel
+from models.bonus import BonusTransactionType, VipLevel
 from models.notification import Notification
 from services.cryptomus import cryptomus_service
+from services.analytics import analytics_service
+from services.bonus import bonus_ledger
 from config import settings
 from .dependencies import get_current_user_dependency
 from datetime import datetime, timedelta, timezone
 import uuid
 import json
 import logging
+from typing import List
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -186,6 +189,7 @@ async def cryptomus_webhook(
 
         payment.status = new_status
         payment.payment_data["cryptomus_status"] = status
+        sold_items = []
         payment.payment_data["txid"] = txid
         payment.payment_data["last_webhook"] = datetime.utcnow().isoformat()
 
@@ -198,7 +202,7 @@ async def cryptomus_webhook(
 
             if metadata.get("type") == "order":
                 # Оплата замовлення
-                await process_order_payment(payment, session)
+                sold_items = await process_order_payment(payment, session)
 
             elif metadata.get("type") == "subscription":
                 # Оплата підписки
@@ -206,6 +210,10 @@ async def cryptomus_webhook(
 
         await session.commit()
 
+        # Продажі пишемо в журнал аналітики лише після успішного commit
+        for item in sold_items:
+            analytics_service.record("sale", item.archive_id, visitor=payment.user_id, revenue=item.price)
+
         return {"status": "success"}
 
     except Exception as e:
@@ -213,10 +221,10 @@ async def cryptomus_webhook(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def process_order_payment(payment: Payment, session: AsyncSession):
-    """Обробка оплати замовлення"""
+async def process_order_payment(payment: Payment, session: AsyncSession) -> List[OrderItem]:
+    """Обробка оплати замовлення; повертає оплачені позиції (для аналітики після commit)"""
     order = await session.get(Order, payment.order_id)
-    if not order: return
+    if not order: return []
 
     order.status = "completed"
     order.completed_at = datetime.utcnow()
@@ -274,6 +282,7 @@ async def process_order_payment(payment: Payment, session: AsyncSession):
             await process_referral_first_purchase(order.id, session)
 
     logger.info(f"Order {order.order_id} completed via payment {payment.payment_id}")
+    return order_items
 
 
 async def process_subscription_payment(payment: Payment, session: AsyncSession):
@@ -381,22 +390,14 @@ async def process_cashback(user: User, order: Order, session: AsyncSession):
 
     if cashback_amount > 0:
         # Нараховуємо бонуси
-        user.bonuses += cashback_amount
-        user.total_bonuses_earned += cashback_amount
-
-        # Оновлюємо VIP статистику
-        vip.total_cashback_earned += cashback_amount
-
-        # Записуємо транзакцію
-        transaction = BonusTransaction(
-            user_id=user.id,
-            amount=cashback_amount,
-            balance_after=user.bonuses,
-            type=BonusTransactionType.PURCHASE_CASHBACK,
+        await bonus_ledger.credit(
+            session, user.id, cashback_amount, BonusTransactionType.PURCHASE_CASHBACK,
             description=f"Cashback {int(vip.cashback_rate * 100)}% from order #{order.order_id}",
             order_id=order.id
         )
-        session.add(transaction)
+
+        # Оновлюємо VIP статистику
+        vip.total_cashback_earned += cashback_amount
 
         logger.info(f"Cashback {cashback_amount} bonuses for user {user.id}")
 
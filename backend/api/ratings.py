@@ -7,10 +7,10 @@ from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from database import get_session
 from models.user import User
-from models.archive import Archive, ArchivePurchase
-from models.subscription import SubscriptionArchive
+from models.archive import Archive
 from models.archive_rating import ArchiveRating
-from models.order import Order, OrderItem  # <-- ДОДАНО ІМПОРТИ
+from services.catalog import catalog_service
+from services.entitlements import entitlement_service
 from .dependencies import get_current_user_dependency
 from typing import List, Dict
 
@@ -19,39 +19,10 @@ router = APIRouter()
 
 # Функція для перевірки доступу до архіву
 async def check_user_access(user_id: int, archive_id: int, session: AsyncSession) -> bool:
-    # 1. Перевіряємо, чи архів безкоштовний
-    archive = await session.get(Archive, archive_id)
-    if not archive:
+    catalog = await catalog_service.get()
+    if catalog.get(archive_id) is None and not await session.get(Archive, archive_id):
         raise HTTPException(status_code=404, detail="Archive not found")
-    if archive.archive_type == 'free':
-        return True
-
-    # 2. Перевіряємо, чи був він куплений (запис в ArchivePurchase)
-    purchase = await session.execute(
-        select(ArchivePurchase).where(ArchivePurchase.user_id == user_id, ArchivePurchase.archive_id == archive_id))
-    if purchase.scalar_one_or_none():
-        return True
-
-    # 3. Перевіряємо, чи був він розблокований по підписці
-    subscription = await session.execute(select(SubscriptionArchive).where(SubscriptionArchive.user_id == user_id,
-                                                                           SubscriptionArchive.archive_id == archive_id))
-    if subscription.scalar_one_or_none():
-        return True
-
-    # 4. ВИПРАВЛЕННЯ: Перевіряємо, чи є у користувача завершене замовлення з цим товаром
-    completed_order = await session.execute(
-        select(Order.id)
-        .join(OrderItem, Order.id == OrderItem.order_id)
-        .where(
-            Order.user_id == user_id,
-            Order.status == 'completed',
-            OrderItem.archive_id == archive_id
-        )
-    )
-    if completed_order.scalar_one_or_none():
-        return True
-
-    return False
+    return await entitlement_service.has_access(session, user_id, archive_id)
 
 
 # Функція для перерахунку середнього рейтингу
@@ -67,6 +38,7 @@ async def recalculate_average_rating(archive_id: int, session: AsyncSession):
         archive.average_rating = round(avg_rating, 2) if avg_rating else 0
         archive.ratings_count = count
         await session.commit()
+        await catalog_service.update_rating(archive_id, archive.average_rating, archive.ratings_count)
 
 
 @router.post("/{archive_id}")
@@ -1,10 +1,11 @@
 # backend/api/referrals.py
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, desc
+from sqlalchemy import select, update, and_, func, desc
 from database import get_session
 from models.user import User
-from models.bonus import UserReferral, BonusTransaction, BonusTransactionType
+from models.bonus import UserReferral, BonusTransactionType
+from services.bonus import bonus_ledger
 from config import settings
 from .dependencies import get_current_user_dependency
 from typing import Optional
@@ -96,18 +97,10 @@ async def apply_referral_code(
     # Нараховуємо welcome бонуси новому користувачу
     welcome_bonus = settings.WELCOME_BONUS_AMOUNT
     if welcome_bonus > 0:
-        current_user.bonuses += welcome_bonus
-        current_user.total_bonuses_earned += welcome_bonus
-
-        # Записуємо транзакцію
-        transaction = BonusTransaction(
-            user_id=current_user.id,
-            amount=welcome_bonus,
-            balance_after=current_user.bonuses,
-            type=BonusTransactionType.REFERRAL_BONUS,
-            description=f"Welcome bonus from referral"
+        await bonus_ledger.credit(
+            session, current_user.id, welcome_bonus, BonusTransactionType.REFERRAL_BONUS,
+            description="Welcome bonus from referral"
         )
-        session.add(transaction)
 
     # Оновлюємо статистику рефера
     referrer.invited_count += 1
@@ -295,68 +288,54 @@ async def process_referral_first_purchase(
     if not referral:
         return {"success": False, "message": "Referral link not found"}
 
+    # Нарахування реферу збираються і проводяться одним пакетом
+    credits = []
+
     # Якщо це перша покупка
     if not referral.first_purchase_made:
-        # Отримуємо реферера
-        referrer_result = await session.execute(
-            select(User).where(User.id == referral.referrer_id)
-        )
-        referrer = referrer_result.scalar_one_or_none()
-
-        if referrer:
-            # Нараховуємо бонус за першу покупку
-            first_purchase_bonus = settings.BONUS_PER_REFERRAL
-            referrer.bonuses += first_purchase_bonus
-            referrer.total_bonuses_earned += first_purchase_bonus
-            referrer.referral_earnings += first_purchase_bonus
-
-            # Записуємо транзакцію
-            transaction = BonusTransaction(
-                user_id=referrer.id,
-                amount=first_purchase_bonus,
-                balance_after=referrer.bonuses,
-                type=BonusTransactionType.REFERRAL_BONUS,
-                description=f"Referral first purchase by @{user.username or 'user'}",
-                referral_id=user.id
-            )
-            session.add(transaction)
+        first_purchase_bonus = settings.BONUS_PER_REFERRAL
+        credits.append({
+            "user_id": referral.referrer_id,
+            "amount": first_purchase_bonus,
+            "type": BonusTransactionType.REFERRAL_BONUS,
+            "description": f"Referral first purchase by @{user.username or 'user'}",
+            "referral_id": user.id
+        })
 
-            # Оновлюємо реферальний зв'язок
-            referral.first_purchase_made = True
-            referral.first_purchase_date = datetime.utcnow()
-            referral.bonuses_earned += first_purchase_bonus
+        # Оновлюємо реферальний зв'язок
+        referral.first_purchase_made = True
+        referral.first_purchase_date = datetime.utcnow()
+        referral.bonuses_earned += first_purchase_bonus
 
     # Нараховуємо процент від покупки
     if settings.REFERRAL_PURCHASE_PERCENT > 0:
-        referrer_result = await session.execute(
-            select(User).where(User.id == referral.referrer_id)
-        )
-        referrer = referrer_result.scalar_one_or_none()
-
-        if referrer:
-            purchase_bonus = int(order.total * settings.REFERRAL_PURCHASE_PERCENT)
-            if purchase_bonus > 0:
-                referrer.bonuses += purchase_bonus
-                referrer.total_bonuses_earned += purchase_bonus
-                referrer.referral_earnings += purchase_bonus
-
-                # Записуємо транзакцію
-                transaction = BonusTransaction(
-                    user_id=referrer.id,
-                    amount=purchase_bonus,
-                    balance_after=referrer.bonuses,
-                    type=BonusTransactionType.REFERRAL_PURCHASE,
-                    description=f"5% from referral purchase #{order.order_id}",
-                    referral_id=user.id,
-                    order_id=order.id
-                )
-                session.add(transaction)
-
-                # Оновлюємо статистику реферального зв'язку
-                referral.total_purchases += 1
-                referral.total_spent += order.total
-                referral.bonuses_earned += purchase_bonus
-                referral.total_earned += order.total * settings.REFERRAL_PURCHASE_PERCENT
+        purchase_bonus = int(order.total * settings.REFERRAL_PURCHASE_PERCENT)
+        if purchase_bonus > 0:
+            credits.append({
+                "user_id": referral.referrer_id,
+                "amount": purchase_bonus,
+                "type": BonusTransactionType.REFERRAL_PURCHASE,
+                "description": f"5% from referral purchase #{order.order_id}",
+                "referral_id": user.id,
+                "order_id": order.id
+            })
+
+            # Оновлюємо статистику реферального зв'язку
+            referral.total_purchases += 1
+            referral.total_spent += order.total
+            referral.bonuses_earned += purchase_bonus
+            referral.total_earned += order.total * settings.REFERRAL_PURCHASE_PERCENT
+
+    if credits:
+        balances = await bonus_ledger.credit_many(session, credits)
+        if referral.referrer_id in balances:
+            # referral_earnings - теж лічильник, тому на боці БД
+            await session.execute(
+                update(User)
+                .where(User.id == referral.referrer_id)
+                .values(referral_earnings=func.coalesce(User.referral_earnings, 0) + sum(item["amount"] for item in credits))
+                .execution_options(synchronize_session=False)
+            )
 
     await session.commit()
 
@@ -7,9 +7,13 @@ from database import get_session
 from models.subscription import Subscription, SubscriptionArchive, SubscriptionStatus, SubscriptionPlan
 from models.archive import Archive
 from models.user import User
-from models.bonus import BonusTransaction, BonusTransactionType
+from models.bonus import BonusTransactionType
 
 from config import settings
+from services.catalog import catalog_service
+from services.entitlements import entitlement_service
+from services.counters import counter_service
+from services.bonus import bonus_ledger
 from .dependencies import get_current_user_dependency
 from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict
@@ -129,10 +133,10 @@ async def create_subscription(
             )
 
         # Валідація 2: Достатньо бонусів
-        if current_user.bonuses < bonuses_to_use:
+        if (current_user.bonus_balance or 0) < bonuses_to_use:
             raise HTTPException(
                 status_code=400,
-                detail=f"Недостатньо бонусів. Потрібно: {bonuses_to_use}, є: {current_user.bonuses}"
+                detail=f"Недостатньо бонусів. Потрібно: {bonuses_to_use}, є: {current_user.bonus_balance or 0}"
             )
 
         # Валідація 3: Якщо використовуємо менше 70%, потрібна доплата
@@ -144,19 +148,11 @@ async def create_subscription(
                        f"потрібно доплатити ${remaining_usd:.2f} через Cryptomus"
             )
 
-        # Списуємо бонуси
-        current_user.bonuses -= bonuses_to_use
-        current_user.total_bonuses_spent += bonuses_to_use
-
-        # Записуємо транзакцію
-        transaction = BonusTransaction(
-            user_id=current_user.id,
-            amount=-bonuses_to_use,
-            balance_after=current_user.bonuses,
-            type=BonusTransactionType.SUBSCRIPTION_PAYMENT,
+        # Списуємо бонуси (перевірка балансу повторюється атомарно в UPDATE)
+        await bonus_ledger.debit(
+            session, current_user.id, bonuses_to_use, BonusTransactionType.SUBSCRIPTION_PAYMENT,
             description=f"Оплата підписки {plan} ({bonuses_to_use} бонусів)"
         )
-        session.add(transaction)
 
         # Рахуємо реальну суму в USD що була оплачена
         amount_paid = bonuses_to_use / settings.BONUSES_PER_USD
@@ -233,14 +229,14 @@ async def check_subscription_bonus_limit(
     max_allowed_bonuses = int(total_in_bonuses * settings.BONUS_PURCHASE_CAP)
 
     # Обмежуємо балансом користувача
-    can_use = min(max_allowed_bonuses, current_user.bonuses)
+    can_use = min(max_allowed_bonuses, current_user.bonus_balance or 0)
 
     return {
         "plan": plan,
         "price_usd": price,
         "price_in_bonuses": total_in_bonuses,
         "max_allowed_bonuses": max_allowed_bonuses,
-        "user_bonuses": current_user.bonuses,
+        "user_bonuses": current_user.bonus_balance or 0,
         "can_use_bonuses": can_use,
         "percentage_limit": settings.BONUS_PURCHASE_CAP * 100,
         "requires_additional_payment": can_use < total_in_bonuses,
@@ -271,14 +267,13 @@ async def get_available_archives(
             "archives": []
         }
 
-    # Отримуємо всі архіви що вийшли після початку підписки
-    new_archives_result = await session.execute(
-        select(Archive).where(
-            Archive.created_at >= subscription.start_date,
-            Archive.archive_type == 'premium'  # Тільки преміум архіви
-        ).order_by(Archive.created_at.desc())
-    )
-    new_archives = new_archives_result.scalars().all()
+    # Отримуємо всі архіви що вийшли після початку підписки (зі знімка каталогу)
+    catalog = await catalog_service.get()
+    new_archives = [
+        archive for archive in reversed(catalog.views["created_at"])
+        if archive.archive_type == 'premium'  # Тільки преміум архіви
+        and archive.created_at and archive.created_at >= subscription.start_date
+    ]
 
     # Отримуємо вже розблоковані архіви
     unlocked_result = await session.execute(
@@ -305,13 +300,10 @@ async def get_available_archives(
 
     # Також додаємо старі розблоковані архіви (з попередніх підписок)
     if unlocked_ids:
-        old_unlocked_result = await session.execute(
-            select(Archive).where(
-                Archive.id.in_(unlocked_ids),
-                Archive.created_at < subscription.start_date
-            )
-        )
-        old_archives = old_unlocked_result.scalars().all()
+        old_archives = [
+            archive for archive in map(catalog.get, unlocked_ids)
+            if archive and archive.created_at and archive.created_at < subscription.start_date
+        ]
 
         for archive in old_archives:
             archives_data.append({
@@ -330,7 +322,8 @@ async def get_available_archives(
         "subscription_end": subscription.end_date.isoformat(),
         "total_archives": len(archives_data),
         "unlocked_count": len(unlocked_ids),
-        "archives": archives_data
+        "archives": archives_data,
+        "catalog_version": catalog.version
     }
 
 
@@ -388,11 +381,10 @@ async def unlock_archive(
         user_id=current_user.id
     )
     session.add(unlock)
+    await session.commit()
 
     # Оновлюємо статистику архіву
-    archive.purchase_count += 1
-
-    await session.commit()
+    counter_service.increment("archive.purchase_count", archive.id)
 
     return {
         "success": True,
@@ -444,26 +436,9 @@ async def check_archive_access(
 ):
     """Перевірити чи має користувач доступ до архіву"""
 
-    # Перевіряємо чи куплений
-    purchased = await session.execute(
-        select(SubscriptionArchive).where(
-            SubscriptionArchive.user_id == current_user.id,
-            SubscriptionArchive.archive_id == archive_id
-        )
-    )
-    if purchased.scalar_one_or_none():
-        return {"has_access": True, "access_type": "subscription"}
-
-    # Перевіряємо чи архів безкоштовний
-    archive_result = await session.execute(
-        select(Archive).where(Archive.id == archive_id)
-    )
-    archive = archive_result.scalar_one_or_none()
-
-    if archive and archive.archive_type == 'free':
-        return {"has_access": True, "access_type": "free"}
-
-    # Перевіряємо окрему покупку (якщо є в orders)
-    # Тут можна додати перевірку покупок
+    access = await entitlement_service.get_access(session, current_user.id, [archive_id])
+    access_type = access[archive_id]
+    if access_type:
+        return {"has_access": True, "access_type": access_type}
 
     return {"has_access": False}
\ No newline at end of file
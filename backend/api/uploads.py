@@ -4,24 +4,33 @@
 Замініть backend/api/uploads.py цим файлом
 """
 
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, BackgroundTasks, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from PIL import Image
+from sqlalchemy import select, update, func, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from typing import List, Optional
 import os
 import uuid
+import hashlib
 import shutil
 import aiofiles
 from pathlib import Path
 import zipfile
 import logging
+from datetime import datetime, timedelta
 
 from database import get_session
 from models.user import User
 from models.archive import Archive
+from models.marketplace import DeveloperProfile
+from models.upload_session import UploadSession, UploadChunk
 from api.dependencies import get_current_user_dependency, admin_required
 from config import settings
+from services.file_response import ranged_file_response
+from services.executor import executor_service
+from services.family_thumbnails import family_thumbnail_service
+from services.archive_contents import archive_content_service
+from services.image_pipeline import image_pipeline, IMAGE_SIZES
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -37,13 +46,13 @@ PREVIEW_DIR = UPLOAD_DIR / "previews"
 MAX_ARCHIVE_SIZE = 100 * 1024 * 1024  # 100MB
 MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
 MAX_IMAGES_PER_PRODUCT = 10
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+UPLOAD_SESSION_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB - розмір частини докачуваного завантаження
+UPLOAD_SESSION_TTL_HOURS = 24
+# Запис частини, що триває довше, вважається обірваним (воркер впав) і не блокує завершення
+UPLOAD_CHUNK_WRITE_TIMEOUT_SECONDS = 10 * 60
 ALLOWED_ARCHIVE_EXTENSIONS = {".zip", ".rar", ".7z"}
 ALLOWED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
-IMAGE_SIZES = {
-    "thumbnail": (150, 150),
-    "preview": (400, 400),
-    "full": (1200, 1200)
-}
 
 # Створюємо необхідні папки
 for directory in [ARCHIVE_DIR, IMAGE_DIR, TEMP_DIR, PREVIEW_DIR]:
@@ -71,24 +80,43 @@ class FileUploadService:
             destination: Path,
             max_size: int
     ) -> dict:
-        """Зберігає завантажений файл"""
-        # Перевірка розміру
-        contents = await upload_file.read()
-        file_size = len(contents)
-
-        if file_size > max_size:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large. Maximum size: {max_size // 1024 // 1024}MB"
-            )
+        """
+        Зберігає завантажений файл.
+
+        Файл копіюється частинами у тимчасовий файл з перевіркою розміру на ходу
+        та підрахунком sha256, і лише після успіху атомарно перейменовується в
+        destination - пам'ять на завантаження не залежить від розміру файлу.
+        """
+        too_large = HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size: {max_size // 1024 // 1024}MB"
+        )
 
-        # Збереження
-        async with aiofiles.open(destination, 'wb') as f:
-            await f.write(contents)
+        # Розмір з multipart (якщо відомий) - відхиляємо одразу
+        if upload_file.size is not None and upload_file.size > max_size:
+            raise too_large
+
+        temp_path = TEMP_DIR / f"{uuid.uuid4().hex}.part"
+        sha256 = hashlib.sha256()
+        file_size = 0
+
+        try:
+            async with aiofiles.open(temp_path, 'wb') as f:
+                while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+                    file_size += len(chunk)
+                    if file_size > max_size:
+                        raise too_large
+                    sha256.update(chunk)
+                    await f.write(chunk)
+
+            os.replace(temp_path, destination)
+        finally:
+            temp_path.unlink(missing_ok=True)
 
         return {
             "path": str(destination),
             "size": file_size,
+            "sha256": sha256.hexdigest(),
             "original_name": upload_file.filename
         }
 
@@ -97,39 +125,41 @@ class FileUploadService:
             image_path: Path,
             sizes: dict = IMAGE_SIZES
     ) -> dict:
-        """Обробляє зображення: створює різні розміри"""
-        processed_images = {}
-
+        """Обробляє зображення: створює різні розміри та формати (в пулі процесів)"""
         try:
-            with Image.open(image_path) as img:
-                # Конвертуємо в RGB якщо потрібно
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
-
-                for size_name, dimensions in sizes.items():
-                    # Створюємо папку для розміру
-                    size_dir = IMAGE_DIR / size_name
-                    size_dir.mkdir(exist_ok=True)
-
-                    # Ресайз зображення
-                    img_copy = img.copy()
-                    img_copy.thumbnail(dimensions, Image.Resampling.LANCZOS)
-
-                    # Зберігаємо
-                    output_path = size_dir / image_path.name
-                    img_copy.save(output_path, "JPEG", quality=85, optimize=True)
-
-                    processed_images[size_name] = str(output_path)
-
+            manifest = await image_pipeline.process(image_path, sizes)
+            return FileUploadService.variant_paths(manifest)
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error processing image: {e}")
             raise HTTPException(status_code=500, detail="Error processing image")
 
-        return processed_images
+    @staticmethod
+    def variant_paths(manifest: dict) -> dict:
+        """JPEG шлях для кожного розміру (зворотна сумісність відповіді)"""
+        return {
+            variant["size"]: variant["path"]
+            for variant in manifest["variants"]
+            if variant["format"] == "jpeg"
+        }
 
     @staticmethod
     async def extract_archive_preview(archive_path: Path) -> dict:
         """Витягує превью архіву (список файлів)"""
+        try:
+            return await executor_service.run_io(FileUploadService._read_archive_preview, archive_path)
+        except Exception as e:
+            logger.error(f"Error extracting archive preview: {e}")
+            return {
+                "file_count": 0,
+                "total_size": 0,
+                "file_list": [],
+                "structure": {}
+            }
+
+    @staticmethod
+    def _read_archive_preview(archive_path: Path) -> dict:
         preview_data = {
             "file_count": 0,
             "total_size": 0,
@@ -137,27 +167,23 @@ class FileUploadService:
             "structure": {}
         }
 
-        try:
-            if archive_path.suffix.lower() == '.zip':
-                with zipfile.ZipFile(archive_path, 'r') as zf:
-                    for info in zf.infolist():
-                        preview_data["file_list"].append(info.filename)
-                        preview_data["total_size"] += info.file_size
-                    preview_data["file_count"] = len(zf.namelist())
-
-                    # Створюємо структуру папок
-                    for name in zf.namelist():
-                        parts = name.split('/')
-                        current = preview_data["structure"]
-                        for part in parts[:-1]:
-                            if part not in current:
-                                current[part] = {}
-                            current = current[part]
-                        if parts[-1]:  # Не пуста назва файлу
-                            current[parts[-1]] = None
-
-        except Exception as e:
-            logger.error(f"Error extracting archive preview: {e}")
+        if archive_path.suffix.lower() == '.zip':
+            with zipfile.ZipFile(archive_path, 'r') as zf:
+                for info in zf.infolist():
+                    preview_data["file_list"].append(info.filename)
+                    preview_data["total_size"] += info.file_size
+                preview_data["file_count"] = len(zf.namelist())
+
+                # Створюємо структуру папок
+                for name in zf.namelist():
+                    parts = name.split('/')
+                    current = preview_data["structure"]
+                    for part in parts[:-1]:
+                        if part not in current:
+                            current[part] = {}
+                        current = current[part]
+                    if parts[-1]:  # Не пуста назва файлу
+                        current[parts[-1]] = None
 
         return preview_data
 
@@ -199,16 +225,27 @@ async def upload_archive_multipart(
         file, file_path, MAX_ARCHIVE_SIZE
     )
 
-    # Витягуємо превью в фоні
+    # Витягуємо превью, превʼю сімейств Revit та індексуємо вміст в фоні
     background_tasks.add_task(
         file_service.extract_archive_preview,
         file_path
     )
+    background_tasks.add_task(
+        family_thumbnail_service.extract_safe,
+        code,
+        file_path
+    )
+    background_tasks.add_task(
+        archive_content_service.index_safe,
+        code,
+        file_path
+    )
 
     return {
         "success": True,
         "file_path": f"media/archives/{filename}",
         "file_size": file_info["size"],
+        "sha256": file_info["sha256"],
         "original_name": file_info["original_name"],
         "code": code
     }
@@ -232,6 +269,7 @@ async def upload_images_batch(
     uploaded_images = []
     errors = []
 
+    saved = []
     for file in files:
         try:
             # Валідація
@@ -249,31 +287,43 @@ async def upload_images_batch(
             await file_service.save_uploaded_file(
                 file, temp_path, MAX_IMAGE_SIZE
             )
-
-            # Обробляємо зображення
-            processed = await file_service.process_image(temp_path)
-
-            # Переміщуємо оригінал
-            final_path = IMAGE_DIR / "original" / filename
-            final_path.parent.mkdir(exist_ok=True)
-            shutil.move(str(temp_path), str(final_path))
-
-            image_data = {
-                "original": f"media/images/original/{filename}",
-                "sizes": {
-                    k: v.replace("media/", "")
-                    for k, v in processed.items()
-                },
-                "filename": file.filename,
-                "archive_id": archive_id
-            }
-
-            uploaded_images.append(image_data)
+            saved.append((file, filename, temp_path))
 
         except Exception as e:
             logger.error(f"Error uploading {file.filename}: {e}")
             errors.append(f"{file.filename}: {str(e)}")
 
+    # Обробляємо всі зображення паралельно в пулі процесів
+    manifests = await image_pipeline.process_batch([temp_path for _, _, temp_path in saved])
+
+    for (file, filename, temp_path), manifest in zip(saved, manifests):
+        if isinstance(manifest, BaseException):
+            logger.error(f"Error processing {file.filename}: {manifest}")
+            errors.append(f"{file.filename}: Error processing image")
+            temp_path.unlink(missing_ok=True)
+            continue
+
+        # Переміщуємо оригінал
+        final_path = IMAGE_DIR / "original" / filename
+        final_path.parent.mkdir(exist_ok=True)
+        shutil.move(str(temp_path), str(final_path))
+
+        image_data = {
+            "original": f"media/images/original/{filename}",
+            "sizes": {
+                k: v.replace("media/", "")
+                for k, v in file_service.variant_paths(manifest).items()
+            },
+            "variants": manifest["variants"],
+            "placeholder": manifest["placeholder"],
+            "width": manifest["original"]["width"],
+            "height": manifest["original"]["height"],
+            "filename": file.filename,
+            "archive_id": archive_id
+        }
+
+        uploaded_images.append(image_data)
+
     return {
         "success": len(uploaded_images) > 0,
         "uploaded": uploaded_images,
@@ -309,16 +359,8 @@ async def delete_image_file(
 ):
     """Видалити зображення"""
 
-    # Видаляємо всі розміри
-    deleted = []
-    for size_name in ["original", "thumbnail", "preview", "full"]:
-        file_path = IMAGE_DIR / size_name / filename
-        if file_path.exists():
-            try:
-                os.remove(file_path)
-                deleted.append(size_name)
-            except Exception as e:
-                logger.error(f"Error deleting {size_name}: {e}")
+    # Видаляємо оригінал, усі розміри в усіх форматах та маніфест
+    deleted = await executor_service.run_io(image_pipeline.remove, filename)
 
     if not deleted:
         raise HTTPException(status_code=404, detail="Image not found")
@@ -353,6 +395,7 @@ async def get_archive_preview(
 async def download_file(
         file_type: str,
         filename: str,
+        request: Request,
         current_user: User = Depends(get_current_user_dependency)
 ):
     """Завантажити файл"""
@@ -367,11 +410,311 @@ async def download_file(
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
 
-    return FileResponse(
-        path=file_path,
+    return ranged_file_response(request, file_path, filename)
+
+
+# --- Докачуване завантаження архівів частинами ---
+#
+# 1. POST   /archive/sessions                      - створити сесію (розмір, назва, код)
+# 2. PUT    /archive/sessions/{id}/chunks?offset=N - тіло запиту = частина файлу
+#    (частини можна слати паралельно і повторювати)
+# 3. GET    /archive/sessions/{id}                 - отримані/відсутні діапазони
+# 4. POST   /archive/sessions/{id}/complete        - перенести файл в ARCHIVE_DIR
+# 5. DELETE /archive/sessions/{id}                 - скасувати
+#
+# Частини пишуться прямо на своє місце в розрідженому файлі TEMP_DIR/{id}.part,
+# тому на завершенні файл лише перейменовується без повторного читання.
+
+def _session_part_path(upload_session: UploadSession) -> Path:
+    return TEMP_DIR / f"{upload_session.id}.part"
+
+
+def _merge_ranges(chunks) -> List[List[int]]:
+    """Об'єднати частини в діапазони [start, end) за зростанням"""
+    ranges = []
+    for offset, size in sorted(chunks):
+        if ranges and offset <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], offset + size)
+        else:
+            ranges.append([offset, offset + size])
+    return ranges
+
+
+def _missing_ranges(received: List[List[int]], total_size: int) -> List[List[int]]:
+    missing = []
+    position = 0
+    for start, end in received:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < total_size:
+        missing.append([position, total_size])
+    return missing
+
+
+async def _get_upload_session(session_id: str, current_user: User, session: AsyncSession) -> UploadSession:
+    upload_session = await session.get(UploadSession, session_id)
+    if not upload_session or upload_session.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if upload_session.status == 'active' and upload_session.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=410, detail="Upload session expired")
+    return upload_session
+
+
+async def _upload_session_state(upload_session: UploadSession, session: AsyncSession) -> dict:
+    result = await session.execute(
+        select(UploadChunk.offset, UploadChunk.size).where(UploadChunk.session_id == upload_session.id)
+    )
+    received = _merge_ranges(result.all())
+    return {
+        "session_id": upload_session.id,
+        "status": upload_session.status,
+        "filename": upload_session.filename,
+        "total_size": upload_session.total_size,
+        "chunk_size": upload_session.chunk_size,
+        "received_bytes": sum(end - start for start, end in received),
+        "received_ranges": received,
+        "missing_ranges": _missing_ranges(received, upload_session.total_size),
+        "expires_at": upload_session.expires_at.isoformat()
+    }
+
+
+async def _can_upload_archives(current_user: User, session: AsyncSession) -> bool:
+    """Архіви завантажують адміністратори та розробники маркетплейсу"""
+    if current_user.is_admin:
+        return True
+    result = await session.execute(
+        select(DeveloperProfile.id).where(DeveloperProfile.user_id == current_user.id)
+    )
+    return result.scalar_one_or_none() is not None
+
+
+@router.post("/archive/sessions")
+async def create_upload_session(
+        data: dict,
+        current_user: User = Depends(get_current_user_dependency),
+        session: AsyncSession = Depends(get_session)
+):
+    """Створити сесію докачуваного завантаження архіву"""
+
+    if not await _can_upload_archives(current_user, session):
+        raise HTTPException(status_code=403, detail="Only admins and developers can upload archives")
+
+    filename = data.get("filename") or ""
+    code = data.get("code")
+    try:
+        total_size = int(data.get("size"))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="File size is required")
+
+    if not file_service.validate_file_extension(filename, ALLOWED_ARCHIVE_EXTENSIONS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_ARCHIVE_EXTENSIONS)}"
+        )
+    if total_size <= 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    if total_size > MAX_ARCHIVE_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size: {MAX_ARCHIVE_SIZE // 1024 // 1024}MB"
+        )
+
+    if code:
+        existing = await session.execute(select(Archive.id).where(Archive.code == code))
+        if existing.scalar_one_or_none():
+            raise HTTPException(status_code=400, detail="Archive with this code already exists")
+
+    upload_session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=current_user.id,
         filename=filename,
-        media_type='application/octet-stream'
+        stored_filename=file_service.generate_filename(filename),
+        code=code,
+        total_size=total_size,
+        chunk_size=UPLOAD_SESSION_CHUNK_SIZE,
+        expires_at=datetime.utcnow() + timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+    )
+
+    # Розріджений файл потрібного розміру - частини пишуться на свої місця
+    async with aiofiles.open(_session_part_path(upload_session), 'wb') as f:
+        await f.truncate(total_size)
+
+    session.add(upload_session)
+    await session.commit()
+
+    return await _upload_session_state(upload_session, session)
+
+
+@router.put("/archive/sessions/{session_id}/chunks")
+async def upload_session_chunk(
+        session_id: str,
+        offset: int,
+        request: Request,
+        current_user: User = Depends(get_current_user_dependency),
+        session: AsyncSession = Depends(get_session)
+):
+    """Завантажити частину файлу (тіло запиту) за зміщенням offset"""
+
+    upload_session = await _get_upload_session(session_id, current_user, session)
+    if upload_session.status != 'active':
+        raise HTTPException(status_code=409, detail=f"Upload session is {upload_session.status}")
+
+    # Частини фіксованого розміру, остання - до кінця файлу
+    if offset < 0 or offset >= upload_session.total_size or offset % upload_session.chunk_size:
+        raise HTTPException(status_code=400, detail="Offset must be a multiple of chunk_size within the file")
+    expected_size = min(upload_session.chunk_size, upload_session.total_size - offset)
+
+    # Реєструємо запис умовним UPDATE: завершення не забере сесію, поки є активні записи,
+    # а після завершення нові записи вже не почнуться
+    started = await session.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload_session.id, UploadSession.status == 'active')
+        .values(writers=UploadSession.writers + 1, last_write_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
     )
+    await session.commit()
+    if started.rowcount != 1:
+        raise HTTPException(status_code=409, detail="Upload session is no longer active")
+
+    try:
+        received = 0
+        async with aiofiles.open(_session_part_path(upload_session), 'r+b') as f:
+            await f.seek(offset)
+            async for data in request.stream():
+                received += len(data)
+                if received > expected_size:
+                    raise HTTPException(status_code=413, detail=f"Chunk must be exactly {expected_size} bytes")
+                await f.write(data)
+
+        if received != expected_size:
+            raise HTTPException(status_code=400, detail=f"Chunk must be exactly {expected_size} bytes")
+
+        # Повтор тієї ж частини просто перезаписує дані
+        await session.execute(
+            sqlite_insert(UploadChunk)
+            .values(session_id=upload_session.id, offset=offset, size=received)
+            .on_conflict_do_nothing(index_elements=['session_id', 'offset'])
+        )
+    finally:
+        await session.execute(
+            update(UploadSession)
+            .where(UploadSession.id == upload_session.id)
+            .values(writers=func.max(UploadSession.writers - 1, 0))
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+    return {"success": True, "offset": offset, "size": received}
+
+
+@router.get("/archive/sessions/{session_id}")
+async def get_upload_session(
+        session_id: str,
+        current_user: User = Depends(get_current_user_dependency),
+        session: AsyncSession = Depends(get_session)
+):
+    """Стан сесії: які діапазони вже отримані"""
+    upload_session = await _get_upload_session(session_id, current_user, session)
+    return await _upload_session_state(upload_session, session)
+
+
+@router.post("/archive/sessions/{session_id}/complete")
+async def complete_upload_session(
+        session_id: str,
+        background_tasks: BackgroundTasks,
+        current_user: User = Depends(get_current_user_dependency),
+        session: AsyncSession = Depends(get_session)
+):
+    """Завершити завантаження: перенести зібраний файл в ARCHIVE_DIR"""
+
+    upload_session = await _get_upload_session(session_id, current_user, session)
+    if upload_session.status != 'active':
+        raise HTTPException(status_code=409, detail=f"Upload session is {upload_session.status}")
+
+    state = await _upload_session_state(upload_session, session)
+    if state["missing_ranges"]:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Upload is incomplete", "missing_ranges": state["missing_ranges"]}
+        )
+
+    # Забираємо сесію умовним UPDATE: з кількох одночасних запитів завершення
+    # файл переносить лише той, хто перевів її з 'active', і лише коли жодна
+    # частина не записується (інакше запис продовжився б у перенесений файл)
+    stale_write_before = datetime.utcnow() - timedelta(seconds=UPLOAD_CHUNK_WRITE_TIMEOUT_SECONDS)
+    claimed = await session.execute(
+        update(UploadSession)
+        .where(
+            UploadSession.id == upload_session.id,
+            UploadSession.status == 'active',
+            or_(UploadSession.writers == 0, UploadSession.last_write_at < stale_write_before)
+        )
+        .values(status='completed', completed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    if claimed.rowcount != 1:
+        await session.refresh(upload_session)
+        if upload_session.status == 'active':
+            raise HTTPException(status_code=409, detail="Chunks are still being uploaded")
+        raise HTTPException(status_code=409, detail="Upload session is already being completed")
+
+    file_path = ARCHIVE_DIR / upload_session.stored_filename
+    try:
+        os.replace(_session_part_path(upload_session), file_path)
+    except OSError as e:
+        # Повертаємо сесію, щоб завершення можна було повторити
+        await session.execute(
+            update(UploadSession)
+            .where(UploadSession.id == upload_session.id)
+            .values(status='active', completed_at=None)
+        )
+        await session.commit()
+        logger.error(f"Failed to finalize upload session {upload_session.id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to finalize upload")
+
+    # Витягуємо превью, превʼю сімейств Revit та індексуємо вміст в фоні
+    background_tasks.add_task(
+        file_service.extract_archive_preview,
+        file_path
+    )
+    if upload_session.code:
+        background_tasks.add_task(
+            family_thumbnail_service.extract_safe,
+            upload_session.code,
+            file_path
+        )
+        background_tasks.add_task(
+            archive_content_service.index_safe,
+            upload_session.code,
+            file_path
+        )
+
+    return {
+        "success": True,
+        "file_path": f"media/archives/{upload_session.stored_filename}",
+        "file_size": upload_session.total_size,
+        "original_name": upload_session.filename,
+        "code": upload_session.code
+    }
+
+
+@router.delete("/archive/sessions/{session_id}")
+async def abort_upload_session(
+        session_id: str,
+        current_user: User = Depends(get_current_user_dependency),
+        session: AsyncSession = Depends(get_session)
+):
+    """Скасувати сесію та видалити отримані дані"""
+
+    upload_session = await _get_upload_session(session_id, current_user, session)
+    if upload_session.status == 'active':
+        upload_session.status = 'aborted'
+        await session.commit()
+        _session_part_path(upload_session).unlink(missing_ok=True)
+
+    return {"success": True}
 
 
 # Допоміжні функції для очищення
@@ -385,7 +728,8 @@ async def cleanup_temp_files(
 
     for file_path in TEMP_DIR.glob("*"):
         try:
-            if file_path.is_file():
+            # .part - незавершені завантаження, їх чистить планувальник
+            if file_path.is_file() and file_path.suffix != ".part":
                 os.remove(file_path)
                 deleted_count += 1
         except Exception as e:
@@ -24,6 +24,15 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
 
+    # Кеш користувачів та токенів (на процес)
+    USER_CACHE_TTL_SECONDS: int = 30
+    USER_CACHE_MAX_SIZE: int = 10000
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+
+    # Кеш доступів користувачів до архівів (на процес)
+    ENTITLEMENT_CACHE_TTL_SECONDS: int = 60
+    ENTITLEMENT_CACHE_MAX_SIZE: int = 10000
+
     # Telegram
     BOT_TOKEN: str = ""
     TELEGRAM_BOT_USERNAME: str = "revitbot"
@@ -38,12 +47,49 @@ class Settings(BaseSettings):
     # Development
     DEV_MODE: bool = False
 
+    # Планувальник періодичних задач. При кількох воркерах задачі виконує лише
+    # процес, що тримає оренду в БД (див. models/scheduler_lease.py)
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_LEASE_SECONDS: int = 600
+    # Як часто лічильники переглядів/завантажень пишуться в БД (див. services/counters.py)
+    COUNTER_FLUSH_INTERVAL_SECONDS: float = 5.0
+    # Як часто буфер історії переглядів пишеться в БД (див. services/view_history.py)
+    VIEW_HISTORY_FLUSH_INTERVAL_SECONDS: float = 5.0
+    # Скільки процес тримає список останніх переглядів, не перечитуючи БД
+    VIEW_HISTORY_RECENT_TTL_SECONDS: float = 10.0
+    # Журнал подій аналітики розробників (див. services/analytics.py)
+    ANALYTICS_FLUSH_INTERVAL_SECONDS: float = 5.0
+    ANALYTICS_SEGMENT_SECONDS: int = 300
+    ANALYTICS_SEGMENT_MAX_MB: int = 16
+    ANALYTICS_ROLLUP_MINUTES: int = 10
+
     # Paths
     BASE_DIR: Path = Path(__file__).resolve().parent
     STATIC_DIR: Path = BASE_DIR / "static"
     MEDIA_DIR: Path = BASE_DIR / "media"
     PREMIUM_ARCHIVES_DIR: Path = BASE_DIR / "data" / "premium"
     FREE_ARCHIVES_DIR: Path = BASE_DIR / "data" / "free"
+    ANALYTICS_DIR: Path = BASE_DIR / "data" / "analytics"
+
+    # Віддача файлів: app (з процесу), x-accel (nginx X-Accel-Redirect), x-sendfile
+    FILE_DELIVERY_MODE: str = "app"
+    # Запас на байти, що були в буферах відправки при розриві з'єднання, для безкоштовного докачування
+    DOWNLOAD_RESUME_SLACK_BYTES: int = 1024 * 1024
+    FILE_DELIVERY_INTERNAL_PREFIX: str = "/protected/"  # internal location nginx, що вказує на BASE_DIR
+
+    # Пули для блокуючої роботи (services/executor.py)
+    IO_EXECUTOR_WORKERS: int = 8
+    CPU_EXECUTOR_WORKERS: int = os.cpu_count() or 2
+    EXECUTOR_QUEUE_SIZE: int = 64  # задач в очікуванні на пул, понад це - 503
+    EXECUTOR_TIMEOUT_SECONDS: int = 120
+    ZIP_BUILD_TIMEOUT_SECONDS: int = 900
+
+    # Архіви-папки: cache (зібраний ZIP в кеші на диску, з Range) або stream (ZIP на льоту)
+    FOLDER_ZIP_MODE: str = "cache"
+    # Кеш ZIP архівів, зібраних з папок (ліміт на диску)
+    ZIP_CACHE_MAX_MB: int = 2048
+    # Кеш зменшених зображень /media/img/{w}x{h}/... (ліміт на диску)
+    IMAGE_VARIANT_CACHE_MAX_MB: int = 1024
 
     # Prices (раніше були окремо)
     SUBSCRIPTION_PRICE_MONTHLY: float = 5.0
@@ -78,6 +124,9 @@ class Settings(BaseSettings):
     # Timezone for daily reset
     DAILY_RESET_TIMEZONE: str = "Europe/Kiev" # <-- Тепер це частина класу!
 
+    # Catalog snapshot: як часто перевіряти зміни каталогу з інших воркерів
+    CATALOG_REFRESH_SECONDS: int = 30
+
     # Payment settings
     PAYMENT_CURRENCIES: list = ["USD", "EUR", "USDT", "BTC", "ETH"]
     PAYMENT_TIMEOUT_MINUTES: int = 60
@@ -41,8 +41,18 @@ from api.promo_codes import router as promo_codes_router
 from api.uploads import router as uploads_router
 from api.user_settings import router as user_settings_router
 from api.marketplace import router as marketplace_router
+from api.media import router as media_router
+from api.analytics import router as analytics_router
 
 from static_files import setup_static_files
+from services.search_index import archive_search_index
+from services.archive_contents import archive_content_service
+from services.catalog import catalog_service
+from scheduler import scheduler
+from services.executor import executor_service
+from services.counters import counter_service
+from services.view_history import view_history_service
+from services.analytics import analytics_service
 from limiter import limiter
 from config import settings
 
@@ -66,6 +76,8 @@ async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
         logger.info("Database tables created/verified")
+        await archive_search_index.setup(conn)
+        await archive_content_service.setup(conn)
 
 
 # Lifespan manager для ініціалізації при старті
@@ -74,9 +86,24 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up...")
     await init_db()
+    await catalog_service.rebuild()
+    scheduler_task = asyncio.create_task(scheduler.start()) if settings.SCHEDULER_ENABLED else None
+    counters_task = asyncio.create_task(counter_service.start())
+    view_history_task = asyncio.create_task(view_history_service.start())
+    analytics_task = asyncio.create_task(analytics_service.start())
     yield
     # Shutdown
     logger.info("Shutting down...")
+    if scheduler_task:
+        scheduler.stop()
+        scheduler_task.cancel()
+    counters_task.cancel()
+    view_history_task.cancel()
+    analytics_task.cancel()
+    await counter_service.stop()
+    await view_history_service.stop()
+    await analytics_service.stop()
+    executor_service.shutdown()
 
 
 # Створюємо FastAPI додаток
@@ -99,6 +126,9 @@ app.add_middleware(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# Варіанти зображень (/media/img/...) - до монтування /media, бо маршрути перевіряються по черзі
+app.include_router(media_router, prefix="/media", tags=["media"])
+
 # Монтуємо статичні файли та медіа
 app.mount("/media", StaticFiles(directory="media"), name="media")
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -150,6 +180,7 @@ app.include_router(promo_codes_router, prefix="/api/promo-codes", tags=["promo-c
 app.include_router(uploads_router, prefix="/api/uploads", tags=["uploads"])
 app.include_router(user_settings_router, prefix="/api/users", tags=["user-settings"])
 app.include_router(marketplace_router, prefix="/api/marketplace", tags=["marketplace"])
+app.include_router(analytics_router, prefix="/api/analytics", tags=["analytics"])
 
 
 # Основні ендпоінти
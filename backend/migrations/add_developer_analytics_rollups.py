@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Міграція для згортання журналу подій в аналітику розробників
+Запустіть: python migrations/add_developer_analytics_rollups.py
+"""
+
+import asyncio
+from sqlalchemy import text
+from database import engine, Base
+from models.marketplace import AnalyticsSegment
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        print("🔄 Починаємо міграцію...")
+
+        try:
+            await conn.execute(text("""
+                ALTER TABLE developer_analytics ADD COLUMN visitor_sketch BLOB;
+            """))
+            print("✅ Додано поле visitor_sketch")
+        except Exception as e:
+            print(f"⚠️ visitor_sketch можливо вже існує: {e}")
+
+        # Один рядок на розробника за день - на нього спирається згортання
+        await conn.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS _developer_analytics_day_uc
+            ON developer_analytics (developer_id, date);
+        """))
+        print("✅ Додано унікальний індекс (developer_id, date)")
+
+        await conn.run_sync(Base.metadata.create_all, tables=[AnalyticsSegment.__table__])
+        print("✅ Створено таблицю analytics_segments")
+
+    print("✨ Міграція завершена!")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Міграція для обліку відданих байтів за токенами завантаження
+Запустіть: python migrations/add_download_served_bytes.py
+"""
+
+import asyncio
+from sqlalchemy import text
+from database import engine
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        print("🔄 Починаємо міграцію...")
+
+        try:
+            await conn.execute(text("""
+                ALTER TABLE download_token_uses ADD COLUMN served_bytes INTEGER NOT NULL DEFAULT 0;
+            """))
+            print("✅ Додано поле served_bytes")
+        except Exception as e:
+            print(f"⚠️ served_bytes можливо вже існує: {e}")
+
+    print("✨ Міграція завершена!")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
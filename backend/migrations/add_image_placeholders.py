@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Міграція для додавання LQIP-заглушок зображень
+Запустіть: python migrations/add_image_placeholders.py
+"""
+
+import asyncio
+import json
+from sqlalchemy import text
+from database import engine
+from services.image_pipeline import image_pipeline
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        print("🔄 Починаємо міграцію...")
+
+        try:
+            await conn.execute(text("""
+                ALTER TABLE archives ADD COLUMN image_placeholders JSON DEFAULT '[]';
+            """))
+            print("✅ Додано поле image_placeholders")
+        except Exception as e:
+            print(f"⚠️ image_placeholders можливо вже існує: {e}")
+
+    # Заповнюємо заглушки з маніфестів вже оброблених зображень
+    async with engine.begin() as conn:
+        rows = (await conn.execute(text("SELECT id, image_paths FROM archives"))).all()
+        for archive_id, image_paths in rows:
+            if isinstance(image_paths, str):
+                image_paths = json.loads(image_paths or '[]')
+            await conn.execute(
+                text("UPDATE archives SET image_placeholders = :placeholders WHERE id = :id"),
+                {"placeholders": json.dumps(image_pipeline.placeholders(image_paths)), "id": archive_id}
+            )
+        print(f"✅ Оновлено заглушки для {len(rows)} архівів")
+
+    print("✨ Міграція завершена!")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
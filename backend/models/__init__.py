@@ -8,16 +8,23 @@ from .payment import Payment
 from .subscription import Subscription, SubscriptionArchive, SubscriptionStatus, SubscriptionPlan
 from .bonus import BonusTransaction, DailyBonus, UserReferral, VipLevel, BonusTransactionType
 from .favorite import Favorite
-from .view_history import ViewHistory
+from .view_history import ViewHistory, ViewHistoryClear
 from .archive_rating import ArchiveRating
 from .notification import Notification
 from .comment import Comment
 from .promo_code import PromoCode, DiscountType
+from .download_token import DownloadTokenUse
+from .entitlement_version import EntitlementVersion
+from .scheduler_lease import SchedulerLease
+from .upload_session import UploadSession, UploadChunk
+from .archive_content import ArchiveEntry
+from .archive_version import ArchiveVersion
+from .weekly_special import WeeklySpecial
 from .marketplace import (
     DeveloperStatus, ProductStatus, TransactionType, WithdrawalStatus,
     DeveloperApplication, DeveloperProfile, MarketplaceProduct,
     MarketplaceTransaction, DeveloperWithdrawal, ProductReview,
-    DeveloperAnalytics
+    DeveloperAnalytics, AnalyticsSegment
 )
 
 __all__ = [
@@ -39,11 +46,20 @@ __all__ = [
     'BonusTransactionType',
     'Favorite',
     'ViewHistory',
+    'ViewHistoryClear',
     'ArchiveRating',
     'Comment',
     'Notification',
     'PromoCode',
     'DiscountType',
+    'DownloadTokenUse',
+    'EntitlementVersion',
+    'SchedulerLease',
+    'UploadSession',
+    'UploadChunk',
+    'ArchiveEntry',
+    'ArchiveVersion',
+    'WeeklySpecial',
     'DeveloperStatus',
     'ProductStatus',
     'TransactionType',
@@ -54,5 +70,6 @@ __all__ = [
     'MarketplaceTransaction',
     'DeveloperWithdrawal',
     'ProductReview',
-    'DeveloperAnalytics'
+    'DeveloperAnalytics',
+    'AnalyticsSegment'
 ]
\ No newline at end of file
@@ -18,6 +18,7 @@ class Archive(Base):
 
     # Files
     image_paths = Column(JSON, default=list)  # Список шляхів до зображень
+    image_placeholders = Column(JSON, default=list)  # LQIP data URI для кожного з image_paths
     file_path = Column(String, nullable=True)  # Шлях до архіву
     file_size = Column(Integer, nullable=True)  # Розмір файлу в байтах
 
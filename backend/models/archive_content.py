@@ -0,0 +1,38 @@
+# backend/models/archive_content.py
+
+from sqlalchemy import Column, Integer, String, Boolean, Index, UniqueConstraint
+from database import Base
+
+
+class ArchiveEntry(Base):
+    """
+    Запис індексу вмісту архіву: файл або папка всередині ZIP/папки архіву.
+
+    Привʼязаний до архіву за кодом, бо індексується ще при завантаженні файлу,
+    до створення запису Archive. Папки зберігаються окремими рядками з сумарним
+    розміром, щоб дерево можна було гортати по рівнях без агрегації.
+    """
+    __tablename__ = 'archive_entries'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    archive_code = Column(String(100), nullable=False)
+
+    path = Column(String, nullable=False)  # повний шлях всередині архіву, без '/' в кінці
+    parent = Column(String, nullable=False, default='')  # шлях батьківської папки ('' - корінь)
+    name = Column(String(255), nullable=False)
+    extension = Column(String(20), nullable=False, default='')  # '.rfa', '' для папок
+    is_dir = Column(Boolean, nullable=False, default=False)
+
+    size = Column(Integer, default=0)  # для папок - сума всіх вкладених файлів
+    compressed_size = Column(Integer, default=0)
+    crc = Column(Integer, nullable=True)  # CRC-32 з центрального каталогу ZIP
+    files_count = Column(Integer, default=0)  # для папок - кількість вкладених файлів
+
+    __table_args__ = (
+        UniqueConstraint('archive_code', 'path', name='_archive_entry_path_uc'),
+        Index('ix_archive_entries_tree', 'archive_code', 'parent', 'is_dir', 'name'),
+        Index('ix_archive_entries_extension_name', 'extension', 'name'),
+    )
+
+    def __repr__(self):
+        return f"<ArchiveEntry {self.archive_code}:{self.path}>"
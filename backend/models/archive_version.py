@@ -0,0 +1,35 @@
+# backend/models/archive_version.py
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from database import Base
+
+
+class ArchiveVersion(Base):
+    """
+    Опублікована версія архіву з маніфестом вмісту.
+
+    manifest - {шлях: [sha256, розмір]} для кожного файлу; за ним рахується
+    різниця між версіями для дельта-завантажень.
+    """
+    __tablename__ = 'archive_versions'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    archive_id = Column(Integer, ForeignKey('archives.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    version = Column(String(20), nullable=False)
+    changelog = Column(Text, nullable=True)
+
+    manifest = Column(JSON, nullable=False, default=dict)
+    files_count = Column(Integer, default=0)
+    total_size = Column(Integer, default=0)
+    source_fingerprint = Column(String(64), nullable=False)  # розмір/mtime файлу архіву на момент публікації
+
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('archive_id', 'version', name='_archive_version_uc'),
+    )
+
+    def __repr__(self):
+        return f"<ArchiveVersion archive={self.archive_id} version={self.version}>"
@@ -0,0 +1,24 @@
+# backend/models/download_token.py
+
+from sqlalchemy import Column, Integer, String
+from database import Base
+
+
+class DownloadTokenUse(Base):
+    """
+    Лічильник використань токена завантаження.
+
+    Сам токен підписаний і перевіряється без звернення до БД; тут зберігаються
+    кількість завантажень і скільки байтів за ними віддано, спільні для всіх
+    воркерів. Кожне завантаження дає бюджет в один розмір файлу, докачування
+    витрачає його лише на фактично віддані байти.
+    """
+    __tablename__ = 'download_token_uses'
+
+    token_id = Column(String(32), primary_key=True)
+    downloads = Column(Integer, nullable=False, default=0)
+    served_bytes = Column(Integer, nullable=False, default=0)  # віддано байтів (з урахуванням резерву поточних відповідей)
+    expires_at = Column(Integer, nullable=False, index=True)  # unix timestamp
+
+    def __repr__(self):
+        return f"<DownloadTokenUse {self.token_id} downloads={self.downloads}>"
@@ -0,0 +1,21 @@
+# backend/models/entitlement_version.py
+
+from sqlalchemy import Column, Integer, ForeignKey
+from database import Base
+
+
+class EntitlementVersion(Base):
+    """
+    Версія набору архівів, якими володіє користувач.
+
+    Збільшується в тій самій транзакції, що додає/змінює покупки, розблокування
+    або замовлення (services/entitlements.py); за нею кожен воркер бачить, що
+    його кеш доступу застарів.
+    """
+    __tablename__ = 'entitlement_versions'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<EntitlementVersion user_id={self.user_id} version={self.version}>"
@@ -4,7 +4,10 @@
 Створіть цей новий файл в папці backend/models/
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, Enum, JSON
+from sqlalchemy import (
+    Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, Enum, JSON, LargeBinary,
+    UniqueConstraint
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -317,5 +320,21 @@ class DeveloperAnalytics(Base):
     # Джерела трафіку
     traffic_sources = Column(JSON)  # {"direct": 0, "search": 0, "social": 0}
 
+    # HyperLogLog скетч відвідувачів дня (див. services/hyperloglog.py)
+    visitor_sketch = Column(LargeBinary)
+
     # Відносини
     developer = relationship("DeveloperProfile")
+
+    __table_args__ = (
+        UniqueConstraint('developer_id', 'date', name='_developer_analytics_day_uc'),
+    )
+
+
+class AnalyticsSegment(Base):
+    """Сегменти журналу подій, вже згорнуті в DeveloperAnalytics (захист від повторного врахування)"""
+    __tablename__ = 'analytics_segments'
+
+    name = Column(String(100), primary_key=True)
+    events_count = Column(Integer, default=0)
+    processed_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,21 @@
+# backend/models/scheduler_lease.py
+
+from sqlalchemy import Column, Integer, String
+from database import Base
+
+
+class SchedulerLease(Base):
+    """
+    Оренда планувальника: задачі виконує лише процес-власник.
+
+    Власник продовжує expires_at на кожному циклі; якщо він зупинився,
+    після закінчення оренди її забирає інший воркер.
+    """
+    __tablename__ = 'scheduler_leases'
+
+    name = Column(String(50), primary_key=True)
+    owner = Column(String(100), nullable=False)
+    expires_at = Column(Integer, nullable=False)  # unix timestamp
+
+    def __repr__(self):
+        return f"<SchedulerLease {self.name} owner={self.owner}>"
@@ -0,0 +1,47 @@
+# backend/models/upload_session.py
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from database import Base
+
+
+class UploadSession(Base):
+    """Сесія докачуваного завантаження архіву частинами"""
+    __tablename__ = 'upload_sessions'
+
+    id = Column(String(32), primary_key=True)  # uuid hex
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+
+    filename = Column(String(255), nullable=False)  # оригінальна назва
+    stored_filename = Column(String(255), nullable=False)  # назва в ARCHIVE_DIR після завершення
+    code = Column(String(100), nullable=True)
+
+    total_size = Column(Integer, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    status = Column(String(20), default='active')  # active, completed, aborted
+    writers = Column(Integer, nullable=False, default=0)  # частини, що зараз записуються
+    last_write_at = Column(DateTime, nullable=True)  # початок останнього запису частини
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<UploadSession {self.id} {self.filename} status={self.status}>"
+
+
+class UploadChunk(Base):
+    """Отримана частина сесії завантаження (кожна частина - окремий рядок, без гонок між паралельними PUT)"""
+    __tablename__ = 'upload_chunks'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String(32), ForeignKey('upload_sessions.id', ondelete='CASCADE'), nullable=False, index=True)
+    offset = Column(Integer, nullable=False)
+    size = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('session_id', 'offset', name='_upload_chunk_offset_uc'),
+    )
+
+    def __repr__(self):
+        return f"<UploadChunk {self.session_id} offset={self.offset} size={self.size}>"
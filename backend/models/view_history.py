@@ -18,4 +18,21 @@ class ViewHistory(Base):
     )
 
     def __repr__(self):
-        return f"<ViewHistory user_id={self.user_id} archive_id={self.archive_id}>"
\ No newline at end of file
+        return f"<ViewHistory user_id={self.user_id} archive_id={self.archive_id}>"
+
+
+class ViewHistoryClear(Base):
+    """
+    Час останнього очищення історії користувача.
+
+    Перегляди буферизуються в кожному воркері окремо (services/view_history.py);
+    при записі буфера перегляди, зроблені до цієї мітки, відкидаються, щоб
+    очищена в одному воркері історія не поверталась з буфера іншого.
+    """
+    __tablename__ = 'view_history_clears'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    cleared_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ViewHistoryClear user_id={self.user_id} cleared_at={self.cleared_at}>"
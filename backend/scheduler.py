@@ -1,7 +1,10 @@
 # backend/scheduler.py
 import asyncio
 import logging
-from datetime import datetime, time, timedelta
+import os
+import socket
+import uuid
+from datetime import datetime, time, timedelta, timezone
 from typing import List, Callable, Any
 import pytz
 from config import settings
@@ -16,6 +19,9 @@ class Scheduler:
         self.tasks = []
         self.running = False
         self.timezone = pytz.timezone(settings.DAILY_RESET_TIMEZONE)
+        # Ідентифікатор процесу для оренди (кожен воркер запускає свій планувальник)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
 
     async def start(self):
         """Запустити планувальник"""
@@ -29,7 +35,9 @@ class Scheduler:
         # Запускаємо основний цикл
         while self.running:
             try:
-                await self.run_pending_tasks()
+                # Задачі виконує лише один воркер - власник оренди
+                if await self.acquire_lease():
+                    await self.run_pending_tasks()
                 await asyncio.sleep(60)  # Перевіряємо кожну хвилину
             except Exception as e:
                 logger.error(f"Scheduler error: {e}")
@@ -40,15 +48,44 @@ class Scheduler:
         self.running = False
         logger.info("Scheduler stopped")
 
+    async def acquire_lease(self) -> bool:
+        """Взяти або продовжити оренду планувальника; False - задачі виконує інший процес"""
+        from database import async_session
+        from models.scheduler_lease import SchedulerLease
+        from sqlalchemy import or_
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        # Aware datetime: naive utcnow().timestamp() трактувався б як місцевий час
+        now = int(datetime.now(timezone.utc).timestamp())
+        stmt = sqlite_insert(SchedulerLease).values(
+            name="scheduler", owner=self.owner, expires_at=now + settings.SCHEDULER_LEASE_SECONDS
+        )
+        # Перехоплюємо оренду лише якщо вона наша або прострочена
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['name'],
+            set_={'owner': stmt.excluded.owner, 'expires_at': stmt.excluded.expires_at},
+            where=or_(SchedulerLease.owner == self.owner, SchedulerLease.expires_at < now)
+        ).returning(SchedulerLease.owner)
+
+        try:
+            async with async_session() as session:
+                is_leader = (await session.execute(stmt)).scalar_one_or_none() == self.owner
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Scheduler lease error: {e}")
+            is_leader = False
+
+        if is_leader != self.is_leader:
+            logger.info(f"Scheduler lease {'acquired' if is_leader else 'held by another process'}")
+            self.is_leader = is_leader
+        return is_leader
+
     def register_daily_tasks(self):
         """Реєструємо щоденні задачі"""
 
-        # Скидання щоденних бонусів о 00:00 за київським часом
-        self.schedule_daily(
-            time(0, 0),
-            self.reset_daily_bonuses,
-            "Reset daily bonuses"
-        )
+        # Стрік щоденного бонусу окремо не скидається: отримання бонусу саме
+        # починає стрік з 1 після пропуску (api/bonuses.py), а збережений
+        # streak_count потрібен для відновлення стріку
 
         # Нагадування про закінчення підписки о 10:00
         self.schedule_daily(
@@ -64,6 +101,20 @@ class Scheduler:
             "Cleanup old records"
         )
 
+        # Превʼю сімейств для архівів, у яких їх ще немає, о 04:00
+        self.schedule_daily(
+            time(4, 0),
+            self.backfill_family_thumbnails,
+            "Backfill family thumbnails"
+        )
+
+        # Індекс вмісту для архівів, які ще не індексовані, о 04:30
+        self.schedule_daily(
+            time(4, 30),
+            self.backfill_archive_contents,
+            "Backfill archive contents index"
+        )
+
     def register_periodic_tasks(self):
         """Реєструємо періодичні задачі"""
 
@@ -74,6 +125,20 @@ class Scheduler:
             "Cleanup expired tokens"
         )
 
+        # Видалення прострочених сесій докачуваного завантаження щогодини
+        self.schedule_periodic(
+            60,
+            self.cleanup_upload_sessions,
+            "Cleanup upload sessions"
+        )
+
+        # Згортання журналу подій в аналітику розробників
+        self.schedule_periodic(
+            settings.ANALYTICS_ROLLUP_MINUTES,
+            self.rollup_analytics,
+            "Rollup developer analytics"
+        )
+
         # Оновлення статистики кожні 5 хвилин
         self.schedule_periodic(
             5,
@@ -140,29 +205,6 @@ class Scheduler:
 
     # --- ЗАДАЧІ ---
 
-    async def reset_daily_bonuses(self):
-        """Скидання щоденних бонусів"""
-        try:
-            from database import async_session
-            from models.bonus import DailyBonus
-            from sqlalchemy import update
-
-            async with async_session() as session:
-
-                yesterday = datetime.now(self.timezone).date() - timedelta(days=1)
-
-                await session.execute(
-                    update(DailyBonus)
-                    .where(DailyBonus.last_claim_date < yesterday)
-                    .values(streak_count=0)
-                )
-                await session.commit()
-
-            logger.info("Daily bonuses reset completed")
-
-        except Exception as e:
-            logger.error(f"Error resetting daily bonuses: {e}")
-
     async def check_expiring_subscriptions(self):
         """Перевірка підписок що закінчуються"""
         try:
@@ -173,8 +215,9 @@ class Scheduler:
             from sqlalchemy import select
 
             async with async_session() as session:
-                # Знаходимо підписки що закінчуються через 3 дні
-                check_date = datetime.now(self.timezone) + timedelta(days=3)
+                # Знаходимо підписки що закінчуються через 3 дні (end_date в БД - UTC без зони)
+                now = datetime.utcnow()
+                check_date = now + timedelta(days=3)
 
                 result = await session.execute(
                     select(Subscription, User)
@@ -182,16 +225,16 @@ class Scheduler:
                     .where(
                         Subscription.status == SubscriptionStatus.ACTIVE,
                         Subscription.end_date <= check_date,
-                        Subscription.end_date > datetime.now(self.timezone)
+                        Subscription.end_date > now
                     )
                 )
 
                 for subscription, user in result:
-                    days_left = (subscription.end_date - datetime.now(self.timezone)).days
+                    days_left = (subscription.end_date - now).days
 
                     # Відправляємо нагадування
                     await telegram_service.send_subscription_reminder(
-                        user.user_id,
+                        int(user.telegram_id),
                         days_left,
                         user.language_code
                     )
@@ -206,12 +249,12 @@ class Scheduler:
         try:
             from database import async_session
             from models.notification import Notification
-            from models.view_history import ViewHistory
+            from models.view_history import ViewHistory, ViewHistoryClear
             from sqlalchemy import delete
 
             async with async_session() as session:
                 # Видаляємо старі прочитані повідомлення (старші 30 днів)
-                cutoff_date = datetime.now(self.timezone) - timedelta(days=30)
+                cutoff_date = datetime.utcnow() - timedelta(days=30)
 
                 await session.execute(
                     delete(Notification)
@@ -222,13 +265,19 @@ class Scheduler:
                 )
 
                 # Видаляємо стару історію переглядів (старші 90 днів)
-                history_cutoff = datetime.now(self.timezone) - timedelta(days=90)
+                history_cutoff = datetime.utcnow() - timedelta(days=90)
 
                 await session.execute(
                     delete(ViewHistory)
                     .where(ViewHistory.viewed_at < history_cutoff)
                 )
 
+                # Мітки очищення історії потрібні лише поки буфери воркерів не записані
+                await session.execute(
+                    delete(ViewHistoryClear)
+                    .where(ViewHistoryClear.cleared_at < datetime.utcnow() - timedelta(days=1))
+                )
+
                 await session.commit()
 
             logger.info("Old records cleanup completed")
@@ -241,14 +290,84 @@ class Scheduler:
         try:
             from services.file_service import file_service
 
-            file_service.cleanup_expired_tokens()
-            file_service.cleanup_temp_files()
+            await file_service.cleanup_expired_tokens()
+            await file_service.cleanup_temp_files()
 
             logger.info("Token cleanup completed")
 
         except Exception as e:
             logger.error(f"Error cleaning tokens: {e}")
 
+    async def cleanup_upload_sessions(self):
+        """Видалення прострочених сесій завантаження та їх тимчасових файлів"""
+        try:
+            from database import async_session
+            from models.upload_session import UploadSession, UploadChunk
+            from api.uploads import TEMP_DIR
+            from sqlalchemy import select, delete
+
+            async with async_session() as session:
+                result = await session.execute(
+                    select(UploadSession.id).where(UploadSession.expires_at < datetime.utcnow())
+                )
+                expired_ids = result.scalars().all()
+
+                if expired_ids:
+                    await session.execute(delete(UploadChunk).where(UploadChunk.session_id.in_(expired_ids)))
+                    await session.execute(delete(UploadSession).where(UploadSession.id.in_(expired_ids)))
+                    await session.commit()
+
+            for session_id in expired_ids:
+                (TEMP_DIR / f"{session_id}.part").unlink(missing_ok=True)
+
+            logger.info(f"Upload sessions cleanup completed: {len(expired_ids)} removed")
+
+        except Exception as e:
+            logger.error(f"Error cleaning upload sessions: {e}")
+
+    async def backfill_family_thumbnails(self):
+        """Витягування превʼю сімейств Revit з архівів у data/premium та data/free"""
+        try:
+            from database import async_session
+            from services.family_thumbnails import family_thumbnail_service
+
+            async with async_session() as session:
+                result = await family_thumbnail_service.backfill(session)
+
+            logger.info(f"Family thumbnails backfill completed: {result}")
+
+        except Exception as e:
+            logger.error(f"Error backfilling family thumbnails: {e}")
+
+    async def backfill_archive_contents(self):
+        """Індексація вмісту архівів з data/premium та data/free"""
+        try:
+            from database import async_session
+            from services.archive_contents import archive_content_service
+
+            async with async_session() as session:
+                result = await archive_content_service.backfill(session)
+
+            logger.info(f"Archive contents backfill completed: {result}")
+
+        except Exception as e:
+            logger.error(f"Error backfilling archive contents: {e}")
+
+    async def rollup_analytics(self):
+        """Згортання закритих сегментів журналу подій в DeveloperAnalytics"""
+        try:
+            from database import async_session
+            from services.analytics import analytics_service
+
+            async with async_session() as session:
+                result = await analytics_service.rollup(session)
+
+            if result["segments"]:
+                logger.info(f"Analytics rollup completed: {result}")
+
+        except Exception as e:
+            logger.error(f"Error rolling up analytics: {e}")
+
     async def update_statistics(self):
         """Оновлення статистики"""
         # Тут можна додати оновлення кешованої статистики
@@ -0,0 +1,368 @@
+# backend/services/analytics.py
+import asyncio
+import json
+import logging
+import os
+import secrets
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, delete, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models.marketplace import MarketplaceProduct, DeveloperAnalytics, AnalyticsSegment
+from services.executor import executor_service
+from services.hyperloglog import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("view", "add_to_cart", "checkout_started", "sale")
+# Події, які можна надсилати з фронтенду (решта пишеться сервером)
+CLIENT_EVENT_TYPES = ("add_to_cart",)
+DEFAULT_SOURCE = "direct"
+# Понад стільки подій у буфері нові відкидаються (якщо диск не встигає)
+MAX_BUFFERED_EVENTS = 50000
+# Сегментів за один прохід згортання
+ROLLUP_MAX_SEGMENTS = 200
+# Скільки памʼятати імена вже згорнутих сегментів
+SEGMENT_RETENTION_DAYS = 7
+
+
+class AnalyticsService:
+    """
+    Аналітика розробників: журнал подій на диску та згортання в DeveloperAnalytics.
+
+    record кладе подію (JSON рядок) в буфер процесу; раз на ANALYTICS_FLUSH_INTERVAL_SECONDS
+    буфер дописується в поточний сегмент {ANALYTICS_DIR}/*.open. Сегмент закривається
+    (перейменовується в *.log) за віком або розміром, після чого файл більше не змінюється.
+    Задача планувальника rollup згортає закриті сегменти в денні рядки DeveloperAnalytics
+    одним проходом; імена згорнутих сегментів пишуться в analytics_segments в тій самій
+    транзакції, тож сегмент не буде врахований двічі, навіть якщо файл не встиг видалитись.
+    Унікальні відвідувачі рахуються HyperLogLog скетчем, що зберігається в рядку дня.
+    """
+
+    def __init__(self):
+        self.log_dir = settings.ANALYTICS_DIR
+        self.flush_interval = settings.ANALYTICS_FLUSH_INTERVAL_SECONDS
+        self._buffer: List[str] = []
+        self._segment: Optional[Path] = None
+        self._segment_started = 0.0
+        self._lock = asyncio.Lock()
+        self.running = False
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.sealed = 0
+        self.rollups = 0
+        self.rolled_up_events = 0
+        self.last_rollup: Optional[dict] = None
+
+    # --- Запис подій ---
+
+    def record(
+            self,
+            event_type: str,
+            archive_id: int,
+            visitor: Optional[str] = None,
+            source: Optional[str] = None,
+            revenue: float = 0.0
+    ):
+        """Додати подію в журнал (на диск потрапить при наступному flush)"""
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f"Unknown analytics event {event_type}")
+        if len(self._buffer) >= MAX_BUFFERED_EVENTS:
+            self.dropped += 1
+            return
+
+        event = {"t": event_type, "a": archive_id, "ts": int(time.time())}
+        if visitor is not None:
+            event["u"] = str(visitor)
+        if source:
+            event["s"] = source[:30]
+        if revenue:
+            event["r"] = round(float(revenue), 2)
+        self._buffer.append(json.dumps(event, separators=(",", ":")))
+        self.recorded += 1
+
+    def _new_segment(self) -> Path:
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        return self.log_dir / f"{int(time.time())}-{os.getpid()}-{secrets.token_hex(4)}.open"
+
+    def _seal(self):
+        """Закрити поточний сегмент - з цього моменту його можна згортати"""
+        if self._segment is not None and self._segment.exists():
+            os.replace(self._segment, self._segment.with_suffix(".log"))
+            self.sealed += 1
+        self._segment = None
+
+    def _write(self, lines: List[str]):
+        """Дописати рядки в поточний сегмент (з ротацією за віком та розміром)"""
+        if self._segment is not None and (
+                not self._segment.exists()
+                or time.time() - self._segment_started >= settings.ANALYTICS_SEGMENT_SECONDS
+                or self._segment.stat().st_size >= settings.ANALYTICS_SEGMENT_MAX_MB * 1024 * 1024
+        ):
+            self._seal()
+
+        if not lines:
+            return
+        if self._segment is None:
+            self._segment = self._new_segment()
+            self._segment_started = time.time()
+        with open(self._segment, "a", encoding="utf-8") as segment:
+            segment.write("\n".join(lines) + "\n")
+
+    async def flush(self, seal: bool = False) -> int:
+        """Дописати буфер на диск; seal - одразу закрити сегмент (при зупинці)"""
+        async with self._lock:
+            lines, self._buffer = self._buffer, []
+            if not lines and self._segment is None:
+                return 0
+            try:
+                await executor_service.run_io(self._write, lines)
+            except Exception as e:
+                self._buffer = lines + self._buffer
+                logger.error(f"Analytics log write failed: {e}")
+                return 0
+            self.written += len(lines)
+            if seal:
+                await executor_service.run_io(self._seal)
+            return len(lines)
+
+    async def start(self):
+        """Фоновий цикл запису (запускається в lifespan кожного воркера)"""
+        self.running = True
+        while self.running:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def stop(self):
+        """Зупинити цикл, записати залишок і закрити сегмент"""
+        self.running = False
+        await self.flush(seal=True)
+
+    # --- Згортання ---
+
+    def _sealed_segments(self) -> List[Path]:
+        """Закриті сегменти; *.open процесів, що впали, закриваються за віком"""
+        if not self.log_dir.exists():
+            return []
+
+        abandoned_after = settings.ANALYTICS_SEGMENT_SECONDS * 3
+        for path in self.log_dir.glob("*.open"):
+            if path != self._segment and time.time() - path.stat().st_mtime > abandoned_after:
+                os.replace(path, path.with_suffix(".log"))
+
+        return sorted(self.log_dir.glob("*.log"))[:ROLLUP_MAX_SEGMENTS]
+
+    @staticmethod
+    def _read_segment(path: Path) -> List[dict]:
+        events = []
+        with open(path, encoding="utf-8") as segment:
+            for line in segment:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    # Недописаний рядок при аварійному завершенні
+                    continue
+        return events
+
+    @staticmethod
+    def _aggregate(events: List[dict], products: Dict[int, tuple]) -> dict:
+        """Суми по (developer_id, день); події архівів, що не є товарами, пропускаються"""
+        days = {}
+        for event in events:
+            product = products.get(event.get("a"))
+            if product is None:
+                continue
+            product_id, developer_id = product
+            day = datetime.utcfromtimestamp(event["ts"]).replace(hour=0, minute=0, second=0, microsecond=0)
+
+            totals = days.get((developer_id, day))
+            if totals is None:
+                totals = days[(developer_id, day)] = {
+                    "views": 0, "sales": 0, "revenue": 0.0, "add_to_cart": 0, "checkout_started": 0,
+                    "products": defaultdict(lambda: defaultdict(int)),
+                    "sources": defaultdict(int),
+                    "visitors": HyperLogLog()
+                }
+
+            event_type = event["t"]
+            product_totals = totals["products"][str(product_id)]
+            if event_type == "view":
+                totals["views"] += 1
+                product_totals["views"] += 1
+                totals["sources"][event.get("s", DEFAULT_SOURCE)] += 1
+                if "u" in event:
+                    totals["visitors"].add(event["u"])
+            elif event_type == "sale":
+                totals["sales"] += 1
+                totals["revenue"] += event.get("r", 0.0)
+                product_totals["sales"] += 1
+                product_totals["revenue"] += event.get("r", 0.0)
+            elif event_type in ("add_to_cart", "checkout_started"):
+                totals[event_type] += 1
+                product_totals[event_type] += 1
+        return days
+
+    @staticmethod
+    def _merge_counts(current: Optional[dict], added: dict) -> dict:
+        merged = dict(current or {})
+        for key, value in added.items():
+            if isinstance(value, dict):
+                merged[key] = AnalyticsService._merge_counts(merged.get(key), value)
+            else:
+                merged[key] = round(merged.get(key, 0) + value, 2)
+        return merged
+
+    async def rollup(self, session: AsyncSession) -> dict:
+        """Згорнути закриті сегменти журналу в DeveloperAnalytics"""
+        segments = await executor_service.run_io(self._sealed_segments)
+        if not segments:
+            return {"segments": 0, "events": 0, "days": 0}
+
+        result = await session.execute(
+            select(AnalyticsSegment.name).where(AnalyticsSegment.name.in_([path.name for path in segments]))
+        )
+        already_done = set(result.scalars().all())
+        pending = [path for path in segments if path.name not in already_done]
+
+        events_by_segment = {}
+        for path in pending:
+            events_by_segment[path.name] = await executor_service.run_io(self._read_segment, path)
+        events = [event for segment_events in events_by_segment.values() for event in segment_events]
+
+        archive_ids = list({event.get("a") for event in events})
+        products = {}
+        for start in range(0, len(archive_ids), 500):
+            result = await session.execute(
+                select(MarketplaceProduct.archive_id, MarketplaceProduct.id, MarketplaceProduct.developer_id)
+                .where(MarketplaceProduct.archive_id.in_(archive_ids[start:start + 500]))
+            )
+            products.update({archive_id: (product_id, developer_id) for archive_id, product_id, developer_id in result.all()})
+
+        days = self._aggregate(events, products)
+        if days:
+            result = await session.execute(
+                select(DeveloperAnalytics).where(
+                    tuple_(DeveloperAnalytics.developer_id, DeveloperAnalytics.date).in_(list(days))
+                )
+            )
+            rows = {(row.developer_id, row.date): row for row in result.scalars().all()}
+
+            for (developer_id, day), totals in days.items():
+                row = rows.get((developer_id, day))
+                if row is None:
+                    row = DeveloperAnalytics(developer_id=developer_id, date=day)
+                    session.add(row)
+
+                row.views = (row.views or 0) + totals["views"]
+                row.sales = (row.sales or 0) + totals["sales"]
+                row.revenue = round((row.revenue or 0.0) + totals["revenue"], 2)
+                row.add_to_cart = (row.add_to_cart or 0) + totals["add_to_cart"]
+                row.checkout_started = (row.checkout_started or 0) + totals["checkout_started"]
+                row.product_metrics = self._merge_counts(
+                    row.product_metrics, {key: dict(value) for key, value in totals["products"].items()}
+                )
+                row.traffic_sources = self._merge_counts(row.traffic_sources, dict(totals["sources"]))
+
+                visitors = HyperLogLog.from_bytes(row.visitor_sketch)
+                visitors.merge(totals["visitors"])
+                row.visitor_sketch = visitors.to_bytes()
+                row.unique_visitors = visitors.count()
+
+        session.add_all(
+            AnalyticsSegment(name=name, events_count=len(segment_events))
+            for name, segment_events in events_by_segment.items()
+        )
+        await session.execute(
+            delete(AnalyticsSegment).where(
+                AnalyticsSegment.processed_at < datetime.utcnow() - timedelta(days=SEGMENT_RETENTION_DAYS)
+            )
+        )
+        await session.commit()
+
+        for path in segments:
+            await executor_service.run_io(path.unlink, missing_ok=True)
+
+        self.rollups += 1
+        self.rolled_up_events += len(events)
+        self.last_rollup = {
+            "segments": len(pending),
+            "events": len(events),
+            "days": len(days),
+            "finished_at": time.time()
+        }
+        return self.last_rollup
+
+    # --- Читання ---
+
+    async def developer_summary(self, session: AsyncSession, developer_id: int, days: int = 30) -> dict:
+        """Денні рядки та підсумки за останні days днів (лише з DeveloperAnalytics)"""
+        since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+        result = await session.execute(
+            select(DeveloperAnalytics)
+            .where(DeveloperAnalytics.developer_id == developer_id, DeveloperAnalytics.date >= since)
+            .order_by(DeveloperAnalytics.date)
+        )
+        rows = result.scalars().all()
+
+        visitors = HyperLogLog()
+        products = {}
+        sources = {}
+        for row in rows:
+            visitors.merge(HyperLogLog.from_bytes(row.visitor_sketch))
+            products = self._merge_counts(products, row.product_metrics or {})
+            sources = self._merge_counts(sources, row.traffic_sources or {})
+
+        views = sum(row.views or 0 for row in rows)
+        sales = sum(row.sales or 0 for row in rows)
+        return {
+            "days": days,
+            "totals": {
+                "views": views,
+                # Скетчі днів обʼєднуються - відвідувач кількох днів рахується один раз
+                "unique_visitors": visitors.count(),
+                "sales": sales,
+                "revenue": round(sum(row.revenue or 0.0 for row in rows), 2),
+                "add_to_cart": sum(row.add_to_cart or 0 for row in rows),
+                "checkout_started": sum(row.checkout_started or 0 for row in rows),
+                "conversion_rate": round(sales / views * 100, 2) if views else 0.0
+            },
+            "traffic_sources": sources,
+            "products": products,
+            "daily": [
+                {
+                    "date": row.date.date().isoformat(),
+                    "views": row.views or 0,
+                    "unique_visitors": row.unique_visitors or 0,
+                    "sales": row.sales or 0,
+                    "revenue": row.revenue or 0.0,
+                    "add_to_cart": row.add_to_cart or 0,
+                    "checkout_started": row.checkout_started or 0
+                }
+                for row in rows
+            ]
+        }
+
+    def stats(self) -> dict:
+        return {
+            "flush_interval_seconds": self.flush_interval,
+            "segment_seconds": settings.ANALYTICS_SEGMENT_SECONDS,
+            "pending": len(self._buffer),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "written": self.written,
+            "segments_sealed": self.sealed,
+            "rollups": self.rollups,
+            "rolled_up_events": self.rolled_up_events,
+            "last_rollup": self.last_rollup
+        }
+
+
+# Створюємо глобальний екземпляр
+analytics_service = AnalyticsService()
@@ -0,0 +1,358 @@
+# backend/services/archive_contents.py
+import base64
+import json
+import logging
+import os
+import zipfile
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import select, delete, insert, func, and_, or_, text, table, column, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+
+from models.archive import Archive
+from models.archive_content import ArchiveEntry
+from services.executor import executor_service
+from services.file_service import file_service
+from services.search_index import archive_search_index
+
+logger = logging.getLogger(__name__)
+
+# Рядків в одному INSERT (обмеження SQLite на кількість параметрів)
+INSERT_BATCH_SIZE = 500
+# Скільки збігів показувати для кожного архіву в пошуку
+SEARCH_MATCHES_PER_ARCHIVE = 10
+
+ENTRIES_FTS_TABLE = "archive_entries_fts"
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class ArchiveContentService:
+    """
+    Індекс вмісту архівів у таблиці archive_entries.
+
+    ZIP читається лише по центральному каталогу (infolist) - без розпакування,
+    тому індексація пака на десятки тисяч файлів займає частки секунди.
+    Індекс будується при завантаженні архіву та фоновою задачею для вже наявних.
+
+    Назви файлів додатково індексуються в FTS5 (external content над archive_entries,
+    синхронізується тригерами), тож пошук по вмісту - префіксний пошук по словах
+    назви, а не повний перегляд таблиці через LIKE '%q%'.
+    """
+
+    def __init__(self):
+        self.fts_available = False
+        self.fts_table = table(ENTRIES_FTS_TABLE, column("rowid"))
+
+    async def setup(self, conn: AsyncConnection):
+        """Створити FTS5 індекс назв з тригерами (якщо його немає) та заповнити при розсинхронізації"""
+        try:
+            await conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {ENTRIES_FTS_TABLE} USING fts5("
+                "name, content = 'archive_entries', content_rowid = 'id', "
+                "tokenize = 'unicode61 remove_diacritics 2', "
+                "prefix = '2 3')"
+            ))
+        except Exception as e:
+            # SQLite зібраний без FTS5 - працюємо через LIKE
+            logger.warning(f"FTS5 is not available, archive contents search falls back to LIKE: {e}")
+            self.fts_available = False
+            return
+
+        await conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS archive_entries_fts_ai AFTER INSERT ON archive_entries BEGIN "
+            f"INSERT INTO {ENTRIES_FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END"
+        ))
+        await conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS archive_entries_fts_ad AFTER DELETE ON archive_entries BEGIN "
+            f"INSERT INTO {ENTRIES_FTS_TABLE}({ENTRIES_FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); END"
+        ))
+        await conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS archive_entries_fts_au AFTER UPDATE OF name ON archive_entries BEGIN "
+            f"INSERT INTO {ENTRIES_FTS_TABLE}({ENTRIES_FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); "
+            f"INSERT INTO {ENTRIES_FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END"
+        ))
+        self.fts_available = True
+
+        # Для external content count(*) читає саму archive_entries, тому рахуємо по _docsize
+        indexed = (await conn.execute(text(f"SELECT count(*) FROM {ENTRIES_FTS_TABLE}_docsize"))).scalar_one()
+        total = (await conn.execute(text("SELECT count(*) FROM archive_entries"))).scalar_one()
+        if indexed != total:
+            await conn.execute(text(f"INSERT INTO {ENTRIES_FTS_TABLE}({ENTRIES_FTS_TABLE}) VALUES ('rebuild')"))
+            logger.info("Archive contents search index rebuilt")
+
+    @staticmethod
+    def read_entries(source_path: Path) -> List[dict]:
+        """Файли та папки архіву (ZIP, папка або окремий .rfa) з розмірами; RAR/7z не індексуються"""
+        files = []
+        if source_path.is_dir():
+            for root, dirs, names in os.walk(source_path):
+                for name in names:
+                    file_path = Path(root) / name
+                    size = file_path.stat().st_size
+                    files.append({
+                        "path": file_path.relative_to(source_path.parent).as_posix(),
+                        "size": size,
+                        "compressed_size": size,
+                        "crc": None
+                    })
+        elif zipfile.is_zipfile(source_path):
+            with zipfile.ZipFile(source_path) as archive:
+                for info in archive.infolist():
+                    if info.is_dir():
+                        continue
+                    files.append({
+                        "path": info.filename.strip("/"),
+                        "size": info.file_size,
+                        "compressed_size": info.compress_size,
+                        "crc": info.CRC
+                    })
+        elif source_path.suffix.lower() == '.rfa':
+            size = source_path.stat().st_size
+            files.append({"path": source_path.name, "size": size, "compressed_size": size, "crc": None})
+
+        entries = []
+        directories = {}
+        for item in files:
+            path = item["path"]
+            parent, _, name = path.rpartition("/")
+            entries.append({
+                **item,
+                "parent": parent,
+                "name": name,
+                "extension": os.path.splitext(name)[1].lower()[:20],
+                "is_dir": False,
+                "files_count": 0
+            })
+
+            # Сумарні розміри для всіх батьківських папок
+            while parent:
+                directory = directories.setdefault(parent, {"size": 0, "compressed_size": 0, "files_count": 0})
+                directory["size"] += item["size"]
+                directory["compressed_size"] += item["compressed_size"]
+                directory["files_count"] += 1
+                parent = parent.rpartition("/")[0]
+
+        for path, totals in directories.items():
+            parent, _, name = path.rpartition("/")
+            entries.append({
+                "path": path,
+                "parent": parent,
+                "name": name,
+                "extension": "",
+                "is_dir": True,
+                "crc": None,
+                **totals
+            })
+
+        # ZIP може містити однакові шляхи - лишаємо останній, як і при розпакуванні
+        return list({entry["path"]: entry for entry in entries}.values())
+
+    async def index(self, session: AsyncSession, archive_code: str, source_path: Path) -> dict:
+        """Переіндексувати вміст архіву (старі записи замінюються)"""
+        entries = await executor_service.run_io(self.read_entries, source_path)
+
+        await session.execute(delete(ArchiveEntry).where(ArchiveEntry.archive_code == archive_code))
+        for start in range(0, len(entries), INSERT_BATCH_SIZE):
+            await session.execute(
+                insert(ArchiveEntry),
+                [{"archive_code": archive_code, **entry} for entry in entries[start:start + INSERT_BATCH_SIZE]]
+            )
+        await session.commit()
+
+        files = [entry for entry in entries if not entry["is_dir"]]
+        logger.info(f"Indexed {len(files)} files of archive {archive_code}")
+        return {
+            "files_count": len(files),
+            "total_size": sum(entry["size"] for entry in files)
+        }
+
+    async def index_safe(self, archive_code: str, source_path: Path):
+        """index для фонових задач: власна сесія, помилка лише логується"""
+        from database import async_session
+
+        try:
+            async with async_session() as session:
+                await self.index(session, archive_code, source_path)
+        except Exception as e:
+            logger.error(f"Archive content indexing failed for {archive_code}: {e}")
+
+    async def summary(self, session: AsyncSession, archive_code: str) -> Optional[dict]:
+        """Кількість файлів і загальний розмір; None якщо архів не індексовано"""
+        result = await session.execute(
+            select(func.count(ArchiveEntry.id), func.sum(ArchiveEntry.size), func.sum(ArchiveEntry.compressed_size))
+            .where(ArchiveEntry.archive_code == archive_code, ArchiveEntry.is_dir.is_(False))
+        )
+        files_count, total_size, compressed_size = result.one()
+        if not files_count:
+            return None
+        return {"files_count": files_count, "total_size": total_size, "compressed_size": compressed_size}
+
+    async def file_paths(self, session: AsyncSession, archive_code: str) -> List[str]:
+        """Шляхи всіх файлів архіву з індексу"""
+        result = await session.execute(
+            select(ArchiveEntry.path)
+            .where(ArchiveEntry.archive_code == archive_code, ArchiveEntry.is_dir.is_(False))
+            .order_by(ArchiveEntry.path)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    def _encode_cursor(is_dir: bool, name: str) -> str:
+        return base64.urlsafe_b64encode(json.dumps([is_dir, name]).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple:
+        try:
+            is_dir, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return bool(is_dir), str(name)
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+
+    async def list_directory(
+            self,
+            session: AsyncSession,
+            archive_code: str,
+            path: str = "",
+            cursor: Optional[str] = None,
+            limit: int = 100
+    ) -> dict:
+        """
+        Один рівень дерева: спочатку папки, потім файли, за назвою.
+        Пагінація курсором (is_dir, name), тому глибокі сторінки не дорожчі за першу.
+        """
+        query = select(ArchiveEntry).where(
+            ArchiveEntry.archive_code == archive_code,
+            ArchiveEntry.parent == path
+        )
+        if cursor:
+            cursor_is_dir, cursor_name = self._decode_cursor(cursor)
+            after_cursor = and_(ArchiveEntry.is_dir.is_(cursor_is_dir), ArchiveEntry.name > cursor_name)
+            # Після останньої папки йдуть усі файли
+            query = query.where(or_(after_cursor, ArchiveEntry.is_dir.is_(False)) if cursor_is_dir else after_cursor)
+
+        result = await session.execute(
+            query.order_by(ArchiveEntry.is_dir.desc(), ArchiveEntry.name).limit(limit + 1)
+        )
+        rows = result.scalars().all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        return {
+            "path": path,
+            "items": [
+                {
+                    "name": entry.name,
+                    "path": entry.path,
+                    "type": "directory" if entry.is_dir else "file",
+                    "extension": entry.extension or None,
+                    "size": entry.size,
+                    "compressed_size": entry.compressed_size,
+                    "crc": f"{entry.crc:08x}" if entry.crc is not None else None,
+                    "files_count": entry.files_count if entry.is_dir else None
+                }
+                for entry in rows
+            ],
+            "next_cursor": self._encode_cursor(rows[-1].is_dir, rows[-1].name) if has_more else None,
+            "has_more": has_more
+        }
+
+    async def directory_exists(self, session: AsyncSession, archive_code: str, path: str) -> bool:
+        result = await session.execute(
+            select(ArchiveEntry.id).where(
+                ArchiveEntry.archive_code == archive_code,
+                ArchiveEntry.path == path,
+                ArchiveEntry.is_dir.is_(True)
+            )
+        )
+        return result.first() is not None
+
+    async def search(
+            self,
+            session: AsyncSession,
+            query: str,
+            extension: Optional[str] = '.rfa',
+            limit: int = 20
+    ) -> List[dict]:
+        """Архіви, що містять файли, в назві яких є слова з query (за замовчуванням - сімейства .rfa)"""
+        if self.fts_available:
+            match_query = archive_search_index.build_match_query(query)
+            if not match_query:
+                return []
+            fts = literal_column(ENTRIES_FTS_TABLE)
+            name_condition = ArchiveEntry.id.in_(
+                select(self.fts_table.c.rowid).select_from(self.fts_table).where(fts.op("MATCH")(match_query))
+            )
+        else:
+            name_condition = ArchiveEntry.name.ilike(f"%{_escape_like(query)}%", escape="\\")
+
+        conditions = [ArchiveEntry.is_dir.is_(False), name_condition]
+        if extension:
+            conditions.append(ArchiveEntry.extension == extension.lower())
+
+        counts = await session.execute(
+            select(Archive.id, Archive.code, Archive.title, func.count(ArchiveEntry.id).label("matches"))
+            .join(Archive, Archive.code == ArchiveEntry.archive_code)
+            .where(*conditions)
+            .group_by(Archive.id)
+            .order_by(func.count(ArchiveEntry.id).desc(), Archive.id)
+            .limit(limit)
+        )
+        archives = counts.all()
+        if not archives:
+            return []
+
+        matches = await session.execute(
+            select(ArchiveEntry.archive_code, ArchiveEntry.path, ArchiveEntry.size)
+            .where(*conditions, ArchiveEntry.archive_code.in_([row.code for row in archives]))
+            .order_by(ArchiveEntry.archive_code, ArchiveEntry.path)
+        )
+        by_code = {}
+        for archive_code, path, size in matches.all():
+            items = by_code.setdefault(archive_code, [])
+            if len(items) < SEARCH_MATCHES_PER_ARCHIVE:
+                items.append({"path": path, "size": size})
+
+        return [
+            {
+                "archive_id": row.id,
+                "code": row.code,
+                "title": row.title,
+                "matches_count": row.matches,
+                "matches": by_code.get(row.code, [])
+            }
+            for row in archives
+        ]
+
+    async def backfill(self, session: AsyncSession) -> dict:
+        """Проіндексувати всі архіви, для яких ще немає записів"""
+        indexed_codes = select(ArchiveEntry.archive_code).distinct()
+        result = await session.execute(
+            select(Archive.code, Archive.archive_type, Archive.file_path).where(Archive.code.not_in(indexed_codes))
+        )
+        processed = skipped = failed = 0
+
+        for archive_code, archive_type, stored_path in result.all():
+            source_path = await executor_service.run_io(
+                file_service.get_archive_source, archive_code, archive_type, stored_path
+            )
+            if source_path is None:
+                skipped += 1
+                continue
+
+            try:
+                await self.index(session, archive_code, source_path)
+                processed += 1
+            except Exception as e:
+                await session.rollback()
+                failed += 1
+                logger.error(f"Archive content backfill failed for {archive_code}: {e}")
+
+        return {"processed": processed, "skipped": skipped, "failed": failed}
+
+
+# Створюємо глобальний екземпляр
+archive_content_service = ArchiveContentService()
@@ -0,0 +1,183 @@
+# backend/services/archive_versions.py
+import functools
+import io
+import json
+import logging
+import time
+import zipfile
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models.archive import Archive
+from models.archive_version import ArchiveVersion
+from services.cpu_tasks import hash_archive_files
+from services.executor import executor_service
+from services.file_service import file_service
+
+logger = logging.getLogger(__name__)
+
+# Службовий файл у дельта-ZIP зі списком видалених/змінених файлів
+DELTA_MANIFEST_NAME = "_delta.json"
+
+
+class ArchiveVersionService:
+    """
+    Версії архівів та дельта-завантаження.
+
+    При публікації версії рахується sha256 кожного файлу архіву (в пулі процесів).
+    Дельта між версією користувача та останньою - це додані та змінені файли,
+    які віддаються потоковим ZIP з поточного файлу архіву, плюс список видалених
+    у _delta.json. Старі версії файлів не зберігаються, тому дельта можлива лише
+    до останньої версії.
+    """
+
+    @staticmethod
+    def archive_source(archive: Archive) -> Optional[Path]:
+        """Файл або папка архіву: за кодом у data/premium|free, інакше archive.file_path"""
+        return file_service.get_archive_source(archive.code, archive.archive_type, archive.file_path)
+
+    @staticmethod
+    def source_fingerprint(source_path: Path) -> str:
+        """Відбиток стану файлу/папки архіву - щоб помітити зміну файлу без нової версії"""
+        if source_path.is_dir():
+            return file_service.folder_fingerprint(source_path)
+        stats = source_path.stat()
+        return f"{stats.st_size:x}-{stats.st_mtime_ns:x}"
+
+    async def publish(
+            self,
+            session: AsyncSession,
+            archive: Archive,
+            version: str,
+            changelog: Optional[str] = None
+    ) -> ArchiveVersion:
+        """Зафіксувати поточний вміст архіву як нову версію"""
+        existing = await session.execute(
+            select(ArchiveVersion.id).where(
+                ArchiveVersion.archive_id == archive.id,
+                ArchiveVersion.version == version
+            )
+        )
+        if existing.first() is not None:
+            raise HTTPException(status_code=409, detail=f"Version {version} already exists")
+
+        source_path = await executor_service.run_io(self.archive_source, archive)
+        if source_path is None:
+            raise HTTPException(status_code=404, detail="Archive file not found")
+
+        fingerprint = await executor_service.run_io(self.source_fingerprint, source_path)
+        try:
+            manifest = await executor_service.run_cpu(
+                hash_archive_files, source_path, timeout=settings.ZIP_BUILD_TIMEOUT_SECONDS
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        archive_version = ArchiveVersion(
+            archive_id=archive.id,
+            version=version,
+            changelog=changelog,
+            manifest=manifest,
+            files_count=len(manifest),
+            total_size=sum(size for _, size in manifest.values()),
+            source_fingerprint=fingerprint
+        )
+        session.add(archive_version)
+        await session.commit()
+
+        logger.info(f"Published version {version} of archive {archive.code}: {len(manifest)} files")
+        return archive_version
+
+    async def list_versions(self, session: AsyncSession, archive_id: int) -> List[ArchiveVersion]:
+        """Версії архіву від найновішої"""
+        result = await session.execute(
+            select(ArchiveVersion)
+            .where(ArchiveVersion.archive_id == archive_id)
+            .order_by(ArchiveVersion.id.desc())
+        )
+        return list(result.scalars().all())
+
+    async def get_version(self, session: AsyncSession, archive_id: int, version: str) -> Optional[ArchiveVersion]:
+        result = await session.execute(
+            select(ArchiveVersion).where(
+                ArchiveVersion.archive_id == archive_id,
+                ArchiveVersion.version == version
+            )
+        )
+        return result.scalar_one_or_none()
+
+    async def latest(self, session: AsyncSession, archive_id: int) -> Optional[ArchiveVersion]:
+        result = await session.execute(
+            select(ArchiveVersion)
+            .where(ArchiveVersion.archive_id == archive_id)
+            .order_by(ArchiveVersion.id.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    def diff(old_manifest: dict, new_manifest: dict) -> dict:
+        """Різниця маніфестів: додані, змінені (інший sha256) та видалені шляхи"""
+        added = sorted(path for path in new_manifest if path not in old_manifest)
+        changed = sorted(
+            path for path, (digest, _) in new_manifest.items()
+            if path in old_manifest and old_manifest[path][0] != digest
+        )
+        deleted = sorted(path for path in old_manifest if path not in new_manifest)
+        return {
+            "added": added,
+            "changed": changed,
+            "deleted": deleted,
+            "download_size": sum(new_manifest[path][1] for path in added + changed)
+        }
+
+    async def plan(self, session: AsyncSession, archive: Archive, from_version: str) -> dict:
+        """Дельта від версії користувача до останньої (без самих файлів)"""
+        base = await self.get_version(session, archive.id, from_version)
+        if base is None:
+            raise HTTPException(status_code=404, detail=f"Version {from_version} not found")
+
+        target = await self.latest(session, archive.id)
+        delta = self.diff(base.manifest, target.manifest)
+        return {
+            "from_version": base.version,
+            "to_version": target.version,
+            "changelog": target.changelog,
+            "full_size": target.total_size,
+            **delta
+        }
+
+    def stream_delta(self, source_path: Path, delta: dict):
+        """Потоковий ZIP з доданими та зміненими файлами і _delta.json"""
+        def entries():
+            delta_json = json.dumps(
+                {key: delta[key] for key in ("from_version", "to_version", "added", "changed", "deleted")},
+                ensure_ascii=False, indent=2
+            ).encode()
+            info = zipfile.ZipInfo(DELTA_MANIFEST_NAME, time.localtime()[:6])
+            info.file_size = len(delta_json)
+            yield info, functools.partial(io.BytesIO, delta_json)
+
+            paths = delta["added"] + delta["changed"]
+            if source_path.is_dir():
+                for path in paths:
+                    file_path = source_path.parent / path
+                    yield zipfile.ZipInfo.from_file(file_path, path), functools.partial(open, file_path, 'rb')
+            else:
+                with zipfile.ZipFile(source_path) as archive:
+                    for path in paths:
+                        member = archive.getinfo(path)
+                        info = zipfile.ZipInfo(path, member.date_time)
+                        info.file_size = member.file_size
+                        yield info, functools.partial(archive.open, member)
+
+        return file_service.stream_zip(entries())
+
+
+# Створюємо глобальний екземпляр
+archive_version_service = ArchiveVersionService()
@@ -0,0 +1,147 @@
+# backend/services/bonus.py
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import update, insert, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models.user import User
+from models.bonus import BonusTransaction, BonusTransactionType
+
+logger = logging.getLogger(__name__)
+
+# Користувачів в одному UPDATE ... CASE (обмеження SQLite на кількість параметрів)
+BATCH_SIZE = 500
+
+
+class BonusLedgerService:
+    """
+    Бонусний баланс як журнал: кожна зміна - один атомарний
+    UPDATE users SET bonus_balance = bonus_balance + ? ... RETURNING bonus_balance
+    і запис BonusTransaction у тій самій транзакції.
+
+    Баланс рахує сама БД, тому паралельні запити (і кілька воркерів) не
+    перезаписують зміни один одного, а списання не може піти в мінус - умова
+    перевіряється в тому ж UPDATE. Сервіс не робить commit: зміна балансу
+    фіксується разом з рештою змін запиту (замовлення, підписка тощо).
+    Кеш користувачів скидається після commit (див. services/user_cache.py).
+    """
+
+    @staticmethod
+    def _sync_user(session: AsyncSession, user_id: int, balance: int):
+        """Оновити bonus_balance завантаженого в сесію User без позначки змін"""
+        session.info.setdefault("changed_user_ids", set()).add(user_id)
+        for obj in session.identity_map.values():
+            if isinstance(obj, User) and obj.id == user_id:
+                set_committed_value(obj, "bonus_balance", balance)
+
+    async def apply(
+            self,
+            session: AsyncSession,
+            user_id: int,
+            amount: int,
+            type: BonusTransactionType,
+            description: Optional[str] = None,
+            order_id: Optional[int] = None,
+            referral_id: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        Нарахувати (amount > 0) або списати (amount < 0) бонуси.
+        Повертає новий баланс або None, якщо бонусів недостатньо.
+        """
+        balance = func.coalesce(User.bonus_balance, 0)
+        result = await session.execute(
+            update(User)
+            .where(User.id == user_id, balance + amount >= 0)
+            .values(bonus_balance=balance + amount)
+            .returning(User.bonus_balance)
+            .execution_options(synchronize_session=False)
+        )
+        new_balance = result.scalar_one_or_none()
+        if new_balance is None:
+            return None
+
+        await session.execute(
+            insert(BonusTransaction).values(
+                user_id=user_id,
+                amount=amount,
+                balance_after=new_balance,
+                type=type,
+                description=description,
+                order_id=order_id,
+                referral_id=referral_id
+            )
+        )
+        self._sync_user(session, user_id, new_balance)
+        return new_balance
+
+    async def credit(self, session: AsyncSession, user_id: int, amount: int, type: BonusTransactionType, **kwargs) -> int:
+        """Нарахувати бонуси; 404 якщо користувача немає"""
+        new_balance = await self.apply(session, user_id, abs(amount), type, **kwargs)
+        if new_balance is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return new_balance
+
+    async def debit(self, session: AsyncSession, user_id: int, amount: int, type: BonusTransactionType, **kwargs) -> int:
+        """Списати бонуси; 400 якщо бонусів недостатньо"""
+        new_balance = await self.apply(session, user_id, -abs(amount), type, **kwargs)
+        if new_balance is None:
+            raise HTTPException(status_code=400, detail="Недостатньо бонусів")
+        return new_balance
+
+    async def credit_many(self, session: AsyncSession, credits: List[dict]) -> Dict[int, int]:
+        """
+        Нарахування багатьом користувачам (кешбек, реферальні виплати) пачкою:
+        один UPDATE ... CASE та один INSERT журналу на BATCH_SIZE користувачів.
+
+        credits - словники з user_id, amount, type та необовʼязковими description,
+        order_id, referral_id. Повертає нові баланси за user_id (відсутні користувачі
+        пропускаються).
+        """
+        by_user = defaultdict(list)
+        for item in credits:
+            if item["amount"] > 0:
+                by_user[item["user_id"]].append(item)
+
+        balances = {}
+        user_ids = list(by_user)
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            chunk = user_ids[start:start + BATCH_SIZE]
+            totals = {user_id: sum(item["amount"] for item in by_user[user_id]) for user_id in chunk}
+            result = await session.execute(
+                update(User)
+                .where(User.id.in_(chunk))
+                .values(bonus_balance=func.coalesce(User.bonus_balance, 0) + case(totals, value=User.id))
+                .returning(User.id, User.bonus_balance)
+                .execution_options(synchronize_session=False)
+            )
+            balances.update(dict(result.all()))
+
+        rows = []
+        for user_id, new_balance in balances.items():
+            # balance_after кожного запису - як якби нарахування йшли по черзі
+            balance = new_balance - sum(item["amount"] for item in by_user[user_id])
+            for item in by_user[user_id]:
+                balance += item["amount"]
+                rows.append({
+                    "user_id": user_id,
+                    "amount": item["amount"],
+                    "balance_after": balance,
+                    "type": item["type"],
+                    "description": item.get("description"),
+                    "order_id": item.get("order_id"),
+                    "referral_id": item.get("referral_id")
+                })
+            self._sync_user(session, user_id, new_balance)
+
+        for start in range(0, len(rows), BATCH_SIZE):
+            await session.execute(insert(BonusTransaction), rows[start:start + BATCH_SIZE])
+
+        return balances
+
+
+# Створюємо глобальний екземпляр
+bonus_ledger = BonusLedgerService()
@@ -0,0 +1,315 @@
+# backend/services/catalog.py
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Any, List, Mapping, Optional, Tuple
+
+from sqlalchemy import select, func, type_coerce, String
+
+from config import settings
+from services.executor import executor_service
+from services.image_pipeline import image_pipeline
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_IMAGE = "media/images/placeholder.png"
+
+
+def absolute_image_urls(image_paths) -> List[str]:
+    """Перетворити відносні шляхи зображень на повні URL (або placeholder)"""
+    base_url = settings.APP_URL.rstrip('/')
+    full_image_paths = []
+    if image_paths and isinstance(image_paths, list):
+        for path in image_paths:
+            if path and not path.startswith(('http://', 'https://')):
+                full_image_paths.append(f"{base_url}/{path}")
+            elif path:
+                full_image_paths.append(path)
+    return full_image_paths or [f"{base_url}/{PLACEHOLDER_IMAGE}"]
+
+
+@dataclass(frozen=True)
+class CatalogArchive:
+    """Незмінний запис архіву в знімку каталогу"""
+    id: int
+    code: str
+    title: Mapping[str, str]
+    description: Mapping[str, str]
+    price: float
+    discount_percent: int
+    archive_type: str
+    image_paths: Tuple[str, ...]
+    image_variants: Tuple[Optional[dict], ...]  # srcset-варіанти для кожного з image_paths
+    image_placeholders: Tuple[Optional[str], ...]  # LQIP data URI для кожного з image_paths
+    average_rating: float
+    ratings_count: int
+    created_at: Any
+    created_at_raw: str  # Сире значення з SQLite - ключ сортування/курсора, як і в SQL запиті
+
+    def sort_key(self, sort_by: str):
+        """Ключ сортування, ідентичний виразам ORDER BY в api/archives.py"""
+        if sort_by == "price":
+            return self.price
+        if sort_by == "title":
+            return self.title.get('ua') or ''
+        if sort_by == "created_at":
+            return self.created_at_raw
+        if sort_by == "rating":
+            return self.average_rating
+        return self.id
+
+
+SORT_FIELDS = ("price", "title", "created_at", "rating", "id")
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """
+    Незмінний знімок каталогу.
+
+    archives - архіви за id; views - кортежі архівів, відсортовані за (ключ, id)
+    за зростанням для кожного поля з SORT_FIELDS.
+    """
+    version: int
+    archives: Mapping[int, CatalogArchive]
+    views: Mapping[str, Tuple[CatalogArchive, ...]]
+    view_keys: Mapping[str, Tuple[tuple, ...]]
+    stamp: tuple
+    built_at: float = field(default_factory=time.time)
+
+    def get(self, archive_id: int) -> Optional[CatalogArchive]:
+        return self.archives.get(archive_id)
+
+    def page(
+            self,
+            sort_by: str,
+            sort_order: str,
+            limit: int,
+            after: Optional[tuple] = None,
+            offset: int = 0,
+            predicate=None
+    ) -> Tuple[List[CatalogArchive], bool]:
+        """
+        Повернути сторінку відсортованого представлення.
+
+        after - позиція (ключ, id) з курсора, з якої продовжувати (не включно).
+        Повертає (елементи, чи є ще елементи).
+        """
+        view = self.views[sort_by]
+        keys = self.view_keys[sort_by]
+        descending = sort_order == "desc"
+
+        if descending:
+            end = bisect.bisect_left(keys, after) if after is not None else len(view)
+            candidates = (view[i] for i in range(end - 1, -1, -1))
+        else:
+            start = bisect.bisect_right(keys, after) if after is not None else 0
+            candidates = (view[i] for i in range(start, len(view)))
+
+        items = []
+        skipped = 0
+        for archive in candidates:
+            if predicate is not None and not predicate(archive):
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            items.append(archive)
+            if len(items) > limit:
+                return items[:limit], True
+        return items, False
+
+
+class CatalogService:
+    """
+    Знімок каталогу в пам'яті процесу.
+
+    Знімок перебудовується атомарно (заміною посилання) після змін архівів через
+    адмінку/маркетплейс, а також коли інший воркер змінив каталог - це перевіряється
+    дешевим запитом не частіше ніж раз на CATALOG_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self._lock = asyncio.Lock()
+        self._last_check = 0.0
+
+    @staticmethod
+    def _stamp_query():
+        from models.archive import Archive
+        return select(func.count(Archive.id), func.max(Archive.updated_at), func.sum(Archive.id))
+
+    async def rebuild(self) -> CatalogSnapshot:
+        """Завантажити всі архіви та атомарно замінити знімок"""
+        from database import async_session
+        from models.archive import Archive
+
+        async with self._lock:
+            async with async_session() as session:
+                stamp = tuple((await session.execute(self._stamp_query())).one())
+                result = await session.execute(
+                    select(Archive, type_coerce(Archive.created_at, String).label("created_at_raw"))
+                )
+                rows = result.all()
+
+            image_variants = await executor_service.run_io(
+                lambda: {archive.id: tuple(image_pipeline.srcsets(archive.image_paths)) for archive, _ in rows}
+            )
+
+            archives = {}
+            for archive, created_at_raw in rows:
+                archives[archive.id] = CatalogArchive(
+                    id=archive.id,
+                    code=archive.code,
+                    title=MappingProxyType(dict(archive.title or {})),
+                    description=MappingProxyType(dict(archive.description or {})),
+                    price=float(archive.price or 0),
+                    discount_percent=archive.discount_percent or 0,
+                    archive_type=archive.archive_type,
+                    image_paths=tuple(absolute_image_urls(archive.image_paths)),
+                    image_variants=image_variants[archive.id],
+                    image_placeholders=tuple(archive.image_placeholders or ()),
+                    average_rating=float(archive.average_rating or 0),
+                    ratings_count=archive.ratings_count or 0,
+                    created_at=archive.created_at,
+                    created_at_raw=created_at_raw or ''
+                )
+
+            views = {}
+            view_keys = {}
+            for sort_by in SORT_FIELDS:
+                ordered = sorted(archives.values(), key=lambda a: (a.sort_key(sort_by), a.id))
+                views[sort_by] = tuple(ordered)
+                view_keys[sort_by] = tuple((a.sort_key(sort_by), a.id) for a in ordered)
+
+            # Серіалізація та хешування всього каталогу - поза event loop
+            version = await executor_service.run_io(self._compute_version, list(archives.values()))
+
+            snapshot = CatalogSnapshot(
+                version=version,
+                archives=MappingProxyType(archives),
+                views=MappingProxyType(views),
+                view_keys=MappingProxyType(view_keys),
+                stamp=stamp
+            )
+            self.snapshot = snapshot
+            self._last_check = time.monotonic()
+
+        logger.info(f"Catalog snapshot rebuilt: {len(archives)} archives, version {snapshot.version}")
+        return snapshot
+
+    @staticmethod
+    def _archive_digest(archive: CatalogArchive) -> int:
+        digest = hashlib.sha1(json.dumps([
+            archive.id, archive.code, dict(archive.title), dict(archive.description),
+            archive.price, archive.discount_percent, archive.archive_type,
+            list(archive.image_paths), list(archive.image_variants),
+            list(archive.image_placeholders), archive.average_rating, archive.ratings_count,
+            archive.created_at_raw
+        ], ensure_ascii=False, default=str).encode())
+        return int(digest.hexdigest()[:12], 16)
+
+    @classmethod
+    def _compute_version(cls, archives) -> int:
+        """
+        Версія залежить лише від вмісту, тому однакова на всіх воркерах.
+        XOR хешів архівів: зміну одного архіву можна врахувати без перерахунку всіх.
+        """
+        version = 0
+        for archive in archives:
+            version ^= cls._archive_digest(archive)
+        return version
+
+    async def get(self) -> CatalogSnapshot:
+        """Поточний знімок (з ледачою перевіркою змін з інших воркерів)"""
+        if self.snapshot is None:
+            return await self.rebuild()
+
+        if time.monotonic() - self._last_check >= settings.CATALOG_REFRESH_SECONDS:
+            self._last_check = time.monotonic()
+            try:
+                from database import async_session
+                async with async_session() as session:
+                    stamp = tuple((await session.execute(self._stamp_query())).one())
+                if stamp != self.snapshot.stamp:
+                    return await self.rebuild()
+            except Exception as e:
+                logger.error(f"Catalog freshness check failed: {e}")
+
+        return self.snapshot
+
+    async def update_rating(self, archive_id: int, average_rating: float, ratings_count: int):
+        """
+        Оновити рейтинг одного архіву в знімку без перебудови (викликати після commit).
+
+        Інші воркери отримають зміну через перевірку штампа (updated_at архіву змінився),
+        не частіше ніж раз на CATALOG_REFRESH_SECONDS. Свій штамп просуваємо лише якщо
+        крім цього архіву в каталозі нічого не змінилось - інакше при наступній
+        перевірці буде повна перебудова.
+        """
+        from database import async_session
+        from models.archive import Archive
+
+        async with self._lock:
+            snapshot = self.snapshot
+            old = snapshot.get(archive_id) if snapshot else None
+            if old is None:
+                return
+
+            async with async_session() as session:
+                row = (await session.execute(select(
+                    *self._stamp_query().selected_columns,
+                    func.max(Archive.updated_at).filter(Archive.id != archive_id)
+                ))).one()
+            stamp, others_updated_at = tuple(row[:3]), row[3]
+            count, max_updated_at, id_sum = snapshot.stamp
+            unchanged_elsewhere = (
+                stamp[0] == count and stamp[2] == id_sum
+                and (others_updated_at is None or max_updated_at is None or others_updated_at <= max_updated_at)
+            )
+
+            new = replace(old, average_rating=float(average_rating or 0), ratings_count=ratings_count or 0)
+            archives = dict(snapshot.archives)
+            archives[archive_id] = new
+
+            views = {}
+            view_keys = {}
+            for sort_by in SORT_FIELDS:
+                view = list(snapshot.views[sort_by])
+                keys = list(snapshot.view_keys[sort_by])
+                index = bisect.bisect_left(keys, (old.sort_key(sort_by), old.id))
+                del view[index], keys[index]
+                # Для всіх полів, крім rating, позиція не змінюється
+                key = (new.sort_key(sort_by), new.id)
+                index = bisect.bisect_left(keys, key)
+                view.insert(index, new)
+                keys.insert(index, key)
+                views[sort_by] = tuple(view)
+                view_keys[sort_by] = tuple(keys)
+
+            self.snapshot = CatalogSnapshot(
+                version=snapshot.version ^ self._archive_digest(old) ^ self._archive_digest(new),
+                archives=MappingProxyType(archives),
+                views=MappingProxyType(views),
+                view_keys=MappingProxyType(view_keys),
+                stamp=stamp if unchanged_elsewhere else snapshot.stamp,
+                built_at=snapshot.built_at
+            )
+
+    async def invalidate(self):
+        """Перебудувати знімок після зміни архівів (викликати після commit)"""
+        try:
+            await self.rebuild()
+        except Exception as e:
+            # Не ламаємо запит адміна - знімок оновиться при наступній перевірці
+            logger.error(f"Failed to rebuild catalog snapshot: {e}")
+            self._last_check = 0.0
+
+
+# Створюємо глобальний екземпляр
+catalog_service = CatalogService()
@@ -0,0 +1,172 @@
+# backend/services/counters.py
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+from sqlalchemy import update, bindparam, func
+
+from config import settings
+from models.archive import Archive
+from models.marketplace import MarketplaceProduct
+
+logger = logging.getLogger(__name__)
+
+# Лічильник -> (колонка, колонка за якою шукається рядок)
+COUNTERS = {
+    "archive.view_count": (Archive.view_count, Archive.id),
+    "archive.purchase_count": (Archive.purchase_count, Archive.id),
+    # Товар маркетплейсу рахується за archive_id - без окремого запиту за id товару
+    "product.view_count": (MarketplaceProduct.view_count, MarketplaceProduct.archive_id),
+}
+
+
+class _CounterMetrics:
+    """Метрики одного лічильника"""
+
+    def __init__(self):
+        self.increments = 0
+        self.flushed = 0
+        self.statements = 0
+        self.failed = 0
+
+    def as_dict(self, pending: int, pending_rows: int) -> dict:
+        return {
+            "increments": self.increments,
+            "flushed": self.flushed,
+            "pending": pending,
+            "pending_rows": pending_rows,
+            "statements": self.statements,
+            "failed": self.failed
+        }
+
+
+class CounterService:
+    """
+    Лічильники переглядів/завантажень/кліків з відкладеним записом.
+
+    increment лише додає до суми в пам'яті процесу; раз на COUNTER_FLUSH_INTERVAL_SECONDS
+    накопичене пишеться одним executemany UPDATE ... SET x = x + ? на лічильник.
+    Запити більше не тримають блокування запису SQLite заради +1, а кілька воркерів
+    не конфліктують, бо кожен додає лише свою дельту. Ціна - при падінні процесу
+    втрачаються інкременти за останній інтервал (при звичайній зупинці все записується).
+    """
+
+    def __init__(self):
+        self.flush_interval = settings.COUNTER_FLUSH_INTERVAL_SECONDS
+        self._pending: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.metrics = {name: _CounterMetrics() for name in COUNTERS}
+        self._lock = asyncio.Lock()
+        self.running = False
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_at: Optional[float] = None
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    def increment(self, name: str, key: int, amount: int = 1):
+        """Додати amount до лічильника name рядка key (запишеться при наступному flush)"""
+        if name not in COUNTERS:
+            raise KeyError(f"Unknown counter {name}")
+        self._pending[name][key] += amount
+        self.metrics[name].increments += amount
+
+    def pending(self, name: str, key: int) -> int:
+        """Ще не записана в БД частина лічильника (щоб показувати актуальне значення)"""
+        counter = self._pending.get(name)
+        return counter.get(key, 0) if counter else 0
+
+    async def flush(self) -> int:
+        """Записати накопичені інкременти; повертає кількість оновлених рядків-ключів"""
+        from database import async_session
+
+        async with self._lock:
+            batch, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            batch = {name: dict(values) for name, values in batch.items() if values}
+            if not batch:
+                return 0
+
+            started = time.monotonic()
+            try:
+                async with async_session() as session:
+                    for name, values in batch.items():
+                        column, key_column = COUNTERS[name]
+                        table = column.expression.table
+                        set_values = {column.key: func.coalesce(column.expression, 0) + bindparam("counter_amount")}
+                        # Лічильник - не зміна самого рядка: колонки з onupdate (updated_at)
+                        # лишаються як є, інакше кожен flush "оновлював" би архіви
+                        set_values.update({
+                            col.key: col for col in table.c
+                            if col.onupdate is not None and col.key != column.key
+                        })
+                        stmt = (
+                            update(table)
+                            .where(key_column.expression == bindparam("counter_key"))
+                            .values(set_values)
+                        )
+                        await session.execute(
+                            stmt,
+                            [{"counter_key": key, "counter_amount": amount} for key, amount in values.items()]
+                        )
+                    await session.commit()
+            except Exception as e:
+                # Повертаємо дельти назад - спробуємо при наступному flush
+                self._merge(batch)
+                self.failed_flushes += 1
+                for name in batch:
+                    self.metrics[name].failed += 1
+                logger.error(f"Counter flush failed: {e}")
+                return 0
+
+            elapsed = time.monotonic() - started
+            self.flushes += 1
+            self.last_flush_at = time.time()
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            for name, values in batch.items():
+                self.metrics[name].flushed += sum(values.values())
+                self.metrics[name].statements += 1
+            return sum(len(values) for values in batch.values())
+
+    def _merge(self, batch: Dict[str, Dict[int, int]]):
+        for name, values in batch.items():
+            for key, amount in values.items():
+                self._pending[name][key] += amount
+
+    async def start(self):
+        """Фоновий цикл запису (запускається в lifespan кожного воркера)"""
+        self.running = True
+        logger.info(f"Counter flusher started, interval {self.flush_interval}s")
+        while self.running:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def stop(self):
+        """Зупинити цикл і записати залишок"""
+        self.running = False
+        await self.flush()
+        logger.info("Counter flusher stopped")
+
+    def stats(self) -> dict:
+        return {
+            "flush_interval_seconds": self.flush_interval,
+            # Скільки секунд інкрементів може загубитись при аварійному завершенні процесу
+            "crash_loss_window_seconds": round(self.flush_interval + self.max_flush_seconds, 3),
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_at": self.last_flush_at,
+            "last_flush_seconds": round(self.last_flush_seconds, 4),
+            "max_flush_seconds": round(self.max_flush_seconds, 4),
+            "counters": {
+                name: metrics.as_dict(
+                    sum(self._pending.get(name, {}).values()),
+                    len(self._pending.get(name, {}))
+                )
+                for name, metrics in self.metrics.items()
+            }
+        }
+
+
+# Створюємо глобальний екземпляр
+counter_service = CounterService()
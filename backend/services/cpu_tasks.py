@@ -0,0 +1,212 @@
+# backend/services/cpu_tasks.py
+"""
+CPU-важкі задачі для пулу процесів (executor_service.run_cpu).
+
+Модуль імпортується у воркерах пулу, тому не тягне за собою конфіг, БД чи FastAPI -
+лише стандартну бібліотеку, PIL та services/revit_preview.py. Аргументи та результати
+мають бути pickle-сумісні.
+"""
+import base64
+import hashlib
+import io
+import os
+import secrets
+import zipfile
+from pathlib import Path
+
+from PIL import Image, ImageOps, features
+
+from services.revit_preview import extract_revit_preview
+
+# Параметри кодування похідних зображень
+IMAGE_FORMATS = {
+    "jpeg": {"ext": "jpg", "format": "JPEG", "options": {"quality": 85, "optimize": True, "progressive": True}},
+    "webp": {"ext": "webp", "format": "WEBP", "options": {"quality": 80, "method": 4}},
+    "avif": {"ext": "avif", "format": "AVIF", "options": {"quality": 55, "speed": 8}},
+}
+
+# Розмір LQIP-заглушки (найбільша сторона, px) - браузер розтягує її з розмиттям
+PLACEHOLDER_SIZE = 16
+
+
+def available_image_formats() -> list:
+    """Формати, які вміє кодувати поточна збірка Pillow"""
+    return [name for name in IMAGE_FORMATS if name == "jpeg" or features.check(name)]
+
+
+def build_zip(folder_path: Path, zip_path: Path):
+    """Зібрати ZIP з папки у тимчасовий файл і атомарно перейменувати"""
+    tmp_path = zip_path.with_name(f".{zip_path.name}.{secrets.token_hex(4)}.tmp")
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for root, dirs, files in os.walk(folder_path):
+                for file in files:
+                    file_path = Path(root) / file
+                    arcname = file_path.relative_to(folder_path.parent)
+                    zipf.write(file_path, arcname)
+        os.replace(tmp_path, zip_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def build_placeholder(img: Image.Image, formats: list) -> str:
+    """
+    Крихітне превʼю (LQIP) як data URI - показується замість зображення, поки те завантажується.
+    WebP дає ~100 байт, JPEG (якщо WebP недоступний) - близько 0.7 КБ через заголовки.
+    """
+    tiny = img.copy()
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BOX)
+    format_name = "webp" if "webp" in formats else "jpeg"
+    if format_name == "jpeg" and tiny.mode != 'RGB':
+        tiny = tiny.convert('RGB')
+
+    buffer = io.BytesIO()
+    tiny.save(buffer, IMAGE_FORMATS[format_name]["format"], quality=30)
+    return f"data:image/{format_name};base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def hash_archive_files(source_path: Path) -> dict:
+    """
+    Маніфест вмісту архіву: {шлях: [sha256, розмір]} для кожного файлу.
+
+    Шляхи - як у ZIP для користувача (для папки - разом з назвою папки).
+    """
+    manifest = {}
+    if source_path.is_dir():
+        for root, dirs, files in os.walk(source_path):
+            for file in files:
+                file_path = Path(root) / file
+                digest = hashlib.sha256()
+                with open(file_path, 'rb') as src:
+                    while chunk := src.read(1024 * 1024):
+                        digest.update(chunk)
+                manifest[file_path.relative_to(source_path.parent).as_posix()] = [
+                    digest.hexdigest(), file_path.stat().st_size
+                ]
+    elif zipfile.is_zipfile(source_path):
+        with zipfile.ZipFile(source_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                digest = hashlib.sha256()
+                with archive.open(info) as src:
+                    while chunk := src.read(1024 * 1024):
+                        digest.update(chunk)
+                manifest[info.filename] = [digest.hexdigest(), info.file_size]
+    else:
+        raise ValueError(f"Unsupported archive format: {source_path.suffix}")
+    return manifest
+
+
+def build_image_derivatives(image_path: Path, image_dir: Path, sizes: dict, formats: list) -> dict:
+    """
+    Створити похідні зображення для всіх розмірів та форматів.
+
+    Розміри обробляються від більшого до меншого, і кожен наступний
+    зменшується з попереднього - так дешевше, ніж щоразу з оригіналу.
+    Повертає маніфест: розміри оригіналу, LQIP-заглушку та список варіантів з їх розмірами у байтах.
+    """
+    variants = []
+
+    with Image.open(image_path) as img:
+        img = ImageOps.exif_transpose(img)
+        original = {"width": img.width, "height": img.height, "bytes": image_path.stat().st_size}
+
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+
+        current = img
+        for size_name, dimensions in sorted(sizes.items(), key=lambda item: -item[1][0] * item[1][1]):
+            current = current.copy()
+            current.thumbnail(dimensions, Image.Resampling.LANCZOS)
+
+            size_dir = image_dir / size_name
+            size_dir.mkdir(parents=True, exist_ok=True)
+
+            for format_name in formats:
+                spec = IMAGE_FORMATS[format_name]
+                output_path = size_dir / f"{image_path.stem}.{spec['ext']}"
+                frame = current.convert('RGB') if format_name == "jpeg" and current.mode != 'RGB' else current
+                frame.save(output_path, spec["format"], **spec["options"])
+
+                variants.append({
+                    "size": size_name,
+                    "format": format_name,
+                    "path": output_path.as_posix(),
+                    "width": current.width,
+                    "height": current.height,
+                    "bytes": output_path.stat().st_size
+                })
+
+        placeholder = build_placeholder(current, formats)
+
+    return {"original": original, "placeholder": placeholder, "variants": variants}
+
+
+def render_image_variant(source_path: Path, output_path: Path, width: int, height: int, format_name: str):
+    """
+    Зменшити зображення, щоб воно вміщалось у width x height (0 - без обмеження),
+    та зберегти у вказаному форматі (через тимчасовий файл з атомарним перейменуванням).
+    """
+    spec = IMAGE_FORMATS[format_name]
+    tmp_path = output_path.with_name(f".{output_path.name}.{secrets.token_hex(4)}.tmp")
+    try:
+        with Image.open(source_path) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+            if format_name == "jpeg" and img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            img.thumbnail((width or img.width, height or img.height), Image.Resampling.LANCZOS)
+            img.save(tmp_path, spec["format"], **spec["options"])
+        os.replace(tmp_path, output_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def extract_family_previews(source_path: Path, members: list, output_dir: Path) -> list:
+    """
+    Витягти вбудовані превʼю з сімейств Revit і зберегти їх як PNG.
+
+    source_path - ZIP (members - імена всередині), папка (members - відносні шляхи)
+    або окремий .rfa (members = [його імʼя]). Повертає записи для збережених превʼю;
+    сімейства без превʼю або з пошкодженим файлом пропускаються.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    archive = zipfile.ZipFile(source_path) if zipfile.is_zipfile(source_path) else None
+    results = []
+    try:
+        for member in members:
+            try:
+                if archive is not None:
+                    data = archive.read(member)
+                elif source_path.is_dir():
+                    data = (source_path / member).read_bytes()
+                else:
+                    data = source_path.read_bytes()
+
+                png = extract_revit_preview(data)
+                if not png:
+                    continue
+                with Image.open(io.BytesIO(png)) as img:
+                    width, height = img.size
+            except (OSError, zipfile.BadZipFile, Image.DecompressionBombError):
+                continue
+
+            output_path = output_dir / f"{hashlib.sha1(member.encode()).hexdigest()[:16]}.png"
+            tmp_path = output_path.with_name(f".{output_path.name}.{secrets.token_hex(4)}.tmp")
+            tmp_path.write_bytes(png)
+            os.replace(tmp_path, output_path)
+
+            results.append({
+                "family": member,
+                "path": output_path.as_posix(),
+                "width": width,
+                "height": height,
+                "bytes": len(png)
+            })
+    finally:
+        if archive is not None:
+            archive.close()
+    return results
@@ -0,0 +1,82 @@
+# backend/services/disk_cache.py
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class DiskLRUCache:
+    """
+    Каталог з похідними файлами (ZIP, варіанти зображень) з лімітом розміру.
+
+    - get_or_build: якщо файла немає - будує його один раз на процес, паралельні
+      запити того ж ключа чекають одне збирання;
+    - порядок витіснення - за atime (оновлюється при кожному влучанні, mtime не
+      змінюється, бо від нього залежать ETag).
+    """
+
+    def __init__(self, directory: Path, max_bytes: Callable[[], int], pattern: str = "*"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.pattern = pattern
+        self._builds: Dict[Path, asyncio.Future] = {}
+
+    async def get_or_build(self, path: Path, build: Callable[[], Awaitable[None]]) -> Path:
+        """Повернути path, попередньо зібравши його через build(), якщо його ще немає"""
+        if path.exists():
+            self.touch(path)
+            return path
+
+        future = self._builds.get(path)
+        if future is None:
+            future = asyncio.ensure_future(self._build(path, build))
+            self._builds[path] = future
+            future.add_done_callback(lambda _: self._builds.pop(path, None))
+
+        # shield - скасування одного запиту не зупиняє збирання для інших
+        await asyncio.shield(future)
+        return path
+
+    async def _build(self, path: Path, build: Callable[[], Awaitable[None]]):
+        from services.executor import executor_service
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        await build()
+        await executor_service.run_io(self.evict, path)
+
+    @staticmethod
+    def touch(path: Path):
+        """Оновити atime (mtime не чіпаємо)"""
+        try:
+            stats = path.stat()
+            os.utime(path, ns=(time.time_ns(), stats.st_mtime_ns))
+        except FileNotFoundError:
+            pass
+
+    def evict(self, keep: Path = None):
+        """Видалити найдавніше використані файли, поки кеш більший за ліміт"""
+        budget = self.max_bytes()
+        entries = []
+        total = 0
+        for path in self.directory.rglob(self.pattern):
+            if path.name.startswith(".") or not path.is_file():
+                continue
+            try:
+                stats = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stats.st_atime_ns, stats.st_size, path))
+            total += stats.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= budget:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            logger.info(f"Evicted cached file: {path}")
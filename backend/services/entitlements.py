@@ -0,0 +1,165 @@
+# backend/services/entitlements.py
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select, literal, union_all, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.archive import ArchivePurchase
+from models.subscription import SubscriptionArchive
+from models.order import Order, OrderItem
+from models.entitlement_version import EntitlementVersion
+from services.catalog import catalog_service, CatalogSnapshot
+from services.user_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Типи доступу до архіву
+ACCESS_FREE = "free"
+ACCESS_PURCHASED = "purchased"
+ACCESS_SUBSCRIPTION = "subscription"
+ACCESS_ORDER = "order"
+
+# Пріоритет, якщо архів доступний кількома способами
+ACCESS_PRIORITY = {ACCESS_PURCHASED: 0, ACCESS_ORDER: 1, ACCESS_SUBSCRIPTION: 2}
+
+
+class EntitlementService:
+    """
+    Єдина перевірка доступу користувача до архівів.
+
+    Набір архівів, якими володіє користувач (покупки, розблокування по підписці,
+    завершені замовлення), вибирається одним UNION ALL запитом і кешується;
+    безкоштовні архіви визначаються зі знімка каталогу без звернення до БД.
+    Транзакція, що додає/змінює покупки, розблокування або замовлення, збільшує
+    версію користувача в entitlement_versions (див. _bump_entitlement_versions).
+    Кешований набір зберігається разом з версією, з якою його прочитано, і
+    використовується, поки версія в БД та сама - тож покупка, завершена іншим
+    воркером, діє одразу, а перевірка коштує одного запиту за первинним ключем.
+    """
+
+    def __init__(self):
+        self.owned = TTLCache(settings.ENTITLEMENT_CACHE_MAX_SIZE, settings.ENTITLEMENT_CACHE_TTL_SECONDS)
+
+    @staticmethod
+    def _owned_query(user_id: int):
+        purchases = select(
+            ArchivePurchase.archive_id.label("archive_id"),
+            literal(ACCESS_PURCHASED).label("access_type")
+        ).where(ArchivePurchase.user_id == user_id)
+
+        unlocked = select(
+            SubscriptionArchive.archive_id,
+            literal(ACCESS_SUBSCRIPTION)
+        ).where(SubscriptionArchive.user_id == user_id)
+
+        completed_orders = select(
+            OrderItem.archive_id,
+            literal(ACCESS_ORDER)
+        ).join(Order, Order.id == OrderItem.order_id).where(
+            Order.user_id == user_id,
+            Order.status == 'completed'
+        )
+
+        return union_all(purchases, unlocked, completed_orders)
+
+    @staticmethod
+    async def _current_version(session: AsyncSession, user_id: int) -> int:
+        version = await session.scalar(
+            select(EntitlementVersion.version).where(EntitlementVersion.user_id == user_id)
+        )
+        return version or 0
+
+    async def get_owned(self, session: AsyncSession, user_id: int) -> Dict[int, str]:
+        """Всі архіви, якими володіє користувач: {archive_id: тип доступу}"""
+        version = await self._current_version(session, user_id)
+        cached = self.owned.get(user_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        return await self._load_owned(session, user_id, version)
+
+    async def _load_owned(self, session: AsyncSession, user_id: int, version: int) -> Dict[int, str]:
+        """Прочитати набір з БД і покласти в кеш разом з версією"""
+        result = await session.execute(self._owned_query(user_id))
+        owned: Dict[int, str] = {}
+        for archive_id, access_type in result.all():
+            current = owned.get(archive_id)
+            if current is None or ACCESS_PRIORITY[access_type] < ACCESS_PRIORITY[current]:
+                owned[archive_id] = access_type
+
+        self.owned.set(user_id, (version, owned))
+        return owned
+
+    async def get_access(
+            self,
+            session: AsyncSession,
+            user_id: int,
+            archive_ids: Iterable[int]
+    ) -> Dict[int, Optional[str]]:
+        """Тип доступу для кожного з archive_ids (None - доступу немає)"""
+        archive_ids = list(archive_ids)
+        catalog = await catalog_service.get()
+        owned = await self.get_owned(session, user_id)
+        return self._resolve(owned, catalog, archive_ids)
+
+    @staticmethod
+    def _resolve(owned: Dict[int, str], catalog: CatalogSnapshot, archive_ids: List[int]) -> Dict[int, Optional[str]]:
+        access = {}
+        for archive_id in archive_ids:
+            access_type = owned.get(archive_id)
+            if access_type is None:
+                archive = catalog.get(archive_id)
+                if archive and archive.archive_type == 'free':
+                    access_type = ACCESS_FREE
+            access[archive_id] = access_type
+        return access
+
+    async def has_access(self, session: AsyncSession, user_id: int, archive_id: int) -> bool:
+        access = await self.get_access(session, user_id, [archive_id])
+        return access[archive_id] is not None
+
+    def invalidate(self, user_id: int):
+        self.owned.pop(user_id)
+
+    def stats(self) -> dict:
+        return self.owned.stats()
+
+
+# Створюємо глобальний екземпляр
+entitlement_service = EntitlementService()
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_entitlement_versions(session, flush_context):
+    """Збільшити версію користувачів, чиї покупки/розблокування/замовлення змінюються"""
+    user_ids = {
+        obj.user_id
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, (ArchivePurchase, SubscriptionArchive, Order)) and obj.user_id is not None
+    }
+    if not user_ids:
+        return
+
+    # Через connection, а не session.execute - сесія вже всередині flush
+    connection = session.connection()
+    for user_id in user_ids:
+        stmt = sqlite_insert(EntitlementVersion).values(user_id=user_id, version=1)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={"version": EntitlementVersion.version + 1}
+        ))
+    session.info.setdefault("changed_entitlement_user_ids", set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_entitlements(session):
+    for user_id in session.info.pop("changed_entitlement_user_ids", ()):
+        entitlement_service.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_entitlements(session):
+    session.info.pop("changed_entitlement_user_ids", None)
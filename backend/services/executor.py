@@ -0,0 +1,159 @@
+# backend/services/executor.py
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _PoolMetrics:
+    """Лічильники одного пулу"""
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def as_dict(self, workers: int, capacity: int) -> dict:
+        finished = self.completed + self.failed + self.timeouts
+        return {
+            "workers": workers,
+            "capacity": capacity,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "avg_seconds": round(self.total_seconds / finished, 4) if finished else 0.0,
+            "max_seconds": round(self.max_seconds, 4)
+        }
+
+
+class ExecutorService:
+    """
+    Виконання блокуючої роботи поза event loop.
+
+    run_io - пул потоків для дискових операцій (stat, читання ZIP, видалення файлів);
+    run_cpu - пул процесів для важкої роботи (PIL, стиснення ZIP). Функції для
+    run_cpu мають бути імпортовними з модуля (див. services/cpu_tasks.py).
+
+    Черга кожного пулу обмежена: якщо одночасно задач більше ніж
+    workers + EXECUTOR_QUEUE_SIZE, нова задача відхиляється з 503.
+    """
+
+    def __init__(self):
+        self.io_workers = settings.IO_EXECUTOR_WORKERS
+        self.cpu_workers = settings.CPU_EXECUTOR_WORKERS
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._cpu_pool: Optional[ProcessPoolExecutor] = None
+        self._capacity = {
+            "io": self.io_workers + settings.EXECUTOR_QUEUE_SIZE,
+            "cpu": self.cpu_workers + settings.EXECUTOR_QUEUE_SIZE
+        }
+        self.metrics = {"io": _PoolMetrics(), "cpu": _PoolMetrics()}
+
+    @property
+    def io_pool(self) -> ThreadPoolExecutor:
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="io")
+        return self._io_pool
+
+    @property
+    def cpu_pool(self) -> ProcessPoolExecutor:
+        if self._cpu_pool is None:
+            # spawn - воркер не успадковує потоки та з'єднання батьківського процесу
+            self._cpu_pool = ProcessPoolExecutor(
+                max_workers=self.cpu_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._cpu_pool
+
+    async def run_io(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Виконати блокуючу I/O функцію в пулі потоків"""
+        return await self._run("io", self.io_pool, func, args, kwargs, timeout)
+
+    async def run_cpu(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Виконати CPU-важку функцію в пулі процесів"""
+        return await self._run("cpu", self.cpu_pool, func, args, kwargs, timeout)
+
+    async def _run(self, kind: str, pool, func: Callable, args: tuple, kwargs: dict, timeout: Optional[float]):
+        metrics = self.metrics[kind]
+        if metrics.in_flight >= self._capacity[kind]:
+            metrics.rejected += 1
+            logger.warning(f"{kind} executor queue is full, rejecting {getattr(func, '__name__', func)}")
+            raise HTTPException(status_code=503, detail="Server is busy, please retry later")
+
+        timeout = settings.EXECUTOR_TIMEOUT_SECONDS if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs) if kwargs else functools.partial(func, *args)
+
+        future = pool.submit(call)
+        metrics.submitted += 1
+        metrics.in_flight += 1
+        # Місце в черзі звільняється, коли задача справді завершилась у пулі, а не
+        # коли запит перестав чекати - інакше таймаути обходили б обмеження черги
+        future.add_done_callback(functools.partial(self._release, loop, metrics))
+
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            # Сама задача в пулі доробить до кінця (і займатиме місце), але запит не чекає
+            metrics.timeouts += 1
+            logger.error(f"{kind} task {getattr(func, '__name__', func)} timed out after {timeout}s")
+            raise HTTPException(status_code=504, detail="Operation timed out")
+        except Exception:
+            metrics.failed += 1
+            raise
+        else:
+            metrics.completed += 1
+            return result
+        finally:
+            elapsed = time.monotonic() - started
+            metrics.total_seconds += elapsed
+            metrics.max_seconds = max(metrics.max_seconds, elapsed)
+
+    @staticmethod
+    def _release(loop: asyncio.AbstractEventLoop, metrics: _PoolMetrics, future):
+        """done-callback задачі (викликається з потоку пулу) - зменшити in_flight в event loop"""
+        def release():
+            metrics.in_flight -= 1
+
+        try:
+            loop.call_soon_threadsafe(release)
+        except RuntimeError:
+            # Event loop вже закритий (завершення додатку)
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "io": self.metrics["io"].as_dict(self.io_workers, self._capacity["io"]),
+            "cpu": self.metrics["cpu"].as_dict(self.cpu_workers, self._capacity["cpu"])
+        }
+
+    def shutdown(self):
+        """Зупинити пули (при завершенні додатку)"""
+        if self._io_pool is not None:
+            self._io_pool.shutdown(wait=False, cancel_futures=True)
+            self._io_pool = None
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown(wait=False, cancel_futures=True)
+            self._cpu_pool = None
+
+
+# Створюємо глобальний екземпляр
+executor_service = ExecutorService()
@@ -0,0 +1,183 @@
+# backend/services/family_thumbnails.py
+import asyncio
+import json
+import logging
+import os
+import re
+import zipfile
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from services.cpu_tasks import extract_family_previews
+from services.executor import executor_service
+from services.file_service import file_service
+from services.user_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+FAMILY_DIR = settings.MEDIA_DIR / "families"
+FAMILY_EXTENSIONS = ('.rfa',)
+# Скільки сімейств обробляє одна задача пулу процесів
+FAMILY_BATCH_SIZE = 25
+
+
+class FamilyThumbnailService:
+    """
+    Превʼю сімейств Revit, вбудовані в самі .rfa файли архіву.
+
+    Архів (ZIP, папка або окремий .rfa) розбивається на пачки по FAMILY_BATCH_SIZE
+    сімейств, пачки обробляються паралельно в пулі процесів. Результат - PNG в
+    media/families/{code}/ та маніфест media/families/{code}/manifest.json, привʼязаний
+    до архіву за кодом (тому працює і до створення запису Archive при завантаженні).
+    """
+
+    def __init__(self):
+        self._manifests = TTLCache(max_size=2000, ttl=300)
+
+    @staticmethod
+    def _archive_dir(archive_code: str) -> Path:
+        return FAMILY_DIR / re.sub(r"[^\w.-]", "_", archive_code)
+
+    @staticmethod
+    def list_families(source_path: Path) -> List[str]:
+        """Сімейства в джерелі: імена в ZIP, відносні шляхи в папці або сам .rfa"""
+        if source_path.is_dir():
+            return sorted(
+                path.relative_to(source_path).as_posix()
+                for path in source_path.rglob("*")
+                if path.suffix.lower() in FAMILY_EXTENSIONS and path.is_file()
+            )
+        if source_path.suffix.lower() in FAMILY_EXTENSIONS:
+            return [source_path.name]
+        if zipfile.is_zipfile(source_path):
+            with zipfile.ZipFile(source_path) as archive:
+                return sorted(
+                    info.filename for info in archive.infolist()
+                    if not info.is_dir() and Path(info.filename).suffix.lower() in FAMILY_EXTENSIONS
+                )
+        return []
+
+    async def extract(self, archive_code: str, source_path: Path) -> dict:
+        """Витягти превʼю всіх сімейств архіву та записати маніфест"""
+        families = await executor_service.run_io(self.list_families, source_path)
+        output_dir = self._archive_dir(archive_code)
+
+        batches = [
+            families[start:start + FAMILY_BATCH_SIZE]
+            for start in range(0, len(families), FAMILY_BATCH_SIZE)
+        ]
+        results = await asyncio.gather(*(
+            executor_service.run_cpu(extract_family_previews, source_path, batch, output_dir)
+            for batch in batches
+        ))
+
+        thumbnails = []
+        for batch_result in results:
+            for item in batch_result:
+                item["path"] = Path(item["path"]).resolve().relative_to(settings.BASE_DIR).as_posix()
+                thumbnails.append(item)
+
+        manifest = {
+            "code": archive_code,
+            "families_count": len(families),
+            "thumbnails": thumbnails
+        }
+        await executor_service.run_io(self._write_manifest, output_dir / "manifest.json", manifest)
+        await executor_service.run_io(
+            self._remove_stale, output_dir, {Path(item["path"]).name for item in thumbnails}
+        )
+        self._manifests.set(archive_code, manifest)
+
+        logger.info(
+            f"Extracted {len(thumbnails)}/{len(families)} family previews for archive {archive_code}"
+        )
+        return manifest
+
+    async def extract_safe(self, archive_code: str, source_path: Path):
+        """extract для фонових задач: помилка лише логується"""
+        try:
+            await self.extract(archive_code, source_path)
+        except Exception as e:
+            logger.error(f"Family preview extraction failed for {archive_code}: {e}")
+
+    @staticmethod
+    def _write_manifest(manifest_path: Path, manifest: dict):
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, manifest_path)
+
+    @staticmethod
+    def _remove_stale(output_dir: Path, keep: set):
+        """Видалити превʼю сімейств, яких вже немає в архіві"""
+        for path in output_dir.glob("*.png"):
+            if path.name not in keep:
+                path.unlink(missing_ok=True)
+
+    def load_manifest(self, archive_code: str) -> Optional[dict]:
+        """Маніфест превʼю архіву (з кешу або з диску); None якщо ще не витягувались"""
+        manifest = self._manifests.get(archive_code)
+        if manifest is not None:
+            return manifest or None
+
+        try:
+            manifest_path = self._archive_dir(archive_code) / "manifest.json"
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            manifest = {}
+        self._manifests.set(archive_code, manifest)
+        return manifest or None
+
+    def thumbnails(self, archive_code: str) -> List[dict]:
+        """Превʼю сімейств для API: назва сімейства, URL та розміри"""
+        manifest = self.load_manifest(archive_code)
+        if not manifest:
+            return []
+
+        base_url = settings.APP_URL.rstrip('/')
+        return [
+            {
+                "family": item["family"],
+                "name": Path(item["family"]).stem,
+                "image": f"{base_url}/{item['path']}",
+                "width": item["width"],
+                "height": item["height"]
+            }
+            for item in manifest["thumbnails"]
+        ]
+
+    async def backfill(self, session: AsyncSession, force: bool = False) -> dict:
+        """Витягти превʼю для всіх архівів, у яких їх ще немає (force - для всіх)"""
+        from models.archive import Archive
+
+        result = await session.execute(select(Archive.code, Archive.archive_type, Archive.file_path))
+        processed = skipped = failed = 0
+
+        for archive_code, archive_type, stored_path in result.all():
+            if not force and self.load_manifest(archive_code) is not None:
+                skipped += 1
+                continue
+
+            source_path = await executor_service.run_io(
+                file_service.get_archive_source, archive_code, archive_type, stored_path
+            )
+            if source_path is None:
+                skipped += 1
+                continue
+
+            try:
+                await self.extract(archive_code, source_path)
+                processed += 1
+            except Exception as e:
+                failed += 1
+                logger.error(f"Family preview backfill failed for {archive_code}: {e}")
+
+        return {"processed": processed, "skipped": skipped, "failed": failed}
+
+
+# Створюємо глобальний екземпляр
+family_thumbnail_service = FamilyThumbnailService()
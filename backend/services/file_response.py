@@ -0,0 +1,252 @@
+# backend/services/file_response.py
+import asyncio
+import os
+from email.utils import formatdate
+from pathlib import Path
+from typing import Awaitable, Callable, Optional, Tuple
+from urllib.parse import quote
+
+import aiofiles
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from config import settings
+
+CHUNK_SIZE = 64 * 1024
+
+# Режими віддачі файлів (settings.FILE_DELIVERY_MODE)
+DELIVERY_APP = "app"
+DELIVERY_X_ACCEL = "x-accel"
+DELIVERY_X_SENDFILE = "x-sendfile"
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """Сильний ETag з розміру та mtime файлу"""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Розібрати заголовок Range для одного діапазону байтів.
+
+    Повертає (start, end) включно, None якщо Range відсутній або не підтримується
+    (кілька діапазонів, інші одиниці) - тоді віддається весь файл.
+    Кидає ValueError, якщо діапазон неможливо задовольнити.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+
+    start_str, sep, end_str = spec.partition("-")
+    if not sep:
+        return None
+
+    try:
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else size - 1
+        else:
+            # bytes=-N - останні N байт
+            suffix = int(end_str)
+            if suffix <= 0:
+                raise ValueError("Empty suffix range")
+            start = max(size - suffix, 0)
+            end = size - 1
+    except ValueError:
+        raise ValueError(f"Invalid range: {range_header}")
+
+    if start < 0 or start >= size or end < start:
+        raise ValueError(f"Unsatisfiable range: {range_header}")
+
+    return start, min(end, size - 1)
+
+
+def requested_range(request: Request, file_path: Path) -> Optional[Tuple[int, int]]:
+    """
+    Діапазон, який буде віддано на цей запит (з урахуванням If-Range),
+    або None для повної відповіді. Кидає ValueError для 416.
+    """
+    stat = file_path.stat()
+    if_range = request.headers.get("if-range")
+    if if_range and if_range not in (file_etag(stat), formatdate(stat.st_mtime, usegmt=True)):
+        # Файл змінився з моменту першої частини - віддаємо заново повністю
+        return None
+    return parse_range(request.headers.get("range"), stat.st_size)
+
+
+class SendfileResponse(Response):
+    """
+    Відповідь з діапазоном байтів файлу.
+
+    Якщо ASGI сервер підтримує розширення http.response.zerocopy, файл віддається
+    через sendfile без читання в Python; інакше - читається частинами.
+
+    on_finish (якщо задано) викликається після відповіді з кількістю байтів, що
+    Для zerocopy діапазон вважається відданим повністю.
+    Для zerocopy відомо лише "все або нічого".
+    """
+
+    def __init__(
+            self,
+            file_path: Path,
+            start: int,
+            end: int,
+            status_code: int = 200,
+            headers: Optional[dict] = None,
+            media_type: str = "application/octet-stream",
+            on_finish: Optional[Callable[[int], Awaitable[None]]] = None
+    ):
+        self.file_path = file_path
+        self.start = start
+        self.count = end - start + 1
+        self.on_finish = on_finish
+        # Байти тіла, що вже пішли клієнту (рахуємо і тоді, коли send впав посеред віддачі)
+        self.sent = 0
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self._send_file(scope, receive, send)
+        finally:
+            if self.on_finish is not None:
+                await self.on_finish(self.sent)
+
+    async def _send_file(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Віддати діапазон, рахуючи надіслані байти тіла в self.sent"""
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers
+        })
+
+        if scope.get("method") == "HEAD" or self.count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopy" in scope.get("extensions", {}):
+            # Скільки дійшло при розриві, невідомо - вважаємо, що все
+            self.sent = self.count
+            with open(self.file_path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": f,
+                    "offset": self.start,
+                    "count": self.count,
+                    "more_body": False
+                })
+            return
+
+        # Сервер може мовчки ігнорувати send після розриву - слухаємо disconnect самі
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            async with aiofiles.open(self.file_path, "rb") as f:
+                await f.seek(self.start)
+                remaining = self.count
+                while remaining > 0 and not disconnected.is_set():
+                    chunk = await f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                    self.sent += len(chunk)
+            if remaining > 0 and not disconnected.is_set():
+                # Файл укоротився під час віддачі - закриваємо відповідь
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            watcher.cancel()
+
+
+def offload_headers(file_path: Path) -> Optional[dict]:
+    """
+    Заголовки для передачі віддачі файлу фронтовому веб-серверу.
+
+    x-accel (nginx): файл має лежати в BASE_DIR, який змаплено на internal
+    location FILE_DELIVERY_INTERNAL_PREFIX, напр.:
+        location /protected/ { internal; alias /app/backend/; }
+    x-sendfile (Apache/lighttpd): передається абсолютний шлях.
+    Повертає None, якщо офлоад вимкнено або файл поза BASE_DIR.
+    """
+    mode = settings.FILE_DELIVERY_MODE
+    resolved = file_path.resolve()
+
+    if mode == DELIVERY_X_ACCEL:
+        try:
+            relative = resolved.relative_to(settings.BASE_DIR)
+        except ValueError:
+            return None
+        prefix = settings.FILE_DELIVERY_INTERNAL_PREFIX.rstrip("/")
+        return {"X-Accel-Redirect": f"{prefix}/{quote(relative.as_posix())}"}
+
+    if mode == DELIVERY_X_SENDFILE:
+        return {"X-Sendfile": str(resolved)}
+
+    return None
+
+
+def ranged_file_response(
+        request: Request,
+        file_path: Path,
+        filename: str,
+        media_type: str = "application/octet-stream",
+        headers: Optional[dict] = None,
+        on_finish: Optional[Callable[[int], Awaitable[None]]] = None
+) -> Response:
+    """
+    Віддати файл з підтримкою Range/If-Range.
+
+    Повна відповідь - 200, один діапазон - 206, неможливий діапазон - 416.
+    В режимах x-accel/x-sendfile сама передача делегується веб-серверу
+    (on_finish тоді не викликається - скільки байтів дійшло, невідомо).
+    """
+    stat = file_path.stat()
+    size = stat.st_size
+    base_headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": file_etag(stat),
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Content-Disposition": f"attachment; filename={filename}",
+        **(headers or {})
+    }
+
+    offload = offload_headers(file_path)
+    if offload:
+        # Range/If-Range обробляє веб-сервер
+        return Response(media_type=media_type, headers={**base_headers, **offload})
+
+    try:
+        byte_range = requested_range(request, file_path)
+    except ValueError:
+        return Response(
+            status_code=416,
+            headers={**base_headers, "Content-Range": f"bytes */{size}"}
+        )
+
+    if byte_range is None:
+        return SendfileResponse(
+            file_path, 0, size - 1, headers=base_headers, media_type=media_type, on_finish=on_finish
+        )
+
+    start, end = byte_range
+    return SendfileResponse(
+        file_path,
+        start,
+        end,
+        status_code=206,
+        media_type=media_type,
+        headers={**base_headers, "Content-Range": f"bytes {start}-{end}/{size}"},
+        on_finish=on_finish
+    )
@@ -1,23 +1,67 @@
 # backend/services/file_service.py
 import os
+import time
+import functools
+import hmac
+import base64
 import hashlib
 import secrets
 from datetime import datetime, timedelta
 from typing import Optional, Tuple
 from pathlib import Path
-import aiofiles
 import zipfile
+from sqlalchemy import select, delete, update, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from config import settings
+from models.download_token import DownloadTokenUse
+from services.cpu_tasks import build_zip
+from services.executor import executor_service
+from services.disk_cache import DiskLRUCache
 import logging
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_DOWNLOADS = 3  # Максимум завантажень по одному токену
+
+ZIP_CACHE_DIR = settings.MEDIA_DIR / "zip_cache"
+
+ARCHIVE_FILE_EXTENSIONS = ['.zip', '.rar', '.7z', '.rfa']
+
+# Файли, які вже стиснені - в ZIP кладемо без стиснення
+STORED_EXTENSIONS = {
+    '.rfa', '.rvt', '.rte', '.rft',
+    '.zip', '.rar', '.7z', '.gz',
+    '.jpg', '.jpeg', '.png', '.webp', '.avif', '.pdf'
+}
+ZIP_STREAM_CHUNK_SIZE = 256 * 1024
+
+
+class _ZipStreamBuffer:
+    """Файлоподібний приймач для zipfile, з якого дані забираються частинами"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        if self._chunks:
+            data = b"".join(self._chunks)
+            self._chunks.clear()
+            yield data
+
 
 class FileService:
     """Сервіс для роботи з файлами архівів"""
 
     def __init__(self):
-        self.downloads_cache = {}  # Кеш тимчасових посилань
+        self.zip_cache = DiskLRUCache(ZIP_CACHE_DIR, lambda: settings.ZIP_CACHE_MAX_MB * 1024 * 1024, "*.zip")
         self.setup_directories()
 
     def setup_directories(self):
@@ -26,62 +70,232 @@ class FileService:
             settings.PREMIUM_ARCHIVES_DIR,
             settings.FREE_ARCHIVES_DIR,
             settings.MEDIA_DIR / "temp",
-            settings.MEDIA_DIR / "previews"
+            settings.MEDIA_DIR / "previews",
+            ZIP_CACHE_DIR
         ]
 
         for directory in directories:
             directory.mkdir(parents=True, exist_ok=True)
 
-    def generate_download_token(self, user_id: int, archive_id: int, expires_minutes: int = 60) -> str:
-        """Генерувати токен для завантаження"""
-        # Створюємо унікальний токен
-        token_data = f"{user_id}:{archive_id}:{datetime.utcnow().isoformat()}"
-        token_hash = hashlib.sha256(token_data.encode()).hexdigest()
-        token = secrets.token_urlsafe(32)
-
-        # Зберігаємо в кеш з терміном дії
-        self.downloads_cache[token] = {
-            "user_id": user_id,
-            "archive_id": archive_id,
-            "expires_at": datetime.utcnow() + timedelta(minutes=expires_minutes),
-            "hash": token_hash,
-            "downloads": 0,
-            "max_downloads": 3  # Максимум завантажень по одному токену
-        }
-
-        return token
+    @staticmethod
+    def _sign_token(payload: str, purpose: str = "download") -> str:
+        signature = hmac.new(
+            settings.SECRET_KEY.encode(),
+            f"{purpose}:{payload}".encode(),
+            hashlib.sha256
+        ).digest()[:16]
+        return base64.urlsafe_b64encode(signature).rstrip(b"=").decode()
+
+    def generate_download_token(
+            self,
+            user_id: int,
+            archive_id: int,
+            expires_minutes: int = 60,
+            max_downloads: int = DEFAULT_MAX_DOWNLOADS
+    ) -> str:
+        """
+        Генерувати підписаний токен для завантаження.
+
+        Токен містить все необхідне (користувач, архів, термін дії, ліміт завантажень),
+        тому будь-який воркер перевіряє його без звернення до сховища.
+        """
+        expires_at = int(time.time()) + expires_minutes * 60
+        token_id = secrets.token_urlsafe(12)
+        payload = f"{user_id}.{archive_id}.{expires_at}.{max_downloads}.{token_id}"
+        return f"{payload}.{self._sign_token(payload)}"
 
     def validate_download_token(self, token: str) -> Optional[dict]:
-        """Перевірити токен завантаження"""
-        if token not in self.downloads_cache:
+        """Перевірити підпис та термін дії токена (ліміт завантажень - див. consume_download_token)"""
+        payload, _, signature = token.rpartition(".")
+        if not payload or not hmac.compare_digest(signature.encode(), self._sign_token(payload).encode()):
+            return None
+
+        try:
+            user_id, archive_id, expires_at, max_downloads, token_id = payload.split(".")
+            token_data = {
+                "user_id": int(user_id),
+                "archive_id": int(archive_id),
+                "expires_at": int(expires_at),
+                "max_downloads": int(max_downloads),
+                "token_id": token_id
+            }
+        except ValueError:
+            return None
+
+        if time.time() > token_data["expires_at"]:
             return None
 
-        token_data = self.downloads_cache[token]
+        return token_data
+
+    def generate_bundle_token(
+            self,
+            user_id: int,
+            archive_ids: list,
+            expires_minutes: int = 60,
+            max_downloads: int = DEFAULT_MAX_DOWNLOADS
+    ) -> str:
+        """Підписаний токен на завантаження кількох архівів одним ZIP (ліміт - як у download токена)"""
+        expires_at = int(time.time()) + expires_minutes * 60
+        token_id = secrets.token_urlsafe(12)
+        ids = "-".join(str(archive_id) for archive_id in archive_ids)
+        payload = f"{user_id}.{ids}.{expires_at}.{max_downloads}.{token_id}"
+        return f"{payload}.{self._sign_token(payload, 'bundle')}"
+
+    def validate_bundle_token(self, token: str) -> Optional[dict]:
+        """Перевірити токен набору архівів; результат сумісний з consume_download_token"""
+        payload, _, signature = token.rpartition(".")
+        if not payload or not hmac.compare_digest(signature.encode(), self._sign_token(payload, 'bundle').encode()):
+            return None
 
-        # Перевіряємо термін дії
-        if datetime.utcnow() > token_data["expires_at"]:
-            del self.downloads_cache[token]
+        try:
+            user_id, ids, expires_at, max_downloads, token_id = payload.split(".")
+            token_data = {
+                "user_id": int(user_id),
+                "archive_ids": [int(archive_id) for archive_id in ids.split("-")],
+                "expires_at": int(expires_at),
+                "max_downloads": int(max_downloads),
+                "token_id": token_id
+            }
+        except ValueError:
             return None
 
-        # Перевіряємо кількість завантажень
-        if token_data["downloads"] >= token_data["max_downloads"]:
-            del self.downloads_cache[token]
+        if time.time() > token_data["expires_at"]:
             return None
 
         return token_data
 
+    async def consume_download_token(self, session: AsyncSession, token_data: dict) -> bool:
+        """
+        Атомарно врахувати одне завантаження за токеном.
+
+        Повертає False, якщо ліміт завантажень вже вичерпано.
+        """
+        stmt = sqlite_insert(DownloadTokenUse).values(
+            token_id=token_data["token_id"],
+            downloads=1,
+            expires_at=token_data["expires_at"]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['token_id'],
+            set_={"downloads": DownloadTokenUse.downloads + 1},
+            where=DownloadTokenUse.downloads < token_data["max_downloads"]
+        ).returning(DownloadTokenUse.downloads)
+
+        result = await session.execute(stmt)
+        return result.scalar_one_or_none() is not None
+
+    async def reserve_download_bytes(
+            self,
+            session: AsyncSession,
+            token_data: dict,
+            file_size: int,
+            length: int
+    ) -> Optional[bool]:
+        """
+        Зарезервувати length байтів відповіді за токеном.
+
+        Кожне враховане завантаження дає бюджет в file_size байтів. Якщо запит
+        (напр. докачування після розриву) вміщується в невитрачений бюджет - він
+        безкоштовний (False); інакше враховується ще одне завантаження (True).
+        None - ліміт завантажень вичерпано. Невіддані байти повертає
+        release_download_bytes, тож Range з будь-якого зміщення не дає
+        отримати файл вдруге без витрати завантаження.
+        """
+        token_id = token_data["token_id"]
+        # Запас на байти, що були в дорозі під час розриву, але не більше десятої частини файлу
+        slack = min(settings.DOWNLOAD_RESUME_SLACK_BYTES, file_size // 10)
+        budget = DownloadTokenUse.downloads * file_size + slack
+
+        free = await session.execute(
+            update(DownloadTokenUse)
+            .where(DownloadTokenUse.token_id == token_id, DownloadTokenUse.served_bytes + length <= budget)
+            .values(served_bytes=DownloadTokenUse.served_bytes + length)
+        )
+        if free.rowcount == 1:
+            return False
+
+        stmt = sqlite_insert(DownloadTokenUse).values(
+            token_id=token_id,
+            downloads=1,
+            served_bytes=length,
+            expires_at=token_data["expires_at"]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['token_id'],
+            set_={
+                "downloads": DownloadTokenUse.downloads + 1,
+                "served_bytes": DownloadTokenUse.served_bytes + length
+            },
+            where=DownloadTokenUse.downloads < token_data["max_downloads"]
+        ).returning(DownloadTokenUse.downloads)
+
+        result = await session.execute(stmt)
+        return True if result.scalar_one_or_none() is not None else None
+
+    async def release_download_bytes(self, token_id: str, unsent: int):
+        """Повернути в бюджет токена байти, які не дійшли до клієнта"""
+        if unsent <= 0:
+            return
+        from database import async_session
+
+        try:
+            async with async_session() as session:
+                await session.execute(
+                    update(DownloadTokenUse)
+                    .where(DownloadTokenUse.token_id == token_id)
+                    .values(served_bytes=func.max(DownloadTokenUse.served_bytes - unsent, 0))
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to release download bytes for token {token_id}: {e}")
+
+    @staticmethod
+    def _archive_base_dir(archive_type: str) -> Path:
+        if archive_type == "premium":
+            return settings.PREMIUM_ARCHIVES_DIR
+        return settings.FREE_ARCHIVES_DIR
+
+    def get_archive_folder(self, archive_code: str, archive_type: str) -> Optional[Path]:
+        """Папка архіву, якщо архів зберігається папкою (а не готовим файлом)"""
+        base_dir = self._archive_base_dir(archive_type)
+        if any((base_dir / f"{archive_code}{ext}").exists() for ext in ARCHIVE_FILE_EXTENSIONS):
+            return None
+
+        folder_path = base_dir / archive_code
+        if folder_path.exists() and folder_path.is_dir():
+            return folder_path
+        return None
+
+    def get_archive_source(
+            self,
+            archive_code: str,
+            archive_type: str,
+            stored_path: Optional[str] = None
+    ) -> Optional[Path]:
+        """
+        Готовий файл або папка архіву (без збирання ZIP з папки).
+        stored_path - archive.file_path відносно BASE_DIR, якщо за кодом нічого немає.
+        """
+        base_dir = self._archive_base_dir(archive_type)
+        for ext in ARCHIVE_FILE_EXTENSIONS:
+            file_path = base_dir / f"{archive_code}{ext}"
+            if file_path.exists():
+                return file_path
+
+        folder_path = self.get_archive_folder(archive_code, archive_type)
+        if folder_path is None and stored_path:
+            file_path = settings.BASE_DIR / stored_path
+            if file_path.is_file():
+                return file_path
+        return folder_path
+
     async def get_archive_file_path(self, archive_code: str, archive_type: str) -> Optional[Path]:
         """Отримати шлях до файлу архіву"""
         # Визначаємо директорію
-        if archive_type == "premium":
-            base_dir = settings.PREMIUM_ARCHIVES_DIR
-        else:
-            base_dir = settings.FREE_ARCHIVES_DIR
+        base_dir = self._archive_base_dir(archive_type)
 
         # Шукаємо файл
-        possible_extensions = ['.zip', '.rar', '.7z', '.rfa']
-
-        for ext in possible_extensions:
+        for ext in ARCHIVE_FILE_EXTENSIONS:
             file_path = base_dir / f"{archive_code}{ext}"
             if file_path.exists():
                 return file_path
@@ -93,29 +307,86 @@ class FileService:
 
         return None
 
+    def stream_zip(self, entries, compress: bool = True):
+        """
+        Генерувати ZIP на льоту, без тимчасових файлів.
+
+        entries - ітератор пар (ZipInfo з file_size, функція що відкриває джерело для
+        читання). Вже стиснені файли (.rfa, .rvt, архіви, зображення) пишуться без
+        стиснення, решта - deflate (compress=False - все без стиснення). Пам'ять стала:
+        в буфері лише поточний блок. Генератор синхронний - StreamingResponse ітерує
+        його в пулі потоків.
+        """
+        buffer = _ZipStreamBuffer()
+        with zipfile.ZipFile(buffer, 'w') as zipf:
+            for info, open_source in entries:
+                if not compress or Path(info.filename).suffix.lower() in STORED_EXTENSIONS:
+                    info.compress_type = zipfile.ZIP_STORED
+                else:
+                    info.compress_type = zipfile.ZIP_DEFLATED
+
+                with open_source() as src, \
+                        zipf.open(info, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as dst:
+                    while chunk := src.read(ZIP_STREAM_CHUNK_SIZE):
+                        dst.write(chunk)
+                        yield from buffer.drain()
+                yield from buffer.drain()
+        yield from buffer.drain()
+
+    @staticmethod
+    def folder_zip_entries(folder_path: Path):
+        """Записи для stream_zip з файлів папки (шляхи - відносно батьківської папки)"""
+        for root, dirs, files in os.walk(folder_path):
+            dirs.sort()
+            for file in sorted(files):
+                file_path = Path(root) / file
+                info = zipfile.ZipInfo.from_file(file_path, file_path.relative_to(folder_path.parent))
+                yield info, functools.partial(open, file_path, 'rb')
+
+    def stream_folder_zip(self, folder_path: Path):
+        """Потоковий ZIP папки архіву (шляхи - як у кеші ZIP)"""
+        return self.stream_zip(self.folder_zip_entries(folder_path))
+
+    @staticmethod
+    def folder_fingerprint(folder_path: Path) -> str:
+        """Відбиток вмісту папки: список файлів, розміри та mtime"""
+        digest = hashlib.sha1()
+        for root, dirs, files in os.walk(folder_path):
+            dirs.sort()
+            for file in sorted(files):
+                file_path = Path(root) / file
+                stats = file_path.stat()
+                digest.update(
+                    f"{file_path.relative_to(folder_path).as_posix()}\0{stats.st_size}\0{stats.st_mtime_ns}\n".encode()
+                )
+        return digest.hexdigest()
+
     async def create_zip_from_folder(self, folder_path: Path, archive_code: str) -> Path:
-        """Створити ZIP архів з папки"""
-        temp_dir = settings.MEDIA_DIR / "temp"
-        zip_path = temp_dir / f"{archive_code}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.zip"
+        """
+        Отримати ZIP архів папки з кешу (або зібрати його).
 
-        # Створюємо ZIP
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(folder_path):
-                for file in files:
-                    file_path = Path(root) / file
-                    arcname = file_path.relative_to(folder_path.parent)
-                    zipf.write(file_path, arcname)
+        ZIP адресується відбитком вмісту папки, тому спільний для всіх користувачів
+        і завантажень та перезбирається лише після зміни файлів. Збирання йде в
+        пулі процесів; паралельні запити того ж архіву чекають одне збирання.
+        """
+        fingerprint = await executor_service.run_io(self.folder_fingerprint, folder_path)
+        zip_path = ZIP_CACHE_DIR / f"{archive_code}-{fingerprint[:16]}.zip"
 
-        logger.info(f"Created ZIP archive: {zip_path}")
-        return zip_path
+        async def build():
+            await executor_service.run_cpu(
+                build_zip, folder_path, zip_path, timeout=settings.ZIP_BUILD_TIMEOUT_SECONDS
+            )
+            logger.info(f"Created ZIP archive: {zip_path}")
+
+        return await self.zip_cache.get_or_build(zip_path, build)
 
     async def get_file_info(self, file_path: Path) -> dict:
         """Отримати інформацію про файл"""
-        if not file_path.exists():
+        try:
+            stats = await executor_service.run_io(file_path.stat)
+        except FileNotFoundError:
             return None
 
-        stats = file_path.stat()
-
         # Визначаємо тип файлу
         extension = file_path.suffix.lower()
         mime_types = {
@@ -134,22 +405,25 @@ class FileService:
             "extension": extension
         }
 
-    def cleanup_expired_tokens(self):
-        """Очистити прострочені токени"""
-        now = datetime.utcnow()
-        expired = [
-            token for token, data in self.downloads_cache.items()
-            if data["expires_at"] < now
-        ]
+    async def cleanup_expired_tokens(self):
+        """Видалити лічильники прострочених токенів"""
+        from database import async_session
 
-        for token in expired:
-            del self.downloads_cache[token]
+        async with async_session() as session:
+            result = await session.execute(
+                delete(DownloadTokenUse).where(DownloadTokenUse.expires_at < int(time.time()))
+            )
+            await session.commit()
 
-        if expired:
-            logger.info(f"Cleaned up {len(expired)} expired download tokens")
+        if result.rowcount:
+            logger.info(f"Cleaned up {result.rowcount} expired download tokens")
 
-    def cleanup_temp_files(self):
+    async def cleanup_temp_files(self):
         """Очистити тимчасові файли"""
+        await executor_service.run_io(self._cleanup_temp_files)
+
+    @staticmethod
+    def _cleanup_temp_files():
         temp_dir = settings.MEDIA_DIR / "temp"
 
         # Видаляємо файли старші 24 годин
@@ -169,26 +443,31 @@ class FileService:
 
         try:
             if file_path.suffix.lower() == '.zip':
-                with zipfile.ZipFile(file_path, 'r') as zipf:
-                    file_list = zipf.namelist()
-
-                    # Створюємо структуру дерева
-                    tree_structure = self._create_tree_structure(file_list)
-
-                    async with aiofiles.open(preview_path, 'w', encoding='utf-8') as f:
-                        await f.write(f"Archive: {file_path.name}\n")
-                        await f.write(f"Files: {len(file_list)}\n")
-                        await f.write(f"Size: {self._format_size(file_path.stat().st_size)}\n")
-                        await f.write("\n" + "=" * 50 + "\n\n")
-                        await f.write("Content:\n\n")
-                        await f.write(tree_structure)
-
+                await executor_service.run_io(self._write_preview, file_path, preview_path)
                 return preview_path
 
         except Exception as e:
             logger.error(f"Failed to create preview: {e}")
             return None
 
+    def _write_preview(self, file_path: Path, preview_path: Path):
+        with zipfile.ZipFile(file_path, 'r') as zipf:
+            file_list = zipf.namelist()
+
+        with open(preview_path, 'w', encoding='utf-8') as f:
+            f.write(self.render_preview(file_path.name, file_list, file_path.stat().st_size))
+
+    def render_preview(self, archive_name: str, file_list: list, size: int) -> str:
+        """Текстове превью архіву: заголовок та дерево файлів"""
+        return (
+            f"Archive: {archive_name}\n"
+            f"Files: {len(file_list)}\n"
+            f"Size: {self._format_size(size)}\n"
+            + "\n" + "=" * 50 + "\n\n"
+            + "Content:\n\n"
+            + self._create_tree_structure(file_list)
+        )
+
     def _create_tree_structure(self, file_list: list) -> str:
         """Створити деревоподібну структуру файлів"""
         tree = {}
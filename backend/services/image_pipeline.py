@@ -0,0 +1,200 @@
+# backend/services/image_pipeline.py
+import asyncio
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import settings
+from services.cpu_tasks import (
+    build_image_derivatives, render_image_variant, available_image_formats, IMAGE_FORMATS
+)
+from services.disk_cache import DiskLRUCache
+from services.executor import executor_service
+from services.user_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIR = settings.MEDIA_DIR / "images"
+MANIFEST_DIR = IMAGE_DIR / "manifest"
+VARIANT_CACHE_DIR = settings.MEDIA_DIR / "variants"
+
+# Дозволені розміри для /media/img/{w}x{h}/... (0 - без обмеження по цій стороні)
+VARIANT_DIMENSIONS = {0, 64, 96, 128, 150, 200, 256, 300, 400, 600, 800, 1024, 1200, 1600}
+VARIANT_SOURCE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif"}
+
+IMAGE_SIZES = {
+    "thumbnail": (150, 150),
+    "preview": (400, 400),
+    "full": (1200, 1200)
+}
+
+
+class ImagePipeline:
+    """
+    Похідні зображення товарів: розміри thumbnail/preview/full у JPEG, WebP та AVIF
+    (якщо Pillow вміє), зібрані в пулі процесів.
+
+    Для кожного зображення пишеться маніфест media/images/manifest/{stem}.json з
+    розмірами та вагою варіантів - з нього API будує srcset для клієнта, а
+    LQIP-заглушка з маніфесту копіюється в archives.image_placeholders.
+    """
+
+    def __init__(self):
+        self.formats = available_image_formats()
+        self._manifests = TTLCache(max_size=5000, ttl=300)
+        self.variant_cache = DiskLRUCache(
+            VARIANT_CACHE_DIR, lambda: settings.IMAGE_VARIANT_CACHE_MAX_MB * 1024 * 1024
+        )
+
+    @staticmethod
+    def _relative(path: str) -> str:
+        """Шлях відносно BASE_DIR (як зберігаються image_paths)"""
+        try:
+            return Path(path).resolve().relative_to(settings.BASE_DIR).as_posix()
+        except ValueError:
+            return path
+
+    @staticmethod
+    def _manifest_path(image_path: str) -> Path:
+        return MANIFEST_DIR / f"{Path(image_path).stem}.json"
+
+    async def process(self, image_path: Path, sizes: dict = IMAGE_SIZES) -> dict:
+        """Створити всі похідні одного зображення та записати маніфест"""
+        manifest = await executor_service.run_cpu(
+            build_image_derivatives, image_path, IMAGE_DIR, sizes, self.formats
+        )
+        for variant in manifest["variants"]:
+            variant["path"] = self._relative(variant["path"])
+
+        await executor_service.run_io(self._write_manifest, self._manifest_path(str(image_path)), manifest)
+        self._manifests.set(Path(image_path).stem, manifest)
+        return manifest
+
+    async def process_batch(self, image_paths: List[Path], sizes: dict = IMAGE_SIZES) -> list:
+        """Обробити кілька зображень паралельно (результат або виняток для кожного)"""
+        return await asyncio.gather(
+            *(self.process(path, sizes) for path in image_paths),
+            return_exceptions=True
+        )
+
+    @staticmethod
+    def _write_manifest(manifest_path: Path, manifest: dict):
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(manifest), encoding="utf-8")
+        tmp_path.replace(manifest_path)
+
+    def remove(self, filename: str) -> List[str]:
+        """
+        Видалити оригінал, похідні всіх розмірів у всіх форматах та маніфест зображення.
+        Повертає назви того, що було видалено (original, розміри, manifest).
+        """
+        stem = Path(filename).stem
+        targets = [("original", [IMAGE_DIR / "original" / filename])]
+        for size_name in IMAGE_SIZES:
+            targets.append((
+                size_name,
+                [IMAGE_DIR / size_name / f"{stem}.{spec['ext']}" for spec in IMAGE_FORMATS.values()]
+            ))
+        targets.append(("manifest", [MANIFEST_DIR / f"{stem}.json"]))
+
+        deleted = []
+        for name, paths in targets:
+            removed = False
+            for path in paths:
+                try:
+                    path.unlink()
+                    removed = True
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    logger.error(f"Error deleting {path}: {e}")
+            if removed:
+                deleted.append(name)
+
+        self._manifests.pop(stem)
+        return deleted
+
+    def load_manifest(self, image_path: str) -> Optional[dict]:
+        """Маніфест зображення (з кешу або з диску); None для зображень без похідних"""
+        if not image_path or image_path.startswith(('http://', 'https://')):
+            return None
+
+        stem = Path(image_path).stem
+        manifest = self._manifests.get(stem)
+        if manifest is not None:
+            return manifest or None
+
+        try:
+            manifest = json.loads(self._manifest_path(image_path).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            manifest = {}
+        self._manifests.set(stem, manifest)
+        return manifest or None
+
+    def srcset(self, image_path: str) -> Optional[dict]:
+        """
+        Варіанти зображення для <img srcset>/<picture>:
+        {"width", "height", "src", "srcset": {format: "url 150w, url 400w, ..."}}
+        """
+        manifest = self.load_manifest(image_path)
+        if not manifest:
+            return None
+
+        base_url = settings.APP_URL.rstrip('/')
+        by_format: Dict[str, list] = {}
+        for variant in manifest["variants"]:
+            by_format.setdefault(variant["format"], []).append(variant)
+
+        srcset = {}
+        for format_name, variants in by_format.items():
+            variants.sort(key=lambda v: v["width"])
+            srcset[format_name] = ", ".join(f"{base_url}/{v['path']} {v['width']}w" for v in variants)
+
+        jpeg_variants = sorted(by_format.get("jpeg", []), key=lambda v: v["width"])
+        return {
+            "width": manifest["original"]["width"],
+            "height": manifest["original"]["height"],
+            "src": f"{base_url}/{jpeg_variants[-1]['path']}" if jpeg_variants else None,
+            "srcset": srcset
+        }
+
+    def negotiate_format(self, accept: str) -> str:
+        """Найкомпактніший формат, який підтримує і клієнт (Accept), і Pillow"""
+        for format_name in ("avif", "webp"):
+            if format_name in self.formats and f"image/{format_name}" in (accept or ""):
+                return format_name
+        return "jpeg"
+
+    async def variant(self, source_path: Path, width: int, height: int, format_name: str) -> Path:
+        """
+        Зменшений варіант зображення з дискового кешу (генерується при першому запиті).
+
+        Ім'я файлу в кеші - хеш джерела (шлях, розмір, mtime) та параметрів, тож
+        зміна оригіналу дає новий варіант, а старий згодом витісняється за LRU.
+        """
+        stats = await executor_service.run_io(source_path.stat)
+        key = hashlib.sha1(
+            f"{source_path}:{stats.st_size}:{stats.st_mtime_ns}:{width}x{height}:{format_name}".encode()
+        ).hexdigest()
+        output_path = VARIANT_CACHE_DIR / key[:2] / f"{key}.{IMAGE_FORMATS[format_name]['ext']}"
+
+        async def build():
+            await executor_service.run_cpu(
+                render_image_variant, source_path, output_path, width, height, format_name
+            )
+
+        return await self.variant_cache.get_or_build(output_path, build)
+
+    def srcsets(self, image_paths) -> List[Optional[dict]]:
+        return [self.srcset(path) for path in (image_paths or [])]
+
+    def placeholders(self, image_paths) -> List[Optional[str]]:
+        """LQIP data URI для кожного зображення (None - якщо зображення не оброблялось)"""
+        return [(self.load_manifest(path) or {}).get("placeholder") for path in (image_paths or [])]
+
+
+# Створюємо глобальний екземпляр
+image_pipeline = ImagePipeline()
@@ -0,0 +1,137 @@
+# backend/services/revit_preview.py
+"""
+Читання вбудованого превʼю з файлів сімейств Revit (.rfa, .rvt, .rte).
+
+Файли Revit - це OLE compound documents (формат CFB); превʼю лежить у потоці
+RevitPreview4.0 як PNG після службового заголовка. Тут мінімальний читач CFB
+лише на стандартній бібліотеці, щоб модуль можна було імпортувати у воркерах
+пулу процесів (див. services/cpu_tasks.py).
+"""
+import struct
+from typing import List, Optional
+
+OLE_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PREVIEW_STREAM = "RevitPreview4.0"
+
+END_OF_CHAIN = 0xFFFFFFFE
+FREE_SECTOR = 0xFFFFFFFF
+DIRECTORY_ENTRY_SIZE = 128
+STREAM_ENTRY = 2
+ROOT_ENTRY = 5
+
+
+class OleReader:
+    """Читач потоків OLE compound document, що повністю лежить у памʼяті"""
+
+    def __init__(self, data: bytes):
+        if len(data) < 512 or not data.startswith(OLE_SIGNATURE):
+            raise ValueError("Not an OLE compound document")
+
+        self.data = data
+        (sector_shift, mini_sector_shift) = struct.unpack_from("<HH", data, 0x1E)
+        (fat_sectors, self.first_dir_sector) = struct.unpack_from("<II", data, 0x2C)
+        (self.mini_cutoff, self.first_mini_fat_sector) = struct.unpack_from("<II", data, 0x38)
+        (first_difat_sector, difat_sectors) = struct.unpack_from("<II", data, 0x44)
+
+        self.sector_size = 1 << sector_shift
+        self.mini_sector_size = 1 << mini_sector_shift
+        self.max_sectors = len(data) // self.sector_size
+
+        # FAT: перші 109 сектори - в заголовку, решта - в ланцюжку DIFAT
+        fat_sector_ids = list(struct.unpack_from("<109I", data, 0x4C))
+        sector = first_difat_sector
+        for _ in range(difat_sectors):
+            if sector >= self.max_sectors:
+                break
+            entries = struct.unpack_from(f"<{self.sector_size // 4}I", data, self._offset(sector))
+            fat_sector_ids.extend(entries[:-1])
+            sector = entries[-1]
+
+        self.fat: List[int] = []
+        for sector in fat_sector_ids[:fat_sectors]:
+            if sector < self.max_sectors:
+                self.fat.extend(struct.unpack_from(f"<{self.sector_size // 4}I", data, self._offset(sector)))
+
+        self.entries = self._read_directory()
+        self._mini_fat: Optional[List[int]] = None
+        self._mini_stream: Optional[bytes] = None
+
+    def _offset(self, sector: int) -> int:
+        return (sector + 1) * self.sector_size
+
+    def _chain(self, start: int, table: List[int]) -> List[int]:
+        """Ланцюжок секторів (із захистом від циклів у пошкоджених файлах)"""
+        chain = []
+        sector = start
+        while sector not in (END_OF_CHAIN, FREE_SECTOR) and sector < len(table):
+            if len(chain) > len(table):
+                raise ValueError("Sector chain loop")
+            chain.append(sector)
+            sector = table[sector]
+        return chain
+
+    def _read_chain(self, start: int, size: Optional[int] = None) -> bytes:
+        data = b"".join(
+            self.data[self._offset(sector):self._offset(sector) + self.sector_size]
+            for sector in self._chain(start, self.fat)
+        )
+        return data if size is None else data[:size]
+
+    def _read_directory(self) -> list:
+        raw = self._read_chain(self.first_dir_sector)
+        entries = []
+        for position in range(0, len(raw) - DIRECTORY_ENTRY_SIZE + 1, DIRECTORY_ENTRY_SIZE):
+            name_length, entry_type = struct.unpack_from("<HB", raw, position + 64)
+            start, size = struct.unpack_from("<IQ", raw, position + 116)
+            name = raw[position:position + max(name_length - 2, 0)].decode("utf-16-le", errors="ignore")
+            if self.sector_size == 512:
+                size &= 0xFFFFFFFF  # у версії 3 старші 4 байти можуть містити сміття
+            entries.append({"name": name, "type": entry_type, "start": start, "size": size})
+        return entries
+
+    def _read_mini(self, start: int, size: int) -> bytes:
+        if self._mini_fat is None:
+            root = self.entries[0]
+            mini_fat_raw = self._read_chain(self.first_mini_fat_sector)
+            self._mini_fat = list(struct.unpack(f"<{len(mini_fat_raw) // 4}I", mini_fat_raw))
+            self._mini_stream = self._read_chain(root["start"], root["size"])
+
+        data = b"".join(
+            self._mini_stream[sector * self.mini_sector_size:(sector + 1) * self.mini_sector_size]
+            for sector in self._chain(start, self._mini_fat)
+        )
+        return data[:size]
+
+    def read_stream(self, name: str) -> Optional[bytes]:
+        """Вміст потоку за імʼям (без урахування вкладеності сховищ), None якщо немає"""
+        for entry in self.entries:
+            if entry["type"] == STREAM_ENTRY and entry["name"] == name:
+                if entry["size"] < self.mini_cutoff:
+                    return self._read_mini(entry["start"], entry["size"])
+                return self._read_chain(entry["start"], entry["size"])
+        return None
+
+
+def extract_png(data: bytes) -> Optional[bytes]:
+    """Перший повний PNG у бінарних даних (до чанка IEND включно)"""
+    start = data.find(PNG_SIGNATURE)
+    if start < 0:
+        return None
+
+    position = start + len(PNG_SIGNATURE)
+    while position + 8 <= len(data):
+        length, chunk_type = struct.unpack_from(">I4s", data, position)
+        position += 12 + length  # довжина + тип + дані + CRC
+        if chunk_type == b"IEND":
+            return data[start:position] if position <= len(data) else None
+    return None
+
+
+def extract_revit_preview(data: bytes) -> Optional[bytes]:
+    """PNG-превʼю з файлу Revit або None, якщо файл не OLE чи превʼю відсутнє"""
+    try:
+        stream = OleReader(data).read_stream(PREVIEW_STREAM)
+    except (ValueError, struct.error):
+        return None
+    return extract_png(stream) if stream else None
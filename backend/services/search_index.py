@@ -0,0 +1,134 @@
+# backend/services/search_index.py
+import re
+import logging
+from typing import Optional, Union
+
+from sqlalchemy import text, select, func, literal_column, column, table
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "archives_fts"
+
+# Токени пошукового запиту (літери/цифри будь-якої мови)
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Ваги колонок для bm25: code, title, description
+BM25_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+def _join_languages(value) -> str:
+    """Склеїти всі мовні версії JSON-поля (title/description) в один текст"""
+    if isinstance(value, dict):
+        return " ".join(str(v) for v in value.values() if v)
+    return str(value) if value else ""
+
+
+class ArchiveSearchIndex:
+    """
+    Повнотекстовий індекс каталогу на SQLite FTS5.
+
+    Рядок індексу має rowid = archives.id і містить code та всі мовні версії
+    title/description. Індекс оновлюється в тій самій транзакції, що і сам архів.
+    """
+
+    def __init__(self):
+        self.available = False
+        self.fts_table = table(FTS_TABLE, column("rowid"))
+
+    async def setup(self, conn: AsyncConnection):
+        """Створити FTS5 таблицю (якщо її немає) та заповнити її при розсинхронізації"""
+        try:
+            await conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "code, title, description, "
+                "tokenize = 'unicode61 remove_diacritics 2', "
+                "prefix = '2 3')"
+            ))
+        except Exception as e:
+            # SQLite зібраний без FTS5 - працюємо через LIKE
+            logger.warning(f"FTS5 is not available, falling back to LIKE search: {e}")
+            self.available = False
+            return
+
+        self.available = True
+
+        indexed = (await conn.execute(text(f"SELECT count(*) FROM {FTS_TABLE}"))).scalar_one()
+        total = (await conn.execute(text("SELECT count(*) FROM archives"))).scalar_one()
+        if indexed != total:
+            await self.rebuild(conn)
+
+    async def rebuild(self, conn: Union[AsyncConnection, AsyncSession]):
+        """Повністю перебудувати індекс з таблиці archives"""
+        await conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        await conn.execute(text(
+            f"INSERT INTO {FTS_TABLE}(rowid, code, title, description) "
+            "SELECT id, code, "
+            "CASE WHEN json_valid(title) "
+            "THEN (SELECT group_concat(value, ' ') FROM json_each(archives.title)) ELSE title END, "
+            "CASE WHEN json_valid(description) "
+            "THEN (SELECT group_concat(value, ' ') FROM json_each(archives.description)) ELSE description END "
+            "FROM archives"
+        ))
+        logger.info("Archive search index rebuilt")
+
+    async def upsert(self, session: AsyncSession, archive):
+        """Додати або оновити архів в індексі (архів має бути вже flush-нутий)"""
+        if not self.available:
+            return
+
+        await session.execute(
+            text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"),
+            {"id": archive.id}
+        )
+        await session.execute(
+            text(
+                f"INSERT INTO {FTS_TABLE}(rowid, code, title, description) "
+                "VALUES (:id, :code, :title, :description)"
+            ),
+            {
+                "id": archive.id,
+                "code": archive.code or "",
+                "title": _join_languages(archive.title),
+                "description": _join_languages(archive.description),
+            }
+        )
+
+    async def remove(self, session: AsyncSession, archive_id: int):
+        """Видалити архів з індексу"""
+        if not self.available:
+            return
+
+        await session.execute(
+            text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"),
+            {"id": archive_id}
+        )
+
+    @staticmethod
+    def build_match_query(search: str) -> Optional[str]:
+        """
+        Перетворити пошуковий рядок користувача на безпечний FTS5 MATCH вираз.
+
+        Кожне слово стає префіксним запитом ("слово"*), слова об'єднуються через AND.
+        """
+        tokens = TOKEN_RE.findall(search.lower())
+        if not tokens:
+            return None
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    def match_subquery(self, match_query: str):
+        """Підзапит (archive_id, rank) з результатами пошуку, відсортованими за bm25"""
+        fts = literal_column(FTS_TABLE)
+        return (
+            select(
+                self.fts_table.c.rowid.label("archive_id"),
+                func.bm25(fts, *BM25_WEIGHTS).label("rank")
+            )
+            .select_from(self.fts_table)
+            .where(fts.op("MATCH")(match_query))
+            .subquery()
+        )
+
+
+# Створюємо глобальний екземпляр
+archive_search_index = ArchiveSearchIndex()
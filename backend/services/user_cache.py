@@ -0,0 +1,157 @@
+# backend/services/user_cache.py
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Optional, Hashable
+
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from config import settings
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Простий LRU кеш з терміном життя записів та лічильниками влучань"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class UserCache:
+    """
+    Кеш користувачів та розкодованих JWT токенів для get_current_user_dependency.
+
+    В кеші лежить від'єднана (detached) копія User; на кожен запит вона
+    вливається в сесію через merge(load=False) без SELECT, тож ендпоінти
+    можуть змінювати current_user і робити commit як раніше. Будь-який commit,
+    що змінює або видаляє User, скидає його запис (див. _track_user_changes).
+    """
+
+    def __init__(self):
+        self.users = TTLCache(settings.USER_CACHE_MAX_SIZE, settings.USER_CACHE_TTL_SECONDS)
+        self.tokens = TTLCache(settings.TOKEN_CACHE_MAX_SIZE, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+    # --- Токени ---
+
+    def get_token_user_id(self, token: str) -> Optional[int]:
+        return self.tokens.get(token)
+
+    def remember_token(self, token: str, user_id: int, expires_at: Optional[float]):
+        """Запам'ятати перевірений токен, але не довше ніж до його exp"""
+        ttl = None
+        if expires_at is not None:
+            ttl = min(self.tokens.ttl, expires_at - time.time())
+        self.tokens.set(token, user_id, ttl)
+
+    # --- Користувачі ---
+
+    async def get_user(self, session: AsyncSession, user_id: int) -> Optional[User]:
+        """Повернути користувача, прив'язаного до сесії (з кешу або з БД)"""
+        cached = self.users.get(user_id)
+        if cached is not None:
+            return await session.merge(cached, load=False)
+
+        user = await session.get(User, user_id)
+        if user is not None:
+            self._remember_user(user)
+        return user
+
+    def _remember_user(self, user: User):
+        loaded = inspect(user).dict
+        columns = [attr.key for attr in inspect(User).column_attrs]
+        if any(key not in loaded for key in columns):
+            # Частково завантажений об'єкт не кешуємо
+            return
+
+        copy = User()
+        for key in columns:
+            setattr(copy, key, loaded[key])
+        make_transient_to_detached(copy)
+        self.users.set(user.id, copy)
+
+    def invalidate(self, user_id: int):
+        """Скинути користувача з кешу (викликати після змін поза ORM, напр. UPDATE users)"""
+        self.users.pop(user_id)
+
+    def stats(self) -> dict:
+        return {
+            "users": self.users.stats(),
+            "tokens": self.tokens.stats()
+        }
+
+
+# Створюємо глобальний екземпляр
+user_cache = UserCache()
+
+
+@event.listens_for(Session, "before_flush")
+def _track_user_changes(session, flush_context, instances):
+    """Запам'ятати id користувачів, які змінюються в цій транзакції"""
+    changed = session.info.setdefault("changed_user_ids", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            changed.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop("changed_user_ids", ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_user_ids", None)
@@ -0,0 +1,206 @@
+# backend/services/view_history.py
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models.view_history import ViewHistory, ViewHistoryClear
+from services.user_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+MAX_HISTORY_ITEMS = 20
+# Рядків в одному INSERT (обмеження SQLite на кількість параметрів)
+INSERT_BATCH_SIZE = 500
+
+
+class ViewHistoryService:
+    """
+    Історія переглядів з відкладеним записом.
+
+    record лише запамʼятовує (user_id, archive_id) -> час у буфері процесу; раз на
+    VIEW_HISTORY_FLUSH_INTERVAL_SECONDS буфер пишеться одним багаторядковим upsert,
+    після чого одним DELETE лишаються останні MAX_HISTORY_ITEMS записів кожного
+    зачепленого користувача. Останні перегляди "теплих" користувачів тримаються в
+    кеші (список id, найновіший перший), тож /recently-viewed не сортує таблицю.
+
+    Буфер і кеш - свої в кожному воркері. Тому список може відставати від переглядів
+    в інших воркерах на VIEW_HISTORY_FLUSH_INTERVAL_SECONDS +
+    VIEW_HISTORY_RECENT_TTL_SECONDS. Очищення пише мітку в view_history_clears, і
+    будь-який воркер відкидає буферизовані перегляди, старші за неї, тож очищена
+    історія не повертається.
+    """
+
+    def __init__(self):
+        self.flush_interval = settings.VIEW_HISTORY_FLUSH_INTERVAL_SECONDS
+        self._buffer: Dict[Tuple[int, int], datetime] = {}
+        self._recent = TTLCache(max_size=5000, ttl=settings.VIEW_HISTORY_RECENT_TTL_SECONDS)
+        self._lock = asyncio.Lock()
+        self.running = False
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    def record(self, user_id: int, archive_id: int):
+        """Запамʼятати перегляд (запишеться в БД при наступному flush)"""
+        self._buffer[(user_id, archive_id)] = datetime.utcnow()
+        self.recorded += 1
+
+        recent = self._recent.get(user_id)
+        if recent is not None:
+            ids = [archive_id] + [item for item in recent if item != archive_id]
+            self._recent.set(user_id, ids[:MAX_HISTORY_ITEMS])
+
+    async def recent_ids(self, session: AsyncSession, user_id: int) -> List[int]:
+        """id останніх переглянутих архівів, найновіший перший"""
+        recent = self._recent.get(user_id)
+        if recent is not None:
+            return recent
+
+        # Під блокуванням - щоб не прочитати БД посеред flush, коли буфер вже забрано
+        async with self._lock:
+            result = await session.execute(
+                select(ViewHistory.archive_id, ViewHistory.viewed_at)
+                .where(ViewHistory.user_id == user_id)
+                .order_by(ViewHistory.viewed_at.desc())
+                .limit(MAX_HISTORY_ITEMS)
+            )
+            order = [archive_id for archive_id, _ in result.all()]
+            cleared_at = await session.scalar(
+                select(ViewHistoryClear.cleared_at).where(ViewHistoryClear.user_id == user_id)
+            )
+            # Ще не записані перегляди новіші за будь-що в БД (крім зроблених до очищення)
+            buffered = sorted(
+                ((viewed_at, archive_id) for (buffered_user_id, archive_id), viewed_at in self._buffer.items()
+                 if buffered_user_id == user_id and (cleared_at is None or viewed_at > cleared_at)),
+                reverse=True
+            )
+
+        ids = [archive_id for _, archive_id in buffered]
+        ids += [archive_id for archive_id in order if archive_id not in ids]
+        ids = ids[:MAX_HISTORY_ITEMS]
+        self._recent.set(user_id, ids)
+        return ids
+
+    async def clear(self, session: AsyncSession, user_id: int):
+        """Видалити історію користувача (разом з ще не записаними переглядами у всіх воркерах)"""
+        async with self._lock:
+            for key in [key for key in self._buffer if key[0] == user_id]:
+                del self._buffer[key]
+            await session.execute(delete(ViewHistory).where(ViewHistory.user_id == user_id))
+            # Мітка для буферів інших воркерів
+            stmt = sqlite_insert(ViewHistoryClear).values(user_id=user_id, cleared_at=datetime.utcnow())
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=['user_id'],
+                set_={'cleared_at': stmt.excluded.cleared_at}
+            ))
+            await session.commit()
+        self._recent.set(user_id, [])
+
+    async def flush(self) -> int:
+        """Записати буфер; повертає кількість записаних переглядів"""
+        from database import async_session
+
+        async with self._lock:
+            if not self._buffer:
+                return 0
+            batch, self._buffer = self._buffer, {}
+
+            user_ids = list({user_id for user_id, _ in batch})
+
+            started = time.monotonic()
+            try:
+                async with async_session() as session:
+                    # Перегляди, зроблені до очищення історії (можливо, в іншому воркері), не пишемо
+                    cleared = {}
+                    for start in range(0, len(user_ids), INSERT_BATCH_SIZE):
+                        result = await session.execute(
+                            select(ViewHistoryClear.user_id, ViewHistoryClear.cleared_at)
+                            .where(ViewHistoryClear.user_id.in_(user_ids[start:start + INSERT_BATCH_SIZE]))
+                        )
+                        cleared.update(result.all())
+                    rows = [
+                        {"user_id": user_id, "archive_id": archive_id, "viewed_at": viewed_at}
+                        for (user_id, archive_id), viewed_at in batch.items()
+                        if user_id not in cleared or viewed_at > cleared[user_id]
+                    ]
+
+                    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                        stmt = sqlite_insert(ViewHistory).values(rows[start:start + INSERT_BATCH_SIZE])
+                        stmt = stmt.on_conflict_do_update(
+                            index_elements=['user_id', 'archive_id'],
+                            set_={'viewed_at': func.max(ViewHistory.viewed_at, stmt.excluded.viewed_at)}
+                        )
+                        await session.execute(stmt)
+
+                    # Лишаємо MAX_HISTORY_ITEMS останніх записів для всіх зачеплених користувачів
+                    for start in range(0, len(user_ids), INSERT_BATCH_SIZE):
+                        ranked = (
+                            select(
+                                ViewHistory.id,
+                                func.row_number().over(
+                                    partition_by=ViewHistory.user_id,
+                                    order_by=ViewHistory.viewed_at.desc()
+                                ).label("position")
+                            )
+                            .where(ViewHistory.user_id.in_(user_ids[start:start + INSERT_BATCH_SIZE]))
+                            .subquery()
+                        )
+                        await session.execute(
+                            delete(ViewHistory).where(
+                                ViewHistory.id.in_(select(ranked.c.id).where(ranked.c.position > MAX_HISTORY_ITEMS))
+                            )
+                        )
+                    await session.commit()
+            except Exception as e:
+                # Повертаємо в буфер, крім уже новіших переглядів тих самих архівів
+                for key, viewed_at in batch.items():
+                    self._buffer.setdefault(key, viewed_at)
+                self.failed_flushes += 1
+                logger.error(f"View history flush failed: {e}")
+                return 0
+
+            elapsed = time.monotonic() - started
+            self.flushes += 1
+            self.flushed += len(rows)
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            return len(rows)
+
+    async def start(self):
+        """Фоновий цикл запису (запускається в lifespan кожного воркера)"""
+        self.running = True
+        while self.running:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def stop(self):
+        """Зупинити цикл і записати залишок"""
+        self.running = False
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "flush_interval_seconds": self.flush_interval,
+            "pending": len(self._buffer),
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_seconds": round(self.last_flush_seconds, 4),
+            "max_flush_seconds": round(self.max_flush_seconds, 4),
+            "recent_cache": self._recent.stats()
+        }
+
+
+# Створюємо глобальний екземпляр
+view_history_service = ViewHistoryService()
@@ -0,0 +1,10 @@
+# backend/tests/conftest.py
+import os
+import sys
+import tempfile
+
+# Окрема БД для тестів - до імпорту config/database
+_db_dir = tempfile.mkdtemp(prefix="revit-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_db_dir, 'test.db')}"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
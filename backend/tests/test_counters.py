@@ -0,0 +1,50 @@
+# backend/tests/test_counters.py
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+import models  # noqa: F401 - реєструє всі таблиці
+from database import Base, engine, async_session
+from models.archive import Archive
+from services.counters import CounterService
+
+
+async def _create_archive(session) -> Archive:
+    archive = Archive(code="counter-test", title={"en": "t"}, description={"en": "d"}, view_count=None)
+    session.add(archive)
+    await session.commit()
+    # Фіксуємо "давній" updated_at, щоб зміну було видно
+    await session.execute(
+        update(Archive).where(Archive.id == archive.id).values(updated_at=datetime(2020, 1, 1))
+    )
+    await session.commit()
+    return archive
+
+
+def test_flush_keeps_updated_at():
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async with async_session() as session:
+            archive = await _create_archive(session)
+
+        counters = CounterService()
+        counters.increment("archive.view_count", archive.id, 3)
+        counters.increment("archive.purchase_count", archive.id)
+        assert await counters.flush() == 2
+
+        async with async_session() as session:
+            row = (await session.execute(
+                select(Archive.view_count, Archive.purchase_count, Archive.updated_at)
+                .where(Archive.id == archive.id)
+            )).one()
+
+        await engine.dispose()
+        return row
+
+    view_count, purchase_count, updated_at = asyncio.run(scenario())
+    assert view_count == 3
+    assert purchase_count == 1
+    assert updated_at == datetime(2020, 1, 1)
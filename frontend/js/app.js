@@ -214,6 +214,11 @@ class RevitWebApp {
             this.storage.set('cart', this.cart);
             this.updateCartBadge();
 
+            // Аналітика для розробників (помилка не заважає додаванню в корзину)
+            this.api.post('/api/analytics/events', {
+                events: [{ type: 'add_to_cart', archive_id: product.id }]
+            }).catch(() => {});
+
             // Оновлюємо кнопку товару
             const btn = document.getElementById(`product-btn-${productId}`);
             if (btn) {
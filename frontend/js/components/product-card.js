@@ -11,7 +11,8 @@ export class ProductCard {
                 <div class="product-card__image-wrapper">
                     <img src="${this.archive.image}"
                          alt="${this.archive.title[i18n.currentLang]}"
-                         class="product-card__image">
+                         class="product-card__image"
+                         ${this.renderPlaceholder()}>
                     ${this.renderBadges()}
                 </div>
 
@@ -43,6 +44,14 @@ export class ProductCard {
         return this.element;
     }
 
+    renderPlaceholder() {
+        // LQIP-заглушка (data URI з API) як фон, поки вантажиться зображення
+        const placeholder = this.archive.image_placeholders?.[0];
+        return placeholder
+            ? `style="background: url('${placeholder}') center / cover no-repeat;"`
+            : '';
+    }
+
     renderBadges() {
         let badges = '';
 
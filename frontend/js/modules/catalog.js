@@ -28,8 +28,25 @@ window.CatalogModule = {
         }
     },
 
+    // <picture> з AVIF/WebP/JPEG srcset - браузер сам обирає найменший варіант, що підходить
+    getResponsiveImage(src, variants, alt, placeholder) {
+        // LQIP-заглушка як фон - видно одразу, поки завантажується справжнє зображення
+        const background = placeholder ? ` background: url('${placeholder}') center / cover no-repeat;` : '';
+        const style = `width: 100%; height: 100%; object-fit: cover; border-radius: 8px;${background}`;
+        if (!variants || !variants.srcset) {
+            return `<img src="${src}" alt="${alt}" loading="lazy" style="${style}">`;
+        }
+        const sizes = '(max-width: 600px) 50vw, 300px';
+        const sources = ['avif', 'webp']
+            .filter(format => variants.srcset[format])
+            .map(format => `<source type="image/${format}" srcset="${variants.srcset[format]}" sizes="${sizes}">`)
+            .join('');
+        const jpegSrcset = variants.srcset.jpeg ? ` srcset="${variants.srcset.jpeg}" sizes="${sizes}"` : '';
+        return `<picture style="display: contents;">${sources}<img src="${variants.src || src}"${jpegSrcset} alt="${alt}" loading="lazy" width="${variants.width}" height="${variants.height}" style="${style}"></picture>`;
+    },
+
     getProductCard(archive, app) {
-        const { id, title, price, discount_percent, archive_type, average_rating, ratings_count, image_paths } = archive;
+        const { id, title, price, discount_percent, archive_type, average_rating, ratings_count, image_paths, image_variants, image_placeholders } = archive;
         const lang = app.currentLang || 'ua';
         const isInCart = app.cart.some(item => item.id === id);
         const isFavorite = window.FavoritesModule.isFavorite(id);
@@ -41,7 +58,7 @@ window.CatalogModule = {
         const imagePath = image_paths && image_paths.length > 0 ? image_paths[0] : null;
         const fullImagePath = imagePath && !imagePath.startsWith('http') ? `${app.api.baseURL}/${imagePath}` : imagePath;
         const imageAreaHtml = fullImagePath
-            ? `<img src="${fullImagePath}" alt="${displayTitle}" style="width: 100%; height: 100%; object-fit: cover; border-radius: 8px;">`
+            ? this.getResponsiveImage(fullImagePath, image_variants?.[0], displayTitle, image_placeholders?.[0])
             : `<div style="font-size: 40px;">${archive_type === 'premium' ? '💎' : '📦'}</div>`;
 
 
@@ -8,6 +8,7 @@ window.InfiniteScrollModule = {
         isLoading: false,
         hasMore: true,
         currentPage: 1,
+        nextCursor: null,
         filters: {},
         container: null,
         loader: null,
@@ -38,6 +39,7 @@ window.InfiniteScrollModule = {
 
     async loadInitialData() {
         this.state.currentPage = 1;
+        this.state.nextCursor = null;
         this.state.hasMore = true;
         this.state.loadedItems = [];
         window.app.productsCache = [];
@@ -65,7 +67,14 @@ window.InfiniteScrollModule = {
                 }
             }
 
-            const params = new URLSearchParams({ page, limit: this.config.itemsPerPage, ...cleanFilters });
+            // При пошуку сортування "за замовчуванням" означає за релевантністю
+            if (cleanFilters.search && (!cleanFilters.sort_by || cleanFilters.sort_by === 'id')) {
+                cleanFilters.sort_by = 'relevance';
+            }
+
+            // Курсорна пагінація: перша сторінка без курсора, далі - next_cursor з відповіді
+            const params = new URLSearchParams({ pagination: 'cursor', limit: this.config.itemsPerPage, ...cleanFilters });
+            if (page > 1 && this.state.nextCursor) params.set('cursor', this.state.nextCursor);
 
             // ЗМІНА: Вмикаємо кеш тільки для першої сторінки
             const options = (page === 1) ? { useCache: true, ttl: 300 } : {};
@@ -83,12 +92,14 @@ window.InfiniteScrollModule = {
                 });
                 this.state.loader.before(fragment);
 
-                this.state.currentPage = response.page;
-                this.state.hasMore = response.has_more;
-                this.updateItemsCount(response.total);
+                this.state.currentPage = page;
+                this.state.nextCursor = response.next_cursor;
+                this.state.hasMore = response.has_more && !!response.next_cursor;
+                // total приходить лише з першою сторінкою
+                if (response.total !== null && response.total !== undefined) this.updateItemsCount(response.total);
 
-                if (!response.has_more && response.total > 0) this.showEndMessage();
-                if (response.total === 0) this.showEmptyMessage();
+                if (!this.state.hasMore && this.state.loadedItems.length > 0) this.showEndMessage();
+                if (page === 1 && response.items.length === 0) this.showEmptyMessage();
             }
         } catch (error) {
             console.error('Infinite scroll error:', error);